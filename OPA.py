@@ -1,6 +1,6 @@
 from si_fab import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan
+from circuit.all import CircuitCell, manhattan, get_layout_geometry
 from pteam_library_si_fab import all as pt_lib
 
 class OPA(CircuitCell):
@@ -42,7 +42,7 @@ class OPA(CircuitCell):
     def _default_place_specs(self):
         # Provides positions in which the heaters will be placed with respect to the splitter tree
         specs = []
-        east = self.child_cells["tree"].get_default_view(i3.LayoutView).size_info().east
+        east = get_layout_geometry(self.child_cells["tree"]).east
 
         for cnt in range(self._get_n_outputs()):
             specs.append(
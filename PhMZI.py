@@ -1,6 +1,6 @@
 from CSiP180Al import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan
+from circuit.all import CircuitCell, manhattan, shared_cell, get_layout_geometry
 from picazzo3.filters.mzi import MZIWithCells
 from heatedwaveguide import HeatedWaveguide
 from picazzo3.wg.dircoup import BendDirectionalCoupler
@@ -11,13 +11,15 @@ class PhMZI(CircuitCell):
 
     def _default_child_cells(self):
         child_cells = dict()
-        split = pdk.M2X2_TE_1550()
+        split = shared_cell(pdk.M2X2_TE_1550)
         #split = BendDirectionalCoupler(name="bdc")
-        ht = HeatedWaveguide(heater_width=5,
-                             heater_offset=3.0,
-                             m1_width=10.0,
-                             m1_length=50.0)
-        child_cells["mzi"] = MZIWithCells(name="my_mzi_cells_1",
+        ht = shared_cell(HeatedWaveguide,
+                         heater_width=5,
+                         heater_offset=3.0,
+                         m1_width=10.0,
+                         m1_length=50.0)
+        child_cells["mzi"] = shared_cell(MZIWithCells,
+                   name="my_mzi_cells_1",
                    splitter=split,
                    combiner=split,
                    arm1_contents=ht,
@@ -29,9 +31,9 @@ class PhMZI(CircuitCell):
         return child_cells
 
     def _default_connectors(self):
-        mzi_len = self.child_cells["mzi"].get_default_view(i3.LayoutView).size_info().east
+        mzi_len = get_layout_geometry(self.child_cells["mzi"]).east
         arm2_elec1_pos = None
-        for port in self.child_cells["mzi"].Layout().ports:
+        for port in get_layout_geometry(self.child_cells["mzi"]).ports.values():
             if re.search("arm2_elec1", port.name):
                 arm2_elec1_pos = port.position
         c = partial(manhattan, control_points=[(mzi_len + 20, 1.5),
@@ -44,7 +46,7 @@ class PhMZI(CircuitCell):
         ht_pos_x = 0
         ht_pos_y = 0
         arm2_elec1_pos = None
-        for port in self.child_cells["mzi"].Layout().ports:
+        for port in get_layout_geometry(self.child_cells["mzi"]).ports.values():
             if re.search("arm2_elec1", port.name):
                 arm2_elec1_pos = port.position
         ht_pos_x = arm2_elec1_pos.x - 25
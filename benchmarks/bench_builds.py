@@ -0,0 +1,52 @@
+"""Benchmarks of full layout builds of the generated topologies."""
+
+from ipkiss3 import all as i3
+from caches import cold_start
+from harness import Benchmark
+
+
+def build_layout(cell):
+    """Builds the layout of a cell, including its ports."""
+    layout = cell.get_default_view(i3.LayoutView)
+    layout.layout
+    layout.ports
+    return layout
+
+
+def build_splitter_tree(levels):
+    from splittertree import SplitterTree
+    return build_layout(SplitterTree(levels=levels))
+
+
+def build_celment(dim):
+    from celment import Celment
+    return build_layout(Celment(dim=dim))
+
+
+def build_reck(levels):
+    from reck import Reck
+    return build_layout(Reck(levels=levels))
+
+
+def build_ocdc(levels, mzi_nums):
+    from ocdc import OCDC
+    return build_layout(OCDC(levels=levels, mzi_nums=mzi_nums))
+
+
+def get_benchmarks(quick=False):
+    """Returns the build benchmarks. With quick, only the smaller sizes are built."""
+    repeat = 1 if quick else 3
+    return [
+        Benchmark("SplitterTree", build_splitter_tree,
+                  [{"levels": l} for l in (range(2, 5) if quick else range(2, 8))],
+                  setup=cold_start, repeat=repeat),
+        Benchmark("Celment", build_celment,
+                  [{"dim": d} for d in ([4, 8] if quick else [4, 6, 8, 12, 16])],
+                  setup=cold_start, repeat=repeat),
+        Benchmark("Reck", build_reck,
+                  [{"levels": l} for l in ([3, 5] if quick else [3, 5, 8, 12])],
+                  setup=cold_start, repeat=repeat),
+        Benchmark("OCDC", build_ocdc,
+                  [{"levels": 3, "mzi_nums": 2}] + ([] if quick else [{"levels": 4, "mzi_nums": 3}]),
+                  setup=cold_start, repeat=repeat),
+    ]
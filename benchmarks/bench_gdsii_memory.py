@@ -0,0 +1,95 @@
+"""Peak memory of the GDSII writers on a RoutedOCDC.
+
+Every writer runs in a new process, which builds the layout and writes it to GDSII. The peak of the Python
+allocations (tracemalloc) and the maximum resident set size of the process are reported, so that `write_gdsii`
+can be compared with `write_gdsii_stream`, which releases the layout of every CircuitCell after it is written.
+
+Usage::
+
+    python benchmarks/bench_gdsii_memory.py
+    python benchmarks/bench_gdsii_memory.py --levels 5 --mzi-nums 2
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+WRITERS = ["write_gdsii", "write_gdsii_stream"]
+
+
+def _max_rss():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure_writer(writer, levels, mzi_nums):
+    """Builds a RoutedOCDC and writes it with writer in this process. Returns a dict with the peak memory."""
+    if tracemalloc is not None:
+        tracemalloc.start()
+    from ocdc import OCDC
+    from routed_ocdc import RoutedOCDC
+
+    cell = RoutedOCDC(dut=OCDC(levels=levels, mzi_nums=mzi_nums))
+    fd, filename = tempfile.mkstemp(suffix=".gds")
+    os.close(fd)
+    try:
+        start = time.time()
+        getattr(cell.Layout(), writer)(filename)
+        elapsed = time.time() - start
+        size = os.path.getsize(filename)
+    finally:
+        os.remove(filename)
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc is not None else None
+    return {"writer": writer, "levels": levels, "mzi_nums": mzi_nums, "time": elapsed, "file_bytes": size,
+            "peak_traced": peak, "max_rss": _max_rss()}
+
+
+def _fmt_bytes(value):
+    return "-" if value is None else "{:.1f} MB".format(value / 2.0 ** 20)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak memory of write_gdsii and write_gdsii_stream")
+    parser.add_argument("--levels", type=int, default=4)
+    parser.add_argument("--mzi-nums", type=int, default=2)
+    parser.add_argument("--writer", choices=WRITERS, default=None,
+                        help="Measure one writer in this process and print the result as JSON")
+    args = parser.parse_args(argv)
+
+    if args.writer is not None:
+        print(json.dumps(measure_writer(args.writer, args.levels, args.mzi_nums)))
+        return 0
+
+    results = []
+    for writer in WRITERS:
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--writer", writer,
+                                          "--levels", str(args.levels), "--mzi-nums", str(args.mzi_nums)])
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    for r in results:
+        print("{:<20} traced peak {:>10}   max rss {:>10}   {:8.2f} s   {}".format(
+            r["writer"], _fmt_bytes(r["peak_traced"]), _fmt_bytes(r["max_rss"]), r["time"],
+            _fmt_bytes(r["file_bytes"])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Benchmarks of the routing primitives of the circuit package over parameterized port geometries."""
+
+from CSiP180Al import all as pdk
+from ipkiss3 import all as i3
+from circuit.all import manhattan, bezier_sbend, bezier_bend, bezier_ubend_fixed_bend_radius, combine_connectors
+from circuit.route_through_control_points import RouteManhattanControlPoints
+from caches import cold_start
+from harness import Benchmark
+
+
+def get_trace_template():
+    layout = pdk.GC_TE_1550().get_default_view(i3.LayoutView)
+    return list(layout.ports)[0].trace_template
+
+
+_trace_template = []
+
+
+def _port(x, y, angle):
+    if not _trace_template:
+        _trace_template.append(get_trace_template())
+    return i3.OpticalPort(position=(x, y), angle=angle, trace_template=_trace_template[0])
+
+
+def _build(cell):
+    cell.get_default_view(i3.LayoutView).layout
+    return cell
+
+
+def run_manhattan(length, offset):
+    return _build(manhattan(start_port=_port(0.0, 0.0, 0.0), end_port=_port(length, offset, 180.0),
+                            bend_radius=10.0))
+
+
+def run_bezier_sbend(length, offset):
+    return _build(bezier_sbend(start_port=_port(0.0, 0.0, 0.0), end_port=_port(length, offset, 180.0)))
+
+
+def run_bezier_bend(size):
+    return _build(bezier_bend(start_port=_port(0.0, 0.0, 0.0), end_port=_port(size, size, 270.0)))
+
+
+def run_bezier_ubend_fixed_bend_radius(spacing, length):
+    return _build(bezier_ubend_fixed_bend_radius(start_port=_port(0.0, 0.0, 0.0), end_port=_port(0.0, spacing, 0.0),
+                                                 bend_radius=20.0, adiabatic_angle=10.0, length=length))
+
+
+def run_route_manhattan_control_points(n_points):
+    control_points = [(50.0 * (i + 1), 100.0 * (i % 2)) for i in range(n_points)]
+    route = RouteManhattanControlPoints(input_port=_port(0.0, 0.0, 0.0),
+                                        output_port=_port(50.0 * (n_points + 1), 0.0, 180.0),
+                                        control_points=control_points,
+                                        bend_radius=10.0)
+    return route.points
+
+
+def run_combine_connectors(n_connectors):
+    transformations = [(100.0 * (i + 1), 50.0 * ((i + 1) % 2), 0.0) for i in range(n_connectors - 1)]
+    connector = combine_connectors(connector_functions=[bezier_sbend] * n_connectors,
+                                   transformations=transformations)
+    return _build(connector(start_port=_port(0.0, 0.0, 0.0),
+                            end_port=_port(100.0 * n_connectors, 50.0 * (n_connectors % 2), 180.0)))
+
+
+def get_benchmarks(quick=False):
+    """Returns the routing benchmarks. With quick, fewer parameter sets are used."""
+    offsets = [5.0, 50.0] if quick else [5.0, 20.0, 50.0, 200.0]
+    benchmarks = [
+        Benchmark("manhattan", run_manhattan, [{"length": 300.0, "offset": o} for o in offsets],
+                  setup=cold_start),
+        Benchmark("bezier_sbend", run_bezier_sbend, [{"length": 100.0, "offset": o} for o in offsets],
+                  setup=cold_start),
+        Benchmark("bezier_bend", run_bezier_bend, [{"size": s} for s in ([20.0] if quick else [10.0, 20.0, 50.0])],
+                  setup=cold_start),
+        Benchmark("bezier_ubend_fixed_bend_radius", run_bezier_ubend_fixed_bend_radius,
+                  [{"spacing": 100.0, "length": l} for l in ([400.0] if quick else [300.0, 400.0, 600.0])],
+                  setup=cold_start),
+        Benchmark("RouteManhattanControlPoints", run_route_manhattan_control_points,
+                  [{"n_points": n} for n in ([2] if quick else [1, 2, 4, 8])],
+                  setup=cold_start),
+        Benchmark("combine_connectors", run_combine_connectors,
+                  [{"n_connectors": n} for n in ([2] if quick else [2, 4, 8])],
+                  setup=cold_start),
+    ]
+    return benchmarks
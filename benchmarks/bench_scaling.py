@@ -0,0 +1,236 @@
+"""Scaling sweeps of the generated topologies.
+
+Each generator is built for a range of its size parameter. For every size the build time, the peak memory and the
+number of instances and connectors are recorded. The complexity exponent b of cost ~ instances ** b is then fitted
+on a log-log scale. A topology whose build time grows faster than its instance count (b above 1 + tolerance) is
+flagged, as this points to quadratic validation or lookups in the build.
+
+Usage::
+
+    python benchmarks/bench_scaling.py
+    python benchmarks/bench_scaling.py --topology Reck --output reck_scaling.json
+
+The exit code is 1 when a topology is flagged.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+from ipkiss3 import all as i3
+from circuit.profiling import enable_profiling, disable_profiling, get_build_profiler
+from caches import cold_start
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scaling.json")
+DEFAULT_TOLERANCE = 0.25
+
+
+def _splitter_tree(levels):
+    from splittertree import SplitterTree
+    return SplitterTree(levels=levels)
+
+
+def _reck(levels):
+    from reck import Reck
+    return Reck(levels=levels)
+
+
+def _crossing_array(level):
+    from crossing_array import CrossingArray
+    return CrossingArray(level=level)
+
+
+def _celment(dim):
+    from celment import Celment
+    return Celment(dim=dim)
+
+
+# name: (cell factory, size parameter, sizes, quick sizes)
+TOPOLOGIES = {
+    "SplitterTree": (_splitter_tree, "levels", [2, 3, 4, 5, 6, 7], [2, 3, 4]),
+    "Reck": (_reck, "levels", [3, 4, 6, 8, 10, 12], [3, 4, 6]),
+    "CrossingArray": (_crossing_array, "level", [2, 4, 6, 8, 12, 16], [2, 4, 6]),
+    "Celment": (_celment, "dim", [4, 6, 8, 10, 12, 16], [4, 6, 8]),
+}
+
+
+class _PeakMemory(object):
+    """Measures the peak memory of a block in bytes.
+
+    tracemalloc gives the peak of the Python allocations in the block. Without it, the increase of the maximum
+    resident set size of the process is used, which is 0 when the block stays below an earlier peak.
+    """
+
+    def __enter__(self):
+        if tracemalloc is not None:
+            tracemalloc.start()
+        elif resource is not None:
+            self._start = self._max_rss()
+        self.peak = None
+        return self
+
+    def __exit__(self, *args):
+        if tracemalloc is not None:
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        elif resource is not None:
+            self.peak = self._max_rss() - self._start
+
+    @staticmethod
+    def _max_rss():
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _phase_totals():
+    totals = dict()
+    for row in get_build_profiler().report():
+        # Self times, the inclusive totals of nested phases would count the child builds more than once
+        totals[row["phase"]] = totals.get(row["phase"], 0.0) + row["self"]
+    return totals
+
+
+def measure_build(factory, size, memory=True):
+    """Builds a fresh cell of the given size and returns its measurements."""
+    cold_start()
+    gc.collect()
+    cell = factory(size)
+    enable_profiling()
+    start = time.time()
+    layout = cell.get_default_view(i3.LayoutView)
+    layout.layout
+    layout.ports
+    elapsed = time.time() - start
+    disable_profiling()
+    measurement = {"size": size,
+                   "time": elapsed,
+                   "instances": len(layout.instances),
+                   "connectors": len(cell.connectors),
+                   "phases": _phase_totals()}
+    if memory:
+        # Memory tracing slows down the build, so the peak memory is measured in a separate build.
+        cold_start()
+        gc.collect()
+        cell = factory(size)
+        with _PeakMemory() as peak:
+            cell.get_default_view(i3.LayoutView).layout
+        measurement["peak_memory"] = peak.peak
+    return measurement
+
+
+def fit_exponent(x, y):
+    """Fits y ~ c * x ** b on a log-log scale and returns b, or None with fewer than 2 usable points."""
+    points = [(a, b) for a, b in zip(x, y) if a is not None and b is not None and a > 0 and b > 0]
+    if len(set(p[0] for p in points)) < 2:
+        return None
+    log_x, log_y = np.log(np.array(points, dtype=float)).T
+    return float(np.polyfit(log_x, log_y, 1)[0])
+
+
+def sweep(name, sizes=None, quick=False, memory=True, tolerance=DEFAULT_TOLERANCE):
+    """Sweeps the size parameter of a topology.
+
+    Parameters
+    ----------
+    name : str
+        Name of the topology in TOPOLOGIES
+    sizes : list of int, optional
+        Sizes to build, the default sizes of the topology by default
+    quick : bool, optional
+        Use the smaller quick sizes
+    memory : bool, optional
+        Also measure the peak memory
+    tolerance : float, optional
+        The topology is flagged when the time exponent exceeds 1 + tolerance
+
+    Returns
+    -------
+    result : dict
+        Measurements per size, fitted exponents and the flag
+    """
+    factory, parameter, default_sizes, quick_sizes = TOPOLOGIES[name]
+    if sizes is None:
+        sizes = quick_sizes if quick else default_sizes
+    measurements = [measure_build(factory, size, memory=memory) for size in sizes]
+    instances = [m["instances"] for m in measurements]
+    exponents = {
+        "instances_vs_size": fit_exponent(sizes, instances),
+        "time_vs_instances": fit_exponent(instances, [m["time"] for m in measurements]),
+        "memory_vs_instances": fit_exponent(instances, [m.get("peak_memory") for m in measurements]),
+    }
+    phases = set()
+    for m in measurements:
+        phases.update(m["phases"])
+    exponents["phases_vs_instances"] = dict(
+        (phase, fit_exponent(instances, [m["phases"].get(phase) for m in measurements])) for phase in sorted(phases))
+    time_exponent = exponents["time_vs_instances"]
+    return {"topology": name,
+            "parameter": parameter,
+            "measurements": measurements,
+            "exponents": exponents,
+            "flagged": time_exponent is not None and time_exponent > 1.0 + tolerance}
+
+
+def format_sweep(result):
+    """Returns a sweep result as a text table, followed by the fitted exponents."""
+    lines = ["{} ({})".format(result["topology"], result["parameter"])]
+    for m in result["measurements"]:
+        memory = m.get("peak_memory")
+        lines.append("  {:>4}  {:>6} instances  {:>6} connectors  {:9.3f} s  {}".format(
+            m["size"], m["instances"], m["connectors"], m["time"],
+            "{:9.1f} MB".format(memory / 1e6) if memory is not None else "-"))
+    exponents = result["exponents"]
+
+    def _fmt(value):
+        return "-" if value is None else "{:.2f}".format(value)
+
+    lines.append("  time ~ instances ** {}, memory ~ instances ** {}".format(
+        _fmt(exponents["time_vs_instances"]), _fmt(exponents["memory_vs_instances"])))
+    for phase, exponent in sorted(exponents["phases_vs_instances"].items()):
+        lines.append("    {:<12} ~ instances ** {}".format(phase, _fmt(exponent)))
+    if result["flagged"]:
+        lines.append("  FLAGGED: build time grows faster than the instance count")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling sweeps of the generated topologies")
+    parser.add_argument("--topology", action="append", choices=sorted(TOPOLOGIES),
+                        help="Topology to sweep, can be repeated. All topologies by default")
+    parser.add_argument("--quick", action="store_true", help="Only build the smaller sizes")
+    parser.add_argument("--no-memory", action="store_true", help="Don't measure the peak memory")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Flag a topology when its time exponent exceeds 1 + tolerance")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file the results are written to")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.topology or sorted(TOPOLOGIES):
+        result = sweep(name, quick=args.quick, memory=not args.no_memory, tolerance=args.tolerance)
+        print(format_sweep(result))
+        results.append(result)
+    with open(args.output, "w") as f:
+        json.dump({"tolerance": args.tolerance, "sweeps": results}, f, indent=2, sort_keys=True)
+    return 1 if any(r["flagged"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""Resets the process to a cold start before a timed build.
+
+Every table that the circuit package and the models fill during a build is emptied, and the persistent connector
+cache is disabled, also when CIRCUIT_CONNECTOR_CACHE is set. A timing taken after cold_start() therefore measures a
+first build, not cache hits.
+"""
+
+from circuit.cell_registry import clear_cell_registry
+from circuit.connector_cache import set_default_connector_cache
+from circuit.connector_functions import clear_sbend_rounding_cache, clear_bend_length_cache
+from circuit.utils import clear_bend_size_cache, clear_bezier_ra_registry
+from circuit.geometry import clear_layout_geometry_cache
+from circuit.bbox import clear_bounding_box_cache
+from circuit.incremental import get_connector_build_store
+from circuit.waveguides.generic.trace import clear_n_eff_cache
+from phaseshifter import clear_phase_caches
+
+
+def cold_start(**kwargs):
+    """Disables the persistent connector cache and empties all in-memory caches. Accepts and ignores keyword
+    arguments, so it can be used as the setup of a Benchmark."""
+    set_default_connector_cache(None)
+    clear_cell_registry()
+    clear_sbend_rounding_cache()
+    clear_bend_length_cache()
+    clear_bezier_ra_registry()
+    clear_bend_size_cache()
+    clear_layout_geometry_cache()
+    clear_bounding_box_cache()
+    get_connector_build_store().clear()
+    clear_n_eff_cache()
+    clear_phase_caches()
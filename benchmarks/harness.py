@@ -0,0 +1,141 @@
+"""Timing harness, history file and regression checks for the benchmarks.
+
+A benchmark is a named function that is timed for a list of parameter sets. Each timing is the best and the median
+of `repeat` calls, after one warm-up call. Results are appended to a history file with one JSON object per line.
+A result is a regression when its best time is more than `threshold` times the baseline, which is the median of
+the best times of the previous `baseline_runs` runs with the same benchmark name and parameters.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl")
+DEFAULT_THRESHOLD = 1.25
+DEFAULT_BASELINE_RUNS = 5
+
+
+class Benchmark(object):
+    """Benchmark of a function over a list of parameter sets.
+
+    Parameters
+    ----------
+    name : str
+        Name of the benchmark
+    function : function
+        Function that is timed, called as function(**params)
+    params : list of dict
+        Parameter sets
+    setup : function, optional
+        Called as setup(**params) before every timed call, outside the timing. If it returns a dict, the dict is
+        passed to the function as extra keyword arguments.
+    repeat : int, optional
+        Number of timed calls per parameter set
+    threshold : float, optional
+        Regression threshold of this benchmark, the threshold of the run by default
+    """
+
+    def __init__(self, name, function, params, setup=None, repeat=5, threshold=None):
+        self.name = name
+        self.function = function
+        self.params = params
+        self.setup = setup
+        self.repeat = repeat
+        self.threshold = threshold
+
+    def _call(self, params):
+        kwargs = dict(params)
+        if self.setup is not None:
+            extra = self.setup(**params)
+            if extra:
+                kwargs.update(extra)
+        start = time.time()
+        self.function(**kwargs)
+        return time.time() - start
+
+    def run(self, repeat=None):
+        """Times the function for all parameter sets and returns a list of result dicts."""
+        repeat = self.repeat if repeat is None else repeat
+        results = []
+        for params in self.params:
+            self._call(params)
+            timings = sorted(self._call(params) for _ in range(repeat))
+            results.append({"name": self.name,
+                            "params": params,
+                            "repeat": repeat,
+                            "best": timings[0],
+                            "median": timings[len(timings) // 2],
+                            "threshold": self.threshold})
+        return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def _result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def load_history(filename=DEFAULT_HISTORY):
+    """Returns the list of results in a history file."""
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(results, filename=DEFAULT_HISTORY):
+    """Appends results to a history file, together with the time, git commit and Python version of the run."""
+    run_info = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": sys.platform}
+    with open(filename, "a") as f:
+        for result in results:
+            entry = dict(run_info)
+            entry.update(result)
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def check_regressions(results, history, threshold=DEFAULT_THRESHOLD, baseline_runs=DEFAULT_BASELINE_RUNS):
+    """Compares results with the history.
+
+    Returns
+    -------
+    regressions : list of dict
+        Results whose best time exceeds threshold times the baseline, with the baseline and the ratio added
+    """
+    previous = dict()
+    for entry in history:
+        previous.setdefault(_result_key(entry), []).append(entry["best"])
+    regressions = []
+    for result in results:
+        bests = previous.get(_result_key(result), [])[-baseline_runs:]
+        if not bests:
+            continue
+        baseline = sorted(bests)[len(bests) // 2]
+        limit = result.get("threshold") or threshold
+        ratio = result["best"] / baseline if baseline > 0 else float("inf")
+        if ratio > limit:
+            regression = dict(result)
+            regression.update({"baseline": baseline, "ratio": ratio})
+            regressions.append(regression)
+    return regressions
+
+
+def format_results(results):
+    """Returns the results as a text table."""
+    lines = []
+    for r in results:
+        params = ", ".join("{}={}".format(k, v) for k, v in sorted(r["params"].items()))
+        lines.append("{:<40} {:<40} best {:9.4f} s   median {:9.4f} s".format(r["name"], params, r["best"],
+                                                                             r["median"]))
+    return "\n".join(lines)
@@ -0,0 +1,68 @@
+"""Runs the benchmarks, records them in the history file and checks for regressions.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --suite all
+    python benchmarks/run_benchmarks.py --suite routing --quick --no-record
+
+The exit code is 1 when a benchmark is slower than the regression threshold times its baseline.
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import (DEFAULT_HISTORY, DEFAULT_THRESHOLD, DEFAULT_BASELINE_RUNS, load_history, append_history,
+                     check_regressions, format_results)
+
+
+def get_benchmarks(suite, quick):
+    benchmarks = []
+    if suite in ("routing", "all"):
+        import bench_routing
+        benchmarks += bench_routing.get_benchmarks(quick=quick)
+    if suite in ("builds", "all"):
+        import bench_builds
+        benchmarks += bench_builds.get_benchmarks(quick=quick)
+    return benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the circuit package")
+    parser.add_argument("--suite", choices=["routing", "builds", "all"], default="all")
+    parser.add_argument("--quick", action="store_true", help="Use fewer and smaller parameter sets")
+    parser.add_argument("--filter", default=None, help="Only run benchmarks whose name matches this pattern")
+    parser.add_argument("--repeat", type=int, default=None, help="Number of timed calls per parameter set")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="History file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Ratio to the baseline above which a result is a regression")
+    parser.add_argument("--baseline-runs", type=int, default=DEFAULT_BASELINE_RUNS,
+                        help="Number of previous runs in the baseline")
+    parser.add_argument("--no-record", action="store_true", help="Don't append the results to the history file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for benchmark in get_benchmarks(args.suite, args.quick):
+        if args.filter is not None and not re.search(args.filter, benchmark.name):
+            continue
+        benchmark_results = benchmark.run(repeat=args.repeat)
+        print(format_results(benchmark_results))
+        results += benchmark_results
+
+    regressions = check_regressions(results, load_history(args.history), threshold=args.threshold,
+                                    baseline_runs=args.baseline_runs)
+    if not args.no_record:
+        append_history(results, args.history)
+
+    for r in regressions:
+        print("REGRESSION {} {}: {:.4f} s is {:.2f} times the baseline of {:.4f} s".format(
+            r["name"], r["params"], r["best"], r["ratio"], r["baseline"]))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
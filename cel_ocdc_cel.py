@@ -1,27 +1,16 @@
 from CSiP180Al import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, bezier_sbend, manhattan
+from circuit.all import CircuitCell, bezier_sbend, manhattan, shared_cell, get_layout_geometry
 from bond_pad import BondPad
 import re
-from time import time
-from functools import wraps, partial
+from functools import partial
+from circuit.profiling import profiled
 
 from ocdc import OCDC
 from celment import Celment
 from bond_pad import BondPad
 
 
-def timethis(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        start = time()
-        r = func(*args, **kwargs)
-        end = time()
-        print(end - start)
-        return r
-    return wrapper
-
-
 class CelOCDCCel(CircuitCell):
     _name_prefix = "Celment-OCDC-Celment"
     celment_block = i3.ChildCellProperty(doc="Celment")
@@ -38,22 +27,20 @@ class CelOCDCCel(CircuitCell):
     def _default_ocdc_block(self):
         return OCDC(levels=self.level, mzi_nums=2, plus_in=True)
 
-    @timethis
     def _default_child_cells(self):
         child_cells = dict()
         child_cells["cel_in"] = self.celment_block
         child_cells["cel_out"] = self.celment_block
         for i in range(self.dim):
             child_cells["ocdc_{}".format(i)] = self.ocdc_block
-            child_cells["gr_in_{}".format(i)] = pdk.GC_TE_1550()
-            child_cells["gr_out_{}".format(i)] = pdk.GC_TE_1550()
-        child_cells["ref_gr_in"] = pdk.GC_TE_1550()
-        child_cells["ref_gr_out"] = pdk.GC_TE_1550()
-        child_cells["gr_ocdc0_out"] = pdk.GC_TE_1550()
-        child_cells["gr_ocdc2_out"] = pdk.GC_TE_1550()
+            child_cells["gr_in_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
+            child_cells["gr_out_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
+        child_cells["ref_gr_in"] = shared_cell(pdk.GC_TE_1550)
+        child_cells["ref_gr_out"] = shared_cell(pdk.GC_TE_1550)
+        child_cells["gr_ocdc0_out"] = shared_cell(pdk.GC_TE_1550)
+        child_cells["gr_ocdc2_out"] = shared_cell(pdk.GC_TE_1550)
         return child_cells
 
-    @timethis
     def _default_place_specs(self):
         place_specs = []
 
@@ -61,11 +48,11 @@ class CelOCDCCel(CircuitCell):
         # gr_len = self.child_cells["gr_in_0"].get_default_view(i3.LayoutView).size_info().east
         cel_spy = self.celment_block.get_spacing_y()
         cel_spx = self.celment_block.get_spacing_x()
-        celment_len = self.celment_block.get_default_view(i3.LayoutView).size_info().east
-        celment_height = self.celment_block.get_default_view(i3.LayoutView).size_info().north
-        ocdc_len = self.ocdc_block.get_default_view(i3.LayoutView).size_info().east
-        ocdc_height = self.ocdc_block.get_default_view(i3.LayoutView).size_info().north - \
-                      self.ocdc_block.get_default_view(i3.LayoutView).size_info().south
+        celment_len = get_layout_geometry(self.celment_block).east
+        celment_height = get_layout_geometry(self.celment_block).north
+        ocdc_len = get_layout_geometry(self.ocdc_block).east
+        ocdc_height = get_layout_geometry(self.ocdc_block).north - \
+                      get_layout_geometry(self.ocdc_block).south
 
         # the input and output grating
         gr_displacement = (self.dim + 0.5) * cel_spy
@@ -95,16 +82,16 @@ class CelOCDCCel(CircuitCell):
 
         return place_specs
 
-    @timethis
+    @profiled("connectors_spec")
     def _default_connectors(self):
         conn = []
         cel_spy = self.celment_block.get_spacing_y()
         cel_spx = self.celment_block.get_spacing_x()
-        celment_len = self.celment_block.get_default_view(i3.LayoutView).size_info().east
-        celment_height = self.celment_block.get_default_view(i3.LayoutView).size_info().north
-        ocdc_len = self.ocdc_block.get_default_view(i3.LayoutView).size_info().east
-        ocdc_height = self.ocdc_block.get_default_view(i3.LayoutView).size_info().north - \
-                      self.ocdc_block.get_default_view(i3.LayoutView).size_info().south
+        celment_len = get_layout_geometry(self.celment_block).east
+        celment_height = get_layout_geometry(self.celment_block).north
+        ocdc_len = get_layout_geometry(self.ocdc_block).east
+        ocdc_height = get_layout_geometry(self.ocdc_block).north - \
+                      get_layout_geometry(self.ocdc_block).south
         ocdc_spacing = self.spacing_y + ocdc_height
         ocdc_displacement = -((self.dim - 1) / 2.0 * ocdc_spacing)
         ocdc_x = celment_height + self.spacing_x
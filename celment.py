@@ -1,7 +1,7 @@
 from CSiP180Al import all as pdk
 from ipcore.exceptions.exc import PropertyValidationError
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan
+from circuit.all import CircuitCell, manhattan, shared_cell, get_layout_geometry
 from PhMZI import PhMZI
 from circuit.utils import get_port_from_interface
 
@@ -27,11 +27,11 @@ class Celment(CircuitCell):
         return PhMZI()
 
     def _default_spacing_x(self):
-        return 2 * self.unit_block.get_default_view(i3.LayoutView).size_info().east + 40
+        return 2 * get_layout_geometry(self.unit_block).east + 40
 
     def _default_spacing_y(self):
-        return 1.5 * (self.unit_block.get_default_view(i3.LayoutView).size_info().north -
-                      self.unit_block.get_default_view(i3.LayoutView).size_info().south) - 50
+        return 1.5 * (get_layout_geometry(self.unit_block).north -
+                      get_layout_geometry(self.unit_block).south) - 50
 
 
 
@@ -55,17 +55,17 @@ class Celment(CircuitCell):
         # the input and out grating
         if self.f_grating_io:
             for i in range(self.dim):
-                child_cells["gr_in_{}".format(i)] = pdk.GC_TE_1550()
-                child_cells["gr_out_{}".format(i)] = pdk.GC_TE_1550()
+                child_cells["gr_in_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
+                child_cells["gr_out_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
         return child_cells
 
     def _default_place_specs(self):
-        offset = self.unit_block.get_default_view(i3.LayoutView).size_info().east / 2
+        offset = get_layout_geometry(self.unit_block).east / 2
         spacing_x = self.spacing_x
         spacing_y = self.spacing_y
         gr_len = 0
         if self.f_grating_io:
-            gr_len = self.child_cells["gr_in_0"].get_default_view(i3.LayoutView).size_info().east
+            gr_len = get_layout_geometry(self.child_cells["gr_in_0"]).east
 
         place_specs = []
         # place the input and output gratings
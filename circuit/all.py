@@ -16,3 +16,6 @@
 from .circuitcell import CircuitCell
 from .connector_functions import *
 from .combine_connectors import combine_connectors
+from .geometry import get_layout_geometry
+from .bbox import get_bounding_box
+from .cell_registry import shared_cell, cell_registry_info, clear_cell_registry
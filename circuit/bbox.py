@@ -0,0 +1,120 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Hierarchical bounding boxes with a cache per cell.
+
+The bounding box of a cell is the union of the boxes of its own elements and the boxes of its instances. The box of
+an instance is found by transforming the four corners of the (cached) box of its reference cell, so the polygons of
+a child cell are only visited once, the first time a box of that cell is requested. A size query on a top-level cell
+then costs in the order of the number of instances in the hierarchy instead of the number of polygons.
+
+Boxes are tuples (west, south, east, north). CircuitCells cache their box with `i3.cache`
+(CircuitCell.get_bounding_box), other cells are kept in a bounded table together with their layout view. A new
+layout view, as created by `cell.Layout(...)`, invalidates the entry.
+"""
+
+import numpy as np
+from ipkiss3 import all as i3
+from .lru_cache import LRUCache
+
+EMPTY_BOX = None
+
+
+def get_instance_transformation(instance):
+    """Returns (translation, rotation, magnification, v_flip) of an instance. The mirroring around the x-axis is
+    applied first, then the magnification and the rotation (in degrees) and finally the translation."""
+    transformation = instance.transformation
+    position = getattr(instance, "position", (0.0, 0.0))
+    if transformation is None:
+        return (position[0], position[1]), 0.0, 1.0, False
+    translation = getattr(transformation, "translation", (0.0, 0.0))
+    return ((translation[0] + position[0], translation[1] + position[1]),
+            getattr(transformation, "rotation", 0.0) % 360.0,
+            getattr(transformation, "magnification", 1.0),
+            bool(getattr(transformation, "v_flip", False)))
+
+
+def transform_box(box, translation, rotation=0.0, magnification=1.0, v_flip=False):
+    """Returns the bounding box of the four transformed corners of a box."""
+    if box is EMPTY_BOX:
+        return EMPTY_BOX
+    west, south, east, north = box
+    corners = np.array([[west, south], [east, south], [east, north], [west, north]], dtype=float)
+    if v_flip:
+        corners[:, 1] = -corners[:, 1]
+    angle = np.deg2rad(rotation)
+    c, s = np.cos(angle) * magnification, np.sin(angle) * magnification
+    x = corners[:, 0] * c - corners[:, 1] * s + translation[0]
+    y = corners[:, 0] * s + corners[:, 1] * c + translation[1]
+    return float(x.min()), float(y.min()), float(x.max()), float(y.max())
+
+
+def union_box(box1, box2):
+    """Returns the bounding box of two boxes."""
+    if box1 is EMPTY_BOX:
+        return box2
+    if box2 is EMPTY_BOX:
+        return box1
+    return min(box1[0], box2[0]), min(box1[1], box2[1]), max(box1[2], box2[2]), max(box1[3], box2[3])
+
+
+def _element_box(element):
+    size_info = element.size_info()
+    if size_info.west > size_info.east:
+        # Empty element
+        return EMPTY_BOX
+    return size_info.west, size_info.south, size_info.east, size_info.north
+
+
+def calculate_bounding_box(layout):
+    """Calculates the bounding box of a layout view from its elements and the cached boxes of its instances."""
+    box = EMPTY_BOX
+    for el in layout.layout:
+        if isinstance(el, (i3.SRef, i3.ARef)):
+            child_box = get_bounding_box(el.reference)
+            if isinstance(el, i3.ARef) and child_box is not EMPTY_BOX:
+                columns, rows = el.n_o_periods
+                child_box = union_box(child_box, (child_box[0] + (columns - 1) * el.period[0],
+                                                  child_box[1] + (rows - 1) * el.period[1],
+                                                  child_box[2] + (columns - 1) * el.period[0],
+                                                  child_box[3] + (rows - 1) * el.period[1]))
+            translation, rotation, magnification, v_flip = get_instance_transformation(el)
+            box = union_box(box, transform_box(child_box, translation, rotation, magnification, v_flip))
+        elif hasattr(el, "size_info"):
+            box = union_box(box, _element_box(el))
+    return box
+
+
+_box_cache = LRUCache(maxsize=4096)
+
+
+def get_bounding_box(cell):
+    """Returns the cached bounding box (west, south, east, north) of the default layout view of a cell, or None if
+    the layout is empty."""
+    if hasattr(cell, "get_bounding_box"):
+        return cell.get_bounding_box()
+    layout = cell.get_default_view(i3.LayoutView)
+    entry = _box_cache.get(id(cell))
+    if entry is None or entry[0] is not cell or entry[1] is not layout:
+        # The cell is stored with its box, so that its id can't be reused by another cell, and the layout view so
+        # that a new layout of the cell is detected.
+        entry = (cell, layout, calculate_bounding_box(layout))
+        _box_cache[id(cell)] = entry
+    return entry[2]
+
+
+def clear_bounding_box_cache():
+    """Empties the table with the bounding boxes of cells that are not CircuitCells."""
+    _box_cache.clear()
@@ -0,0 +1,106 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Registry of shared PCells.
+
+Child cells with the same class and the same parameters have the same layout, ports and size_info. When they are
+requested through `shared_cell`, a single PCell is created for each unique combination of class and parameters
+and returned to all callers, so these views are only calculated once.
+
+Parameters are compared by value (numbers, strings, sequences, dictionaries, ...) with the fingerprints of
+circuit.fingerprint. Parameters that are PCells or other objects without a value fingerprint are compared by
+identity, so cells built from shared cells are shared as well.
+
+Shared cells must not be modified after they are created, because the change would be seen by all users.
+
+Example::
+
+    gr = shared_cell(pdk.GC_TE_1550)
+    assert gr is shared_cell(pdk.GC_TE_1550)
+"""
+
+from .fingerprint import fingerprint, FingerprintError
+
+
+def _parameter_key(value):
+    if isinstance(value, (list, tuple)):
+        return ("sequence", type(value).__name__) + tuple(_parameter_key(v) for v in value)
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((str(k), _parameter_key(v)) for k, v in value.items()))
+    try:
+        return "value", fingerprint(value)
+    except FingerprintError:
+        return "identity", id(value)
+
+
+class CellRegistry(object):
+    """Registry that returns one PCell per class and parameter values."""
+
+    def __init__(self):
+        self._cells = dict()
+        self.requests = 0
+
+    def get(self, cell_class, **kwargs):
+        """Returns the shared cell_class(**kwargs), creating it on the first request."""
+        self.requests += 1
+        key = ("{}.{}".format(cell_class.__module__, cell_class.__name__), id(cell_class),
+               _parameter_key(kwargs))
+        if key not in self._cells:
+            # The parameters are stored with the cell, so that the objects compared by identity stay alive.
+            self._cells[key] = (cell_class(**kwargs), kwargs)
+        return self._cells[key][0]
+
+    def __len__(self):
+        return len(self._cells)
+
+    def clear(self):
+        self._cells.clear()
+        self.requests = 0
+
+    def info(self):
+        """Returns the number of requests, unique cells and collapsed duplicates."""
+        return {"requests": self.requests,
+                "unique_cells": len(self._cells),
+                "duplicates_collapsed": self.requests - len(self._cells)}
+
+
+_cell_registry = CellRegistry()
+
+
+def shared_cell(cell_class, **kwargs):
+    """Returns a PCell of class cell_class with the keyword arguments kwargs, shared with all other requests for the
+    same class and parameters.
+
+    Parameters
+    ----------
+    cell_class : PCell class
+    kwargs :
+        Properties of the cell
+
+    Returns
+    -------
+    cell : PCell
+    """
+    return _cell_registry.get(cell_class, **kwargs)
+
+
+def cell_registry_info():
+    """Returns the number of requests, unique cells and collapsed duplicates of the shared cell registry."""
+    return _cell_registry.info()
+
+
+def clear_cell_registry():
+    """Empties the shared cell registry."""
+    _cell_registry.clear()
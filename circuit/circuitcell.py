@@ -18,8 +18,17 @@ import collections
 from ipkiss3.pcell.layout.netlist_extraction.netlist_extraction import extract_unconnected_ports
 from ipkiss3.pcell.netlist.instance import InstanceTerm
 import warnings
-from .utils import get_port_from_interface, multiple_entries
+from .utils import get_port_from_interface, build_port_index, multiple_entries
 from .connector_functions import manhattan
+from .parallel import compute_connector_shapes, compute_bezier_sbend_shapes
+from .connector_cache import get_default_connector_cache
+from .crossing.crossing_utils import insert_crossings
+from .gdsii_stream import write_gdsii_stream
+from .geometry import LayoutGeometry
+from .bbox import calculate_bounding_box
+from .profiling import profile_phase
+from .incremental import instance_fingerprint, incremental_builds_enabled, get_connector_build_store
+from .netlist_reduction import reduce_waveguide_netlist
 
 
 def get_child_instances(child_cells, joins=[], place_specs=[], verify=True):
@@ -48,7 +57,68 @@ def get_child_instances(child_cells, joins=[], place_specs=[], verify=True):
     return insts
 
 
-def get_connector_instances(instances, connectors, name, default_connector_function=manhattan):
+def _get_connector_function_and_kwargs(connector, default_connector_function):
+    connector_function = default_connector_function
+    if len(connector) > 2:
+        if connector[2] is not None:
+            connector_function = connector[2]
+    kwargs = {}
+    if len(connector) == 4:
+        if connector[3] is not None:
+            kwargs = connector[3]
+    return connector_function, kwargs
+
+
+def _build_connector(connector, connector_function, kwargs, start_port, end_port, c_cell_name):
+    """Builds the connector cell and forces its layout. If the connector function fails, a cell with an error
+    element between the two ports is returned instead.
+
+    Returns
+    -------
+    cell, succeeded : PCell, bool
+    """
+    c = connector
+    try:
+        kwargs = dict(kwargs)
+        kwargs.update({"start_port": start_port,
+                       "end_port": end_port,
+                       "name": c_cell_name})
+
+        with profile_phase("connector", connector_function):
+            cell = connector_function(**kwargs)
+            cell.get_default_view(i3.LayoutView).layout
+        succeeded = True
+    except Exception as exp:
+        if hasattr(connector_function, __name__):
+            c_name = connector_function.__name__
+        else:
+            c_name = str(connector_function)
+
+        c_title = "({},{},{})".format(c[0], c[1], c_name)
+        print
+        msg = """
+        Connector Error {} - using adding an element instead:
+        - start_port: {}
+        - end_port: {}
+        - connector_function: {}
+        - connector_function_error: {}
+        """.format(c_title, start_port.position, end_port.position, c_name, exp)
+        warnings.warn(msg)
+        cell = i3.LayoutCell(name=c_cell_name+"_error")
+        if hasattr(i3.TECH.PPLAYER, "ERROR"):
+            err_layer = i3.TECH.PPLAYER.ERROR.GENERIC
+        else:
+            err_layer = i3.TECH.PPLAYER.NONE
+        err_el = i3.Path(shape=[start_port.position, end_port.position],
+                         layer=err_layer)
+
+        cell.Layout(elements=[err_el])
+        succeeded = False
+    return cell, succeeded
+
+
+def get_connector_instances(instances, connectors, name, default_connector_function=manhattan, n_workers=1,
+                            port_index=None, connector_cache=None, build_store=None, build_report=None):
     """Returns a dictionary of connector instances.
     Parameters
     ----------
@@ -59,60 +129,93 @@ def get_connector_instances(instances, connectors, name, default_connector_funct
     name : str
         Name of the parent cell - all the connectors will be prepended with that name
     default_connector_function : connector function, optional
+    n_workers : int, optional
+        Number of worker processes used to calculate the connector shapes. With 1, all connectors are built serially.
+        Connectors whose shape can't be calculated in a worker process are always built serially.
+    port_index : dict, optional
+        Index {(instance_name, port_name): port} of the instances, built from instances if not given
+    connector_cache : ConnectorCache, optional
+        Persistent cache of connector shapes
+    build_store : ConnectorBuildStore, optional
+        Store of the connector cells of previous builds. Connectors with the same function, arguments and endpoint
+        instances as a stored one reuse the stored cell, all others are built and added to the store.
+    build_report : dict, optional
+        Filled with the names of the "reused" and "regenerated" connectors
     Return
     -------
     connector_instances : i3.InstanceDict()
         Dictionary of connector instances
     """
-    connector_instances = i3.InstanceDict()
+    if port_index is None:
+        port_index = build_port_index(instances)
+    resolved_connectors = []
     for cnt, c in enumerate(connectors):
-        start_port = get_port_from_interface(port_id=c[0], inst_dict=instances)
-        end_port = get_port_from_interface(port_id=c[1], inst_dict=instances)
-        connector_function = default_connector_function
-        if len(c) > 2:
-            if c[2] is not None:
-                connector_function = c[2]
-        kwargs = {}
-        if len(c) == 4:
-            if c[3] is not None:
-                kwargs = c[3]
+        start_port = get_port_from_interface(port_id=c[0], inst_dict=instances, port_index=port_index)
+        end_port = get_port_from_interface(port_id=c[1], inst_dict=instances, port_index=port_index)
+        connector_function, kwargs = _get_connector_function_and_kwargs(c, default_connector_function)
+        resolved_connectors.append((cnt, c, connector_function, kwargs, start_port, end_port))
+
+    stored_cells = dict()
+    build_keys = dict()
+    if build_store is not None:
+        instance_fingerprints = dict()
+
+        def get_instance_fingerprint(port_id):
+            inst_name = port_id.split(":")[0]
+            if inst_name not in instance_fingerprints:
+                instance_fingerprints[inst_name] = instance_fingerprint(instances[inst_name])
+            return instance_fingerprints[inst_name]
+
+        for cnt, c, connector_function, kwargs, start_port, end_port in resolved_connectors:
+            key = build_store.connector_key(connector_function=connector_function,
+                                            kwargs=kwargs,
+                                            start_port_id=c[0],
+                                            end_port_id=c[1],
+                                            start_instance_fingerprint=get_instance_fingerprint(c[0]),
+                                            end_instance_fingerprint=get_instance_fingerprint(c[1]))
+            if key is None:
+                continue
+            build_keys[cnt] = key
+            cell = build_store.get_cell(key)
+            if cell is not None:
+                stored_cells[cnt] = cell
+
+    shapes = dict()
+    if n_workers > 1 or connector_cache is not None:
+        shapes = compute_connector_shapes(
+            connectors=[(cnt, connector_function, kwargs, start_port, end_port)
+                        for cnt, c, connector_function, kwargs, start_port, end_port in resolved_connectors
+                        if cnt not in stored_cells],
+            n_workers=n_workers,
+            cache=connector_cache)
+    shapes.update(compute_bezier_sbend_shapes(
+        [(cnt, connector_function, kwargs, start_port, end_port)
+         for cnt, c, connector_function, kwargs, start_port, end_port in resolved_connectors
+         if cnt not in stored_cells and cnt not in shapes]))
 
+    connector_instances = i3.InstanceDict()
+    for cnt, c, connector_function, kwargs, start_port, end_port in resolved_connectors:
         c_cell_name = name + "_connector{}".format(cnt)
-
-        try:
-            kwargs.update({"start_port": start_port,
-                           "end_port": end_port,
-                           "name": c_cell_name})
-
-            cell = connector_function(**kwargs)
-            cell.get_default_view(i3.LayoutView).layout
-        except Exception as exp:
-            if hasattr(connector_function, __name__):
-                c_name = connector_function.__name__
-            else:
-                c_name = str(connector_function)
-
-            c_title = "({},{},{})".format(c[0], c[1], c_name)
-            print
-            msg = """
-        Connector Error {} - using adding an element instead:
-        - start_port: {}
-        - end_port: {}
-        - connector_function: {}
-        - connector_function_error: {}
-        """.format(c_title, start_port.position, end_port.position, c_name, exp)
-            warnings.warn(msg)
-            cell = i3.LayoutCell(name=c_cell_name+"_error")
-            if hasattr(i3.TECH.PPLAYER, "ERROR"):
-                err_layer = i3.TECH.PPLAYER.ERROR.GENERIC
-            else:
-                err_layer = i3.TECH.PPLAYER.NONE
-            err_el = i3.Path(shape=[start_port.position, end_port.position],
-                             layer=err_layer)
-
-            cell.Layout(elements=[err_el])
-
+        if cnt in stored_cells:
+            connector_instances += i3.SRef(name=c_cell_name, reference=stored_cells[cnt])
+            if build_report is not None:
+                build_report["reused"].append(c_cell_name)
+            continue
+        if cnt in shapes:
+            kwargs = dict(kwargs)
+            kwargs["shape"] = shapes[cnt]
+        cell, succeeded = _build_connector(connector=c,
+                                           connector_function=connector_function,
+                                           kwargs=kwargs,
+                                           start_port=start_port,
+                                           end_port=end_port,
+                                           c_cell_name=c_cell_name)
+        if succeeded and cnt in build_keys:
+            build_store.store_cell(build_keys[cnt], cell,
+                                   [instances[c[0].split(":")[0]], instances[c[1].split(":")[0]]])
         connector_instances += i3.SRef(name=c_cell_name, reference=cell)
+        if build_report is not None:
+            build_report["regenerated"].append(c_cell_name)
     return connector_instances
 
 
@@ -136,6 +239,20 @@ class CircuitCell(i3.PCell):
         restriction=i3.RestrictDictValueType(str))
     verify = i3.BoolProperty(default=True, doc="Verify the validity of the connectors, joins and place_specs")
     default_connector_function = i3.CallableProperty(default=manhattan)
+    n_workers = i3.PositiveIntProperty(default=1, doc="Number of worker processes used to calculate the shapes of "
+                                                      "the connectors. With 1, the connectors are built serially.")
+    connector_cache = i3.DefinitionProperty(allow_none=True,
+                                            doc="Persistent cache (ConnectorCache) of the connector shapes. "
+                                                "None disables the cache.")
+    incremental = i3.BoolProperty(doc="Reuse the connector cells of previous builds whose function, arguments and "
+                                      "endpoint instances are unchanged. Defaults to incremental_builds_enabled().")
+    auto_crossings = i3.BoolProperty(default=False, doc="Place crossing_cell on every intersection of the connectors "
+                                                        "and split the crossed connectors")
+    crossing_cell = i3.DefinitionProperty(allow_none=True, doc="Crossing cell with ports in1, out1, in2 and out2, "
+                                                               "used when auto_crossings is True")
+    reduce_waveguide_chains = i3.BoolProperty(default=False,
+                                              doc="Replace series chains of waveguides with the same trace template "
+                                                  "by one equivalent model in the netlist")
 
     def validate_properties(self):
         joins = self.joins
@@ -151,6 +268,11 @@ class CircuitCell(i3.PCell):
                                              error_cause=error_cause,
                                              error_var_values={"connectors": self.connectors,
                                                                "joins": self.joins})
+        if self.auto_crossings and self.crossing_cell is None:
+            raise i3.PropertyValidationError(error_class_instance=self,
+                                             error_cause="auto_crossings needs a crossing_cell",
+                                             error_var_values={"auto_crossings": self.auto_crossings,
+                                                               "crossing_cell": self.crossing_cell})
         return True
 
     def _default_propagated_electrical_ports(self):
@@ -171,18 +293,108 @@ class CircuitCell(i3.PCell):
     def _default_place_specs(self):
         return []
 
+    def _default_connector_cache(self):
+        return get_default_connector_cache()
+
+    def _default_crossing_cell(self):
+        return None
+
+    def _default_incremental(self):
+        return incremental_builds_enabled()
+
     @i3.cache()
     def get_child_instances(self):
-        return get_child_instances(child_cells=self.child_cells,
-                                   joins=self.joins,
-                                   place_specs=self.place_specs,
-                                   verify=self.verify)
+        with profile_phase("child_cells", type(self)):
+            child_cells = self.child_cells
+        with profile_phase("place_specs", type(self)):
+            place_specs = self.place_specs
+        with profile_phase("placement", type(self)):
+            return get_child_instances(child_cells=child_cells,
+                                       joins=self.joins,
+                                       place_specs=place_specs,
+                                       verify=self.verify)
+
+    @i3.cache()
+    def get_bounding_box(self):
+        """Returns the bounding box (west, south, east, north) of the layout. The boxes of the child cells are cached
+        per cell and combined by transforming their corners."""
+        return calculate_bounding_box(self.get_default_view(i3.LayoutView))
+
+    @i3.cache()
+    def get_geometry(self):
+        """Returns the LayoutGeometry (bounding box and port table) of the layout, calculated once per layout."""
+        return LayoutGeometry(self.get_default_view(i3.LayoutView), box=self.get_bounding_box())
+
+    @i3.cache()
+    def get_port_index(self):
+        """Returns a dictionary {(instance_name, port_name): port} of the ports of the child instances."""
+        return build_port_index(self.get_child_instances())
+
+    @i3.cache()
+    def _get_connector_build_holder(self):
+        # Mutable holder, so that release_layout can drop the connectors while i3.cache still invalidates the
+        # build when a property of the cell changes.
+        return [None]
+
+    def _get_connector_build(self):
+        holder = self._get_connector_build_holder()
+        if holder[0] is None:
+            instances = self.get_child_instances()
+            with profile_phase("connectors", type(self)):
+                holder[0] = self._build_connectors(instances)
+        return holder[0]
+
+    def _build_connectors(self, instances):
+        build_report = {"reused": [], "regenerated": []}
+        build_store = get_connector_build_store() if self.incremental else None
+        connector_instances = get_connector_instances(instances=instances,
+                                                      connectors=self.connectors,
+                                                      name=self.name,
+                                                      default_connector_function=self.default_connector_function,
+                                                      n_workers=self.n_workers,
+                                                      port_index=self.get_port_index(),
+                                                      connector_cache=self.connector_cache,
+                                                      build_store=build_store,
+                                                      build_report=build_report)
+        build_report["crossing_points"] = []
+        build_report["crossing_err_points"] = []
+        if self.auto_crossings:
+            connector_instances, crossing_points, err_points = insert_crossings(
+                connector_instances=connector_instances,
+                crossing_cell=self.crossing_cell,
+                name=self.name)
+            build_report["crossing_points"] = crossing_points
+            build_report["crossing_err_points"] = err_points
+        return connector_instances, build_report
 
     def get_connector_instances(self):
-        return get_connector_instances(instances=self.get_child_instances(),
-                                       connectors=self.connectors,
-                                       name=self.name,
-                                       default_connector_function=self.default_connector_function)
+        return self._get_connector_build()[0]
+
+    def get_auto_crossings(self):
+        """Returns a dictionary with the positions of the crossings placed by the auto_crossings pass ("points") and
+        the points where a crossing could not be connected ("err_points")."""
+        build_report = self._get_connector_build()[1]
+        return {"points": list(build_report["crossing_points"]),
+                "err_points": list(build_report["crossing_err_points"])}
+
+    def release_layout(self):
+        """Drops the layout view and the connector cells of this cell, to free their memory once the layout is not
+        needed anymore, e.g. after it was written to GDSII. The layout of a CircuitCell only depends on the properties
+        of the cell, so both are built again, identically, when the layout is used again."""
+        self._get_connector_build_holder()[0] = None
+        self.Layout()
+
+    def get_child_fingerprints(self):
+        """Returns a dictionary {instance_name: fingerprint} of the child instances. The fingerprint changes when
+        an instance is moved or when the ports of its cell change."""
+        return {name: instance_fingerprint(inst) for name, inst in self.get_child_instances().items()}
+
+    def get_rebuild_report(self):
+        """Returns a dictionary with the names of the connectors that were reused from a previous build ("reused")
+        and of those that were built for this cell ("regenerated")."""
+        build_report = self._get_connector_build()[1]
+        return {"reused": list(build_report["reused"]),
+                "regenerated": list(build_report["regenerated"])}
 
     class Layout(i3.LayoutView):
 
@@ -196,6 +408,10 @@ class CircuitCell(i3.PCell):
 
         def _generate_ports(self, ports):
             insts = self.instances
+            with profile_phase("ports", type(self.cell)):
+                return self._generate_external_ports(insts, ports)
+
+        def _generate_external_ports(self, insts, ports):
             labels = extract_unconnected_ports(insts)
             for insts_name, port in labels:
                 label = "{}:{}".format(insts_name, port.name)
@@ -212,9 +428,22 @@ class CircuitCell(i3.PCell):
 
             return ports
 
+        def write_gdsii_stream(self, filename, **kwargs):
+            """Writes the layout hierarchy to a GDSII file one cell at a time, see circuit.gdsii_stream.
+
+            By default the layouts of the CircuitCells in the hierarchy are released once they are written (see
+            release_layout). Pass release=None to keep them.
+            """
+            kwargs.setdefault("release", release_layout)
+            return write_gdsii_stream(self, filename, **kwargs)
+
     class Netlist(i3.NetlistFromLayout):
 
         def _generate_netlist(self, netlist):
+            with profile_phase("netlist", type(self.cell)):
+                return self._generate_circuit_netlist(netlist)
+
+        def _generate_circuit_netlist(self, netlist):
             netlist = super(CircuitCell.Netlist, self)._generate_netlist(self)
             for i in netlist.instances.itervalues():
                 for t in i.terms.itervalues():
@@ -232,8 +461,18 @@ class CircuitCell(i3.PCell):
                     for idx, term in enumerate(terms):
                         if isinstance(term, InstanceTerm):
                             terms[1 - idx].n_modes = term.term.n_modes
+            if self.reduce_waveguide_chains:
+                with profile_phase("netlist_reduction", type(self.cell)):
+                    reduce_waveguide_netlist(netlist)
             return netlist
 
     class CircuitModel(i3.CircuitModelView):
         def _generate_model(self):
             return i3.HierarchicalModel.from_netlistview(self.netlist_view)
+
+
+def release_layout(cell):
+    """Releases the layout of a cell that was written to GDSII by write_gdsii_stream. Only CircuitCells are released:
+    the layout of other cells can have been configured with layout properties, which would be lost."""
+    if isinstance(cell, CircuitCell):
+        cell.release_layout()
@@ -0,0 +1,275 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Persistent, content-addressed cache of connector shapes.
+
+The key of a connector is a hash of the connector function, its keyword arguments, the geometry of the start and
+end ports and the identity of their trace templates. The value is the list of points of the connector shape,
+together with the warnings raised while it was calculated, stored in a compact binary file. When the cache grows
+beyond its size cap, the least recently used entries are removed.
+
+The cache can be inspected and cleared from the command line::
+
+    python -m circuit.connector_cache info --dir <cache directory>
+    python -m circuit.connector_cache clear --dir <cache directory>
+"""
+
+import argparse
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+from .fingerprint import fingerprint_digest, function_fingerprint, port_fingerprint, FingerprintError
+
+# Bumped whenever the key or the file format changes, which invalidates all existing entries.
+CACHE_FORMAT_VERSION = 2
+_MAGIC = b"OCC2"
+# Magic, number of points and number of bytes of the warnings
+_HEADER = struct.Struct("<4sII")
+_FILE_EXTENSION = ".shape"
+# Environment variable with the directory of the default connector cache.
+CACHE_DIR_ENV_VARIABLE = "CIRCUIT_CONNECTOR_CACHE"
+
+
+class ConnectorCache(object):
+    """Content-addressed cache of connector shape points on disk.
+
+    Parameters
+    ----------
+    directory : str
+        Directory where the entries are stored. It is created when needed.
+    max_bytes : int, optional
+        Size cap of the cache. When it is exceeded, the least recently used entries are removed.
+    low_water : float, optional
+        Fraction of max_bytes the cache is reduced to when it is evicted. The headroom below max_bytes means the
+        directory is only scanned once per (1 - low_water) * max_bytes of new entries, not on every store.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 2 ** 20, low_water=0.9):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None
+
+    def key(self, connector_function, kwargs, start_port, end_port):
+        """Returns the key of a connector, or None if one of its arguments has no deterministic fingerprint."""
+        try:
+            return fingerprint_digest((CACHE_FORMAT_VERSION,
+                                       function_fingerprint(connector_function),
+                                       kwargs,
+                                       port_fingerprint(start_port),
+                                       port_fingerprint(end_port)))
+        except FingerprintError:
+            return None
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + _FILE_EXTENSION)
+
+    def load(self, key):
+        """Returns the list of points stored for key, or None."""
+        entry = self.load_entry(key)
+        return None if entry is None else entry[0]
+
+    def load_entry(self, key):
+        """Returns (points, warnings) stored for key, or None. warnings is a list of (category name, message) of the
+        warnings raised when the shape was calculated."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+
+        entry = _decode_entry(data)
+        if entry is None:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path, None)  # Mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def store(self, key, points, warnings=()):
+        """Stores the points of a shape for key, with the (category name, message) of the warnings raised when it was
+        calculated, and evicts the least recently used entries if needed."""
+        path = self._path(key)
+        data = _encode_entry(points, warnings)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        # Write to a temporary file first, so that an interrupted build never leaves a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            self._remove(tmp_path)
+            return
+
+        if self._total_bytes is not None:
+            self._total_bytes += len(data) - old_size
+        if self.total_bytes() > self.max_bytes:
+            self.evict(max_bytes=int(self.max_bytes * self.low_water))
+
+    def entries(self):
+        """Returns a list of (path, size, last_used) of all the entries, from least to most recently used."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for fn in filenames:
+                if fn.endswith(_FILE_EXTENSION):
+                    path = os.path.join(dirpath, fn)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def total_bytes(self):
+        """Returns the total size of the entries in bytes."""
+        if self._total_bytes is None:
+            self._total_bytes = sum(e[1] for e in self.entries())
+        return self._total_bytes
+
+    def evict(self, max_bytes=None):
+        """Removes the least recently used entries until the cache is smaller than max_bytes.
+
+        Returns the number of removed entries.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for path, size, last_used in entries:
+            if total <= max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                removed += 1
+        self._total_bytes = total
+        return removed
+
+    def clear(self):
+        """Removes all the entries. Returns the number of removed entries."""
+        return self.evict(max_bytes=0)
+
+    def info(self):
+        """Returns a dictionary with the directory, the number of entries, their size and the hits and misses."""
+        entries = self.entries()
+        return {"directory": self.directory,
+                "entries": len(entries),
+                "bytes": sum(e[1] for e in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses}
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+def _encode_entry(points, warnings=()):
+    points = np.asarray(points, dtype="<f8").reshape(-1, 2)
+    warning_data = json.dumps([[str(c), str(m)] for c, m in warnings]).encode("utf-8") if warnings else b""
+    return _HEADER.pack(_MAGIC, points.shape[0], len(warning_data)) + points.tobytes() + warning_data
+
+
+def _decode_entry(data):
+    if len(data) < _HEADER.size:
+        return None
+    magic, n_points, n_warning_bytes = _HEADER.unpack(data[:_HEADER.size])
+    points_end = _HEADER.size + 16 * n_points
+    if magic != _MAGIC or len(data) != points_end + n_warning_bytes:
+        return None
+    points = np.frombuffer(data[_HEADER.size:points_end], dtype="<f8").reshape(n_points, 2)
+    try:
+        warnings = [(c, m) for c, m in json.loads(data[points_end:].decode("utf-8"))] if n_warning_bytes else []
+    except ValueError:
+        return None
+    return [(float(x), float(y)) for x, y in points], warnings
+
+
+_default_connector_cache = []
+
+
+def get_default_connector_cache():
+    """Returns the default connector cache.
+
+    It is the cache set with set_default_connector_cache, or a cache in the directory given by the
+    CIRCUIT_CONNECTOR_CACHE environment variable. Returns None when neither is set.
+    """
+    if _default_connector_cache:
+        # None when the default cache was disabled
+        return _default_connector_cache[0]
+    directory = os.environ.get(CACHE_DIR_ENV_VARIABLE)
+    if directory:
+        return ConnectorCache(directory)
+    return None
+
+
+def set_default_connector_cache(cache):
+    """Sets the default connector cache. Pass None to disable the default cache, also when CIRCUIT_CONNECTOR_CACHE
+    is set."""
+    del _default_connector_cache[:]
+    _default_connector_cache.append(cache)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the persistent connector cache.")
+    parser.add_argument("command", choices=["info", "clear"])
+    parser.add_argument("--dir", default=os.environ.get(CACHE_DIR_ENV_VARIABLE),
+                        help="Directory of the cache (default: ${})".format(CACHE_DIR_ENV_VARIABLE))
+    args = parser.parse_args(argv)
+    if not args.dir:
+        parser.error("no cache directory given with --dir or ${}".format(CACHE_DIR_ENV_VARIABLE))
+
+    cache = ConnectorCache(args.dir)
+    if args.command == "info":
+        info = cache.info()
+        print("Connector cache {}".format(info["directory"]))
+        print("  entries: {}".format(info["entries"]))
+        print("  size:    {:.1f} kB".format(info["bytes"] / 1024.0))
+    else:
+        n_removed = cache.clear()
+        print("Removed {} entries from {}".format(n_removed, cache.directory))
+
+
+if __name__ == "__main__":
+    main()
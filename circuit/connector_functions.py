@@ -19,7 +19,8 @@ from ipkiss3 import all as i3
 import numpy as np
 from utils import get_bezier_ra, get_template, get_max_bend_radius, line, intersection, get_bend_size
 from functools import partial
-from utils import get_D_ports
+from utils import get_D_ports, get_bend_coef, get_bend_length_deficit, calculate_bend_coef
+from lru_cache import LRUCache
 from circuit.waveguides.tapered.waveguide import InterpolatedWaveguideTemplate
 from ipkiss3.pcell.routing.base import _RouteProperties
 # Fetching tech defaults
@@ -97,46 +98,130 @@ def route_bend(start_port, end_port):
 
 # Shapes
 
+# Rounded S-bends only differ by a translation when their ports have the same relative geometry, so they are
+# rounded once in a frame where the start port is at the origin.
+SBEND_COORD_QUANTUM = 1e-9
+_sbend_rounding_cache = LRUCache(maxsize=4096)
+
+
+def _round_translated_shape(rounding_algorithm, control_points, radius):
+    origin = control_points[0]
+    relative_points = np.round((control_points - origin) / SBEND_COORD_QUANTUM) * SBEND_COORD_QUANTUM
+    radius = round(radius / SBEND_COORD_QUANTUM) * SBEND_COORD_QUANTUM
+    key = (rounding_algorithm, tuple(relative_points.ravel().tolist()), radius)
+
+    def round_shape():
+        rounded = rounding_algorithm(original_shape=i3.Shape(relative_points.tolist()), radius=radius)
+        return np.array(rounded.points, dtype=float)
+
+    return i3.Shape(_sbend_rounding_cache.get_or_compute(key, round_shape) + origin)
+
+
+def sbend_rounding_cache_info():
+    """Returns the statistics of the cache of rounded S-bends."""
+    return _sbend_rounding_cache.info()
+
+
+def clear_sbend_rounding_cache():
+    _sbend_rounding_cache.clear()
+
+
+def bezier_sbend_geometry(start_ports, end_ports, adiabatic_angle):
+    """Solves the geometry of bezier S-bends with maximal bend radius for arrays of port pairs in one pass.
+
+    Parameters
+    ----------
+    start_ports : list of i3.OpticalPort
+    end_ports : list of i3.OpticalPort
+    adiabatic_angle : float
+        adiabatic angle of the spline in the bend - 0.0 is circular.
+
+    Returns
+    -------
+    control_points : np.ndarray
+        Array of shape (N, 4, 2) with the control polygons of the S-bends. Port pairs without vertical offset
+        have the control polygon [start, start, end, end].
+    curvatures : np.ndarray
+        Maximal curvature (1/bend_radius) of each S-bend, 0.0 for port pairs without vertical offset.
+    """
+    start_positions = np.array([[p.position[0], p.position[1]] for p in start_ports], dtype=float).reshape(-1, 2)
+    end_positions = np.array([[p.position[0], p.position[1]] for p in end_ports], dtype=float).reshape(-1, 2)
+    start_angles = np.array([p.angle for p in start_ports], dtype=float)
+    end_angles = np.array([p.angle for p in end_ports], dtype=float)
+
+    norm_angle = end_angles - start_angles - 180.0
+    misaligned = np.nonzero(np.abs(np.abs(norm_angle) % 360.0 - 0.0) > 1e-8)[0]
+    if len(misaligned) > 0:
+        raise Exception("Start and end port must have the same angle: {} and {}".format(
+            start_ports[misaligned[0]].position, end_ports[misaligned[0]].position))
+
+    start_rad = np.deg2rad(start_angles)
+    end_rad = np.deg2rad(end_angles)
+    delta = end_positions - start_positions
+    L = np.abs(delta[:, 0] * np.cos(start_rad) + delta[:, 1] * np.sin(start_rad))
+    H = np.abs(-delta[:, 0] * np.sin(start_rad) + delta[:, 1] * np.cos(start_rad))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = H / L
+        tetha = np.arctan2(2 * a / (a ** 2 + 1), (1 - a ** 2) / (a ** 2 + 1))
+        bent = tetha > 0
+        d = np.where(bent, H / (2 * np.sin(tetha)), 0.0)
+
+    control_points = np.empty((len(start_angles), 4, 2))
+    control_points[:, 0] = start_positions
+    control_points[:, 1, 0] = start_positions[:, 0] + d * np.cos(start_rad)
+    control_points[:, 1, 1] = start_positions[:, 1] + d * np.sin(start_rad)
+    control_points[:, 2, 0] = end_positions[:, 0] + d * np.cos(end_rad)
+    control_points[:, 2, 1] = end_positions[:, 1] + d * np.sin(end_rad)
+    control_points[:, 3] = end_positions
+
+    # Angle between the first and the middle segment of the control polygon, as in Shape.angles_deg()
+    first = control_points[:, 1] - control_points[:, 0]
+    middle = control_points[:, 2] - control_points[:, 1]
+    bend_angles = np.rad2deg(np.arctan2(middle[:, 1], middle[:, 0]) - np.arctan2(first[:, 1], first[:, 0]))
+
+    ra = get_bezier_ra(adiabatic_angle=adiabatic_angle)
+    curvatures = np.zeros(len(start_angles))
+    for angle in np.unique(bend_angles[bent]):
+        sel = bent & (bend_angles == angle)
+        coef = get_bend_coef(rounding_algorithm=ra, angle=angle)
+        curvatures[sel] = 1.0 / (d[sel] / coef * 0.99)
+    return control_points, curvatures
+
+
+def shape_bezier_sbend_max_radius_batch(start_ports, end_ports, adiabatic_angle, min_bend_radius=None):
+    """It returns the bezier S-bend shapes with maximal bend radius between arrays of start and end ports.
+    The geometry of all S-bends is solved in one vectorized pass and the rounding of S-bends that only differ by a
+    translation is shared. It raises a warning for each bend radius that is too small.
+    """
+    control_points, curvatures = bezier_sbend_geometry(start_ports=start_ports,
+                                                       end_ports=end_ports,
+                                                       adiabatic_angle=adiabatic_angle)
+    ra = get_bezier_ra(adiabatic_angle=adiabatic_angle)
+    rounded_shapes = []
+    for start_port, end_port, points, curv in zip(start_ports, end_ports, control_points, curvatures):
+        if curv > 0:
+            rounded_shape = _round_translated_shape(rounding_algorithm=ra, control_points=points, radius=1 / curv)
+        else:
+            rounded_shape = i3.Shape([start_port.position, end_port.position])
+
+        if min_bend_radius is not None:
+            if 1 / min_bend_radius < curv:
+                warnings.warn("The SBend between {} and {} has a curvature {} that "
+                              "is lower than the minimal allowed curvature {}".format(start_port.position,
+                                                                                      end_port.position,
+                                                                                      1 / curv,
+                                                                                      min_bend_radius))
+        rounded_shapes.append(rounded_shape)
+    return rounded_shapes
+
+
 def shape_bezier_sbend_max_radius(start_port, end_port, adiabatic_angle, min_bend_radius):
     """It returns a bezier S-bend shape with maximal bend radius. It raises a warning if the bend radius is too small.
     """
-    norm_angle = end_port.angle - start_port.angle - 180.0
-    if np.abs(np.abs(norm_angle) % 360.0 - 0.0) > 1e-8:
-        raise Exception("Start and end port must have the same angle")
-
-    end_pos_norm = i3.Coord2(end_port.position).transform_copy(
-        i3.Rotation(rotation=-start_port.angle, rotation_center=start_port.position))
-    L = np.abs(start_port.x - end_pos_norm.x)
-    H = np.abs(start_port.y - end_pos_norm.y)
-    a = H / L
-
-    tetha = np.arctan2(2 * a / (a ** 2 + 1), (1 - a ** 2) / (a ** 2 + 1))
-    if tetha > 0:
-        d = H / (2 * np.sin(tetha))
-
-        points = []
-        points.append(start_port.position)
-        points.append(start_port.position.move_polar_copy(d, start_port.angle))
-        points.append(end_port.position.move_polar_copy(d, end_port.angle))
-        points.append(end_port.position)
-
-        route = i3.Shape(points)
-        angle = route.angles_deg()[1] - route.angles_deg()[0]
-        ra = get_bezier_ra(adiabatic_angle=adiabatic_angle)
-        curv = 1 / get_max_bend_radius(rounding_algorithm=ra, dist=d, angle=angle)
-        rounded_shape = ra(original_shape=route, radius=1 / curv)
-    else:
-        rounded_shape = i3.Shape([start_port, end_port])
-        curv = 0.0
-
-    if min_bend_radius is not None:
-        if 1 / min_bend_radius < curv:
-            warnings.warn("The SBend between {} and {} has a curvature {} that "
-                          "is lower than the minimal allowed curvature {}".format(start_port.position,
-                                                                                  end_port.position,
-                                                                                  1 / curv,
-                                                                                  min_bend_radius))
-    return rounded_shape
+    return shape_bezier_sbend_max_radius_batch(start_ports=[start_port],
+                                               end_ports=[end_port],
+                                               adiabatic_angle=adiabatic_angle,
+                                               min_bend_radius=min_bend_radius)[0]
 
 
 def shape_bezier_bend_max_radius(start_port, end_port, adiabatic_angle, min_bend_radius=None):
@@ -209,16 +294,13 @@ def get_min_bend_size_ubend_fixed_radius(start_port, end_port, bend_radius, adia
 def min_max_bezier_ubend_fixed_bend_radius(start_port, end_port, adiabatic_angle=45.0, bend_radius=100):
     min_bend_size = get_min_bend_size_ubend_fixed_radius(
         start_port=start_port, end_port=end_port, bend_radius=bend_radius, adiabatic_angle=adiabatic_angle)
-    offset = 0.1
-    d_route1 = np.array(route_u(start_port=start_port, end_port=end_port, dists=min_bend_size).distances())
-    d_route2 = np.array(route_u(start_port=start_port, end_port=end_port,
-                                dists=[a + offset for a in min_bend_size]).distances())
-    m = (d_route2 - d_route1) / offset
-    limits = [min_bend_size[0], 2 * min_bend_size[0], min_bend_size[0], min_bend_size[0]]
-    offset_limits = [(limits[cnt] - d_route1[cnt]) / m[cnt] if m[cnt] != 0 else 0 for cnt in range(len(m))]
-    offset_limit = offset_limits[1]
+    # The middle segment has to stay longer than two bend sizes.
+    middle, d_middle = _ubend_middle_segment(start_port=start_port, end_port=end_port, bend_sizes=min_bend_size)
+    middle_length = np.linalg.norm(middle)
+    slope = np.dot(middle, d_middle) / middle_length if middle_length > 0 else 0.0
+    offset_limit = (2 * min_bend_size[0] - middle_length) / slope if slope != 0 else 0
     min_max = [shape_ubend_fixed_bend_radius(start_port=start_port, end_port=end_port, bend_radius=bend_radius,
-                                             adiabatic_angle=adiabatic_angle, extra_bend_length=o.length()) for
+                                             adiabatic_angle=adiabatic_angle, extra_bend_length=o) for
                o in [0, offset_limit * 0.99]]
     return min_max
 
@@ -246,19 +328,84 @@ def shape_ubend_fixed_bend_radius(start_port, end_port, bend_radius, adiabatic_a
     return rounded_shape
 
 
+def _ubend_middle_segment(start_port, end_port, bend_sizes):
+    """Returns the middle segment of route_u with legs of bend_sizes, and its derivative when both legs grow."""
+    start_dir = np.array([np.cos(np.deg2rad(start_port.angle)), np.sin(np.deg2rad(start_port.angle))])
+    end_dir = np.array([np.cos(np.deg2rad(end_port.angle)), np.sin(np.deg2rad(end_port.angle))])
+    d_middle = end_dir - start_dir
+    middle = (np.array([end_port.position[0] - start_port.position[0], end_port.position[1] - start_port.position[1]])
+              + bend_sizes[1] * end_dir - bend_sizes[0] * start_dir)
+    return middle, d_middle
+
+
+def _turn_angle(v1, v2):
+    n = np.linalg.norm(v1) * np.linalg.norm(v2)
+    if n == 0:
+        return 0.0
+    return float(np.rad2deg(np.arccos(np.clip(np.dot(v1, v2) / n, -1.0, 1.0))))
+
+
+def ubend_fixed_bend_radius_length(start_port, end_port, bend_radius, adiabatic_angle=0.0, extra_bend_length=0.0):
+    """Returns the length of shape_ubend_fixed_bend_radius and its derivative to extra_bend_length, without building
+    the shape. The length is the length of the control polygon minus the length deficit of each rounded bend,
+    taken from the bend tables.
+
+    Returns
+    -------
+    length, slope : float, float
+    """
+    ra = get_bezier_ra(adiabatic_angle=adiabatic_angle)
+    min_bend_sizes = get_min_bend_size_ubend_fixed_radius(
+        start_port=start_port, end_port=end_port, bend_radius=bend_radius, adiabatic_angle=adiabatic_angle)
+    bend_size = max(min_bend_sizes) + extra_bend_length
+    middle, d_middle = _ubend_middle_segment(start_port=start_port, end_port=end_port, bend_sizes=[bend_size] * 2)
+    middle_length = np.linalg.norm(middle)
+    start_dir = np.array([np.cos(np.deg2rad(start_port.angle)), np.sin(np.deg2rad(start_port.angle))])
+    end_dir = np.array([np.cos(np.deg2rad(end_port.angle)), np.sin(np.deg2rad(end_port.angle))])
+    deficit = sum([get_bend_length_deficit(rounding_algorithm=ra, bend_radius=bend_radius, angle=a)
+                   for a in [_turn_angle(start_dir, middle), _turn_angle(middle, -end_dir)]])
+    length = 2 * bend_size + middle_length - deficit
+    slope = 2.0
+    if middle_length > 0:
+        slope += np.dot(middle, d_middle) / middle_length
+    return length, slope
+
+
+UBEND_LENGTH_TOLERANCE = 0.01
+UBEND_MAX_REFINEMENTS = 5
+
+
 def shape_ubend_fixed_bend_radius_fixed_length(start_port, end_port, bend_radius, length, adiabatic_angle=0.0):
-    delta = 0.01
-    l1 = shape_ubend_fixed_bend_radius(start_port=start_port, end_port=end_port,
-                                       bend_radius=bend_radius, adiabatic_angle=adiabatic_angle,
-                                       extra_bend_length=0.0).length()
-    l2 = shape_ubend_fixed_bend_radius(start_port=start_port, end_port=end_port, bend_radius=bend_radius,
-                                       adiabatic_angle=adiabatic_angle, extra_bend_length=delta).length()
-    d_target = delta * (length - l1) / (l2 - l1)
-    rounded_shape = shape_ubend_fixed_bend_radius(
-        start_port=start_port, end_port=end_port, bend_radius=bend_radius, adiabatic_angle=adiabatic_angle,
-        extra_bend_length=d_target)
-
-    if np.abs(rounded_shape.length() - length) > 0.01:
+    """It returns a bezier U-bend shape with a fixed bend radius and a given length. The extra bend length is
+    solved on the analytic length model and checked with one shape. Only when the length of that shape is not within
+    UBEND_LENGTH_TOLERANCE, it is refined with secant steps on the real shapes.
+    """
+    shape_kwargs = {"start_port": start_port, "end_port": end_port, "bend_radius": bend_radius,
+                    "adiabatic_angle": adiabatic_angle}
+    extra_bend_length = 0.0
+    slope = 0.0
+    for cnt in range(UBEND_MAX_REFINEMENTS):
+        model_length, slope = ubend_fixed_bend_radius_length(extra_bend_length=extra_bend_length, **shape_kwargs)
+        if slope == 0:
+            break
+        step = (length - model_length) / slope
+        extra_bend_length += step
+        if np.abs(step) < 1e-9:
+            break
+
+    rounded_shape = shape_ubend_fixed_bend_radius(extra_bend_length=extra_bend_length, **shape_kwargs)
+    error = rounded_shape.length() - length
+    for cnt in range(UBEND_MAX_REFINEMENTS):
+        if np.abs(error) <= UBEND_LENGTH_TOLERANCE or slope == 0:
+            break
+        new_extra_bend_length = extra_bend_length - error / slope
+        new_shape = shape_ubend_fixed_bend_radius(extra_bend_length=new_extra_bend_length, **shape_kwargs)
+        new_error = new_shape.length() - length
+        if new_extra_bend_length != extra_bend_length:
+            slope = (new_error - error) / (new_extra_bend_length - extra_bend_length)
+        extra_bend_length, rounded_shape, error = new_extra_bend_length, new_shape, new_error
+
+    if np.abs(error) > UBEND_LENGTH_TOLERANCE:
         import warnings
         warnings.warn(
             "Could not make a shape between {} and {} with length {}- returning straigth".format(start_port.position,
@@ -345,7 +492,7 @@ def sbend(start_port, end_port, bend_radius=tech_bend_radius, name=None, shape=N
     return wav
 
 
-def bezier_sbend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_radius=None, **kwargs):
+def bezier_sbend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_radius=None, shape=None, **kwargs):
     """Bezier S-bend with a maximum bend radius. It uses an angular transition given by the adiabatic angle.
 
     Parameters
@@ -358,14 +505,19 @@ def bezier_sbend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend
         Name of the connector cell
     min_bend_radius : float, optional
         Minimum bend radius, a warning is raised if not fulfilled
+    shape : i3.Shape, optional
+        Precalculated rounded shape of the S-bend
 
     Return
     --------
     wav : i3.Waveguide
         Waveguide connector
     """
-    rounded_shape = shape_bezier_sbend_max_radius(
-        start_port=start_port, end_port=end_port, adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+    if shape is None:
+        rounded_shape = shape_bezier_sbend_max_radius(
+            start_port=start_port, end_port=end_port, adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+    else:
+        rounded_shape = shape
     trace_template = get_template(start_port=start_port, end_port=end_port)
 
     pcell_kwargs = {"trace_template": trace_template}
@@ -500,7 +652,7 @@ def bezier_ubend_fixed_bend_radius(start_port, end_port, adiabatic_angle=45.0,
 
 
 # Regular bend
-def bezier_bend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_radius=None, **kwargs):
+def bezier_bend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_radius=None, shape=None, **kwargs):
     """Regular bend between start_port and end_port. Maximal bend radius is used.
 
     Parameters
@@ -513,14 +665,19 @@ def bezier_bend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_
         Name of the waveguide connector PCell
     min_bend_radius : float, optional
         Minimum bend radius, a warning is raised if not fulfilled
+    shape : i3.Shape, optional
+        Precalculated rounded shape of the bend
 
     Return
     -------
     wav : i3.Waveguide
         Waveguide connector PCell
     """
-    rounded_shape = shape_bezier_bend_max_radius(
-        start_port=start_port, end_port=end_port, adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+    if shape is None:
+        rounded_shape = shape_bezier_bend_max_radius(
+            start_port=start_port, end_port=end_port, adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+    else:
+        rounded_shape = shape
     trace_template = get_template(start_port=start_port, end_port=end_port)
     pcell_kwargs = {"trace_template": trace_template}
     layout_kwargs = {"shape": rounded_shape.points}
@@ -532,6 +689,100 @@ def bezier_bend(start_port, end_port, adiabatic_angle=15.0, name=None, min_bend_
     return wav
 
 
+# Length matching of bezier bends: the length of a bend grows monotonically with the adiabatic angle, so the
+# adiabatic angle for a given length is found with a bracketed root finder. The sampled lengths are cached per
+# relative port geometry. The root finder tries many continuous angles, so the lengths are calculated with
+# unregistered rounding algorithms that do not enter the rounding algorithm registry or the bend tables.
+BEND_LENGTH_ANGLE_RANGE = (0.0, 45.0)
+_bend_length_cache = LRUCache(maxsize=8192)
+_bend_length_solver_stats = {"solves": 0, "iterations": 0, "function_calls": 0, "last_iterations": 0}
+
+
+def _bend_length_key(start_port, end_port, adiabatic_angle):
+    q = SBEND_COORD_QUANTUM
+    return (int(round((end_port.position[0] - start_port.position[0]) / q)),
+            int(round((end_port.position[1] - start_port.position[1]) / q)),
+            int(round(start_port.angle / q)),
+            int(round(end_port.angle / q)),
+            int(round(adiabatic_angle / q)))
+
+
+def bezier_bend_length(start_port, end_port, adiabatic_angle):
+    """Returns the length of the bezier bend with maximal bend radius between start_port and end_port.
+    The length only depends on the relative geometry of the ports, so it is cached for all translated copies.
+    """
+    key = _bend_length_key(start_port, end_port, adiabatic_angle)
+
+    def calculate_length():
+        route = route_bend(start_port=start_port, end_port=end_port)
+        if np.abs(get_D_ports(start_port=start_port, end_port=end_port)) <= 1e-13:
+            return i3.Shape([start_port, end_port]).length()
+        # Same shape as shape_bezier_bend_max_radius
+        ra = get_bezier_ra(adiabatic_angle=adiabatic_angle, registered=False)
+        dist = min(route.distances()[0:-1])
+        rang = route.angles_deg()
+        angle = 360 + rang[1] - rang[0]
+        radius = dist / calculate_bend_coef(rounding_algorithm=ra, angle=angle) * 0.99
+        return ra(original_shape=route, radius=radius).length()
+
+    return _bend_length_cache.get_or_compute(key, calculate_length)
+
+
+def solve_bezier_bend_adiabatic_angle(start_port, end_port, total_length, xtol=1e-9):
+    """Returns the adiabatic angle of the bezier bend between start_port and end_port that has the total length.
+
+    Parameters
+    ----------
+    start_port : i3.OpticalPort
+    end_port : i3.OpticalPort
+    total_length : float
+        Length of the bend
+    xtol : float, optional
+        Tolerance on the adiabatic angle
+
+    Returns
+    -------
+    adiabatic_angle : float or None
+        None if the length can not be made with an adiabatic angle in BEND_LENGTH_ANGLE_RANGE
+    iterations : int
+        Number of iterations of the root finder
+    min_length, max_length : float
+        Range of lengths that can be made
+    """
+    from scipy.optimize import brentq
+
+    a_min, a_max = BEND_LENGTH_ANGLE_RANGE
+    min_length = bezier_bend_length(start_port, end_port, a_min)
+    max_length = bezier_bend_length(start_port, end_port, a_max)
+    if not min_length <= total_length <= max_length:
+        return None, 0, min_length, max_length
+    if total_length == min_length:
+        return a_min, 0, min_length, max_length
+    if total_length == max_length:
+        return a_max, 0, min_length, max_length
+
+    def length_error(adiabatic_angle):
+        return bezier_bend_length(start_port, end_port, adiabatic_angle) - total_length
+
+    adiabatic_angle, result = brentq(length_error, a_min, a_max, xtol=xtol, full_output=True)
+    _bend_length_solver_stats["solves"] += 1
+    _bend_length_solver_stats["iterations"] += result.iterations
+    _bend_length_solver_stats["function_calls"] += result.function_calls
+    _bend_length_solver_stats["last_iterations"] = result.iterations
+    return adiabatic_angle, result.iterations, min_length, max_length
+
+
+def bend_length_solver_info():
+    """Returns the iteration counts of the bend length solver and the statistics of its length cache."""
+    info = dict(_bend_length_solver_stats)
+    info["length_cache"] = _bend_length_cache.info()
+    return info
+
+
+def clear_bend_length_cache():
+    _bend_length_cache.clear()
+
+
 def bezier_bend_fixed_length(start_port, end_port, total_length=None, name=None,
                              min_bend_radius=None, **kwargs):
     """Bezier bend where the length is tuned by varying the adiabatic transition in the spline
@@ -552,17 +803,11 @@ def bezier_bend_fixed_length(start_port, end_port, total_length=None, name=None,
     wav : i3.Waveguide
         Waveguide connector PCell
     """
-    shbezier = partial(shape_bezier_bend_max_radius, start_port=start_port, end_port=end_port, min_bend_radius=None)
-    [min_length, max_length] = [shbezier(adiabatic_angle=a).length() for a in [0, 45]]
-    print(min_length, total_length, max_length)
-    if total_length >= min_length and total_length <= max_length:
-        def tominimize(x):
-            return np.abs(shbezier(adiabatic_angle=x[0]).length() - total_length)
-
-        from scipy.optimize import minimize
-        res = minimize(tominimize, x0=[0.1], bounds=[(0, 45)])
+    adiabatic_angle, iterations, min_length, max_length = solve_bezier_bend_adiabatic_angle(
+        start_port=start_port, end_port=end_port, total_length=total_length)
+    if adiabatic_angle is not None:
         return bezier_bend(start_port=start_port, end_port=end_port, name=name,
-                           adiabatic_angle=res.x[0], min_bend_radius=min_bend_radius)
+                           adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
     else:
         import warnings
         warnings.warn(
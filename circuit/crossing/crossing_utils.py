@@ -16,93 +16,176 @@
 from ipkiss3 import all as i3
 from picazzo3.wg.chain import TraceChain
 import numpy as np
-import itertools
 import warnings
+from .spatial_index import find_crossings, SegmentGrid
 
 
-def collinear(p0, p1, p2, verbose=False):
-    x1, y1 = p1[0] - p0[0], p1[1] - p0[1]
-    x2, y2 = p2[0] - p0[0], p2[1] - p0[1]
+COLLINEAR_TOLERANCE = 1e-8
 
-    if np.abs(x1) >= np.abs(y1):
-        t = x2 / x1
-    else:
-        t = y2 / y1
+
+def _collinearity(p0, p1, p2, tolerance=COLLINEAR_TOLERANCE):
+    """Collinearity of points p2 with segments (p0, p1). The coordinate arrays (..., 2) are broadcast.
+
+    The parameter t is the position of p2 along the dominant axis of the segment, 0 at p0 and 1 at p1. A
+    zero-length segment only contains its own point, at t = 0.
+    """
+    p0, p1, p2 = np.asarray(p0, dtype=float), np.asarray(p1, dtype=float), np.asarray(p2, dtype=float)
+    x1, y1 = p1[..., 0] - p0[..., 0], p1[..., 1] - p0[..., 1]
+    x2, y2 = p2[..., 0] - p0[..., 0], p2[..., 1] - p0[..., 1]
+    x1, y1, x2, y2 = np.broadcast_arrays(x1, y1, x2, y2)
+
+    along_x = np.abs(x1) >= np.abs(y1)
+    num = np.where(along_x, x2, y2)
+    den = np.where(along_x, x1, y1)
+    degenerate = den == 0
+    t = num / np.where(degenerate, 1.0, den)
+    t = np.where(degenerate, 0.0, t)
+
+    cross = np.abs(x1 * y2 - x2 * y1)
+    flags = (cross < tolerance) & (0 <= t) & (t <= 1)
+    flags = np.where(degenerate, np.hypot(x2, y2) < tolerance, flags)
+    return flags, t
+
+
+def collinearity(segment_starts, segment_ends, points, tolerance=COLLINEAR_TOLERANCE):
+    """Returns the collinearity of all points with all segments at once.
+
+    Parameters
+    ----------
+    segment_starts, segment_ends : array of shape (S, 2)
+        Start and end points of the segments
+    points : array of shape (P, 2)
+        Candidate points
+    tolerance : float, optional
+        Tolerance on the cross product
+
+    Returns
+    -------
+    flags : np.ndarray of bool, shape (S, P)
+        True if the point lies on the segment
+    t : np.ndarray, shape (S, P)
+        Parametric position of the point along the segment
+    """
+    segment_starts = np.asarray(segment_starts, dtype=float).reshape(-1, 2)
+    segment_ends = np.asarray(segment_ends, dtype=float).reshape(-1, 2)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    return _collinearity(segment_starts[:, np.newaxis, :], segment_ends[:, np.newaxis, :], points[np.newaxis, :, :],
+                         tolerance=tolerance)
+
+
+def collinearity_pairwise(segment_starts, segment_ends, points, tolerance=COLLINEAR_TOLERANCE):
+    """Returns the collinearity of the i-th point with the i-th segment, as flags and t-values of shape (N,)."""
+    return _collinearity(np.asarray(segment_starts, dtype=float).reshape(-1, 2),
+                         np.asarray(segment_ends, dtype=float).reshape(-1, 2),
+                         np.asarray(points, dtype=float).reshape(-1, 2),
+                         tolerance=tolerance)
+
+
+def collinear(p0, p1, p2, verbose=False, tolerance=COLLINEAR_TOLERANCE):
+    flags, t = _collinearity([p0[0], p0[1]], [p1[0], p1[1]], [p2[0], p2[1]], tolerance=tolerance)
 
     if verbose:
+        x1, y1 = p1[0] - p0[0], p1[1] - p0[1]
+        x2, y2 = p2[0] - p0[0], p2[1] - p0[1]
         print("np.abs(x1 * y2 - x2 * y1) = {}".format(np.abs(x1 * y2 - x2 * y1)))
         print("t={}".format(t))
 
-    return np.abs(x1 * y2 - x2 * y1) < 1e-8 and 0 <= t <= 1
+    return bool(flags)
 
 
 def dp1p2(p0, p1):
     return (p1[0] - p0[0]) ** 2 + (p1[1] - p0[1]) ** 2
 
 
-def cut_shape_on_portpairs(shape, port_list_pairs):
+def _bucket_port_pairs(points, port_list_pairs, tolerance=COLLINEAR_TOLERANCE):
+    """Buckets the port pairs on the segments of a shape, using a spatial index of the segments.
+
+    Returns
+    -------
+    buckets : dict
+        Dictionary {segment_index: [pair_index, ...]} of the pairs that have both ports on the segment
+    one_sided : list of tuples
+        Sorted list of (segment_index, pair_index) of the pairs that have only one port on the segment
+    """
+    segments = np.array([[[p0[0], p0[1]], [p1[0], p1[1]]] for p0, p1 in zip(points[0:-1], points[1:])],
+                        dtype=float).reshape(-1, 2, 2)
+    grid = SegmentGrid(segments)
+    eps = max(1e-6, tolerance)
+    ports = [(pair_index, side, port) for pair_index, pair in enumerate(port_list_pairs)
+             for side, port in enumerate(pair[0:2])]
+    positions = np.array([[port.position[0], port.position[1]] for _, _, port in ports], dtype=float).reshape(-1, 2)
+
+    # Candidate (segment, port) combinations from the segment grid, tested in one vectorized call.
+    candidate_segments = []
+    candidate_ports = []
+    for port_index, (x, y) in enumerate(positions):
+        candidates = grid.query((x - eps, y - eps, x + eps, y + eps))
+        candidate_segments.extend(candidates)
+        candidate_ports.extend([port_index] * len(candidates))
+    candidate_segments = np.array(candidate_segments, dtype=int)
+    candidate_ports = np.array(candidate_ports, dtype=int)
+    flags, _ = collinearity_pairwise(segments[candidate_segments, 0], segments[candidate_segments, 1],
+                                     positions[candidate_ports], tolerance=tolerance)
+
+    on_segments = [[set(), set()] for _ in port_list_pairs]
+    for k, port_index in zip(candidate_segments[flags], candidate_ports[flags]):
+        pair_index, side, _ = ports[port_index]
+        on_segments[pair_index][side].add(int(k))
+
+    buckets = dict()
+    one_sided = []
+    for pair_index, on_segment in enumerate(on_segments):
+        for k in on_segment[0] & on_segment[1]:
+            buckets.setdefault(k, []).append(pair_index)
+        one_sided.extend((k, pair_index) for k in on_segment[0] ^ on_segment[1])
+    return buckets, sorted(one_sided)
+
+
+def cut_shape_on_portpairs(shape, port_list_pairs, tolerance=COLLINEAR_TOLERANCE):
     """Cuts a shape in pieces on the port_list.
 
+    The port pairs are bucketed on the segment they lie on, and each bucket is sorted once along its segment.
+    tolerance is the tolerance of the collinearity test of the ports with the segments.
+
     Returns
     -------
     cut_shapes : list of shapes
     err_points : list of points where there are errors
     """
     points = shape.points
-    pairs_searched = [pair for pair in port_list_pairs]
+    port_list_pairs = list(port_list_pairs)
     cut_shapes = []
     actual_shape = []
     err_points = []
+    buckets, one_sided = _bucket_port_pairs(points, port_list_pairs, tolerance=tolerance)
+
+    for cnt_points, pair_index in one_sided:
+        ppcut = port_list_pairs[pair_index]
+        warnings.warn(
+            "There is a crossing at position {} that can't be connected to. "
+            "Likely there there is no space".format(ppcut))
+        err_points.append(ppcut[0].position)
+        err_points.append(ppcut[1].position)
+
     for cnt_points, (phere, pnext) in enumerate(zip(points[0:-1], points[1:])):
-        collinear_pairs = []
-        for ppcut in pairs_searched:  # to do check if problem of not straight section
-            is_coll = [collinear(phere, pnext, ppcut[cnt]) for cnt in range(2)]
-            if any(is_coll) != all(is_coll):
-                warnings.warn(
-                    "There is a crossing at position {} that can't be connected to. "
-                    "Likely there there is no space".format(ppcut))
-                err_points.append(ppcut[0].position)
-                err_points.append(ppcut[1].position)
-            if all(is_coll):
-                collinear_pairs.append(ppcut)
-
-        distance_to_p1 = [dp1p2(phere, cp[0]) for cp in collinear_pairs]
-        distance_to_p2 = [dp1p2(phere, cp[1]) for cp in collinear_pairs]
-
-        collinear_distance_pairs_sorted_on_left = [(x, d_left)
-                                                   for d_left, x in sorted(zip(distance_to_p1, collinear_pairs))]
-        collinear_distance_pairs_sorted_on_right = [(x, d_right)
-                                                    for d_right, x in sorted(zip(distance_to_p2, collinear_pairs))]
-
-        if len(collinear_distance_pairs_sorted_on_left) > 0:
-
-            for cnt_crossing, (cdpl, cdpr) in enumerate(
-                    zip(collinear_distance_pairs_sorted_on_left, collinear_distance_pairs_sorted_on_right)):
+        if cnt_points in buckets:
+            # Sort the pairs on the position of their first port along the segment
+            collinear_pairs = sorted([port_list_pairs[i] for i in buckets[cnt_points]],
+                                     key=lambda pair: dp1p2(phere, pair[0].position))
+            for cnt_crossing, pair in enumerate(collinear_pairs):
+                if dp1p2(phere, pair[1].position) > dp1p2(phere, pair[0].position):  # right is further than left
+                    near_port, far_port = pair[0], pair[1]
+                else:  # left is further than right
+                    near_port, far_port = pair[1], pair[0]
+
                 if cnt_crossing == 0:  # First one:
-                    if cdpr[1] > cdpl[1]:  # right is further than left
-                        actual_shape.extend([phere, cdpl[0][0].position])  # Adding the right point
-                        next_point = cdpl[0][1].position
-                    else:  # left is further than right
-                        actual_shape.extend([phere, cdpl[0][1].position])  # Adding the right point
-                        next_point = cdpl[0][0].position
-
-                    cut_shapes.append(actual_shape)
+                    actual_shape.extend([phere, near_port.position])
                 else:  # Middle ones
-                    if cdpr[1] > cdpl[1]:  # right is further than left
-                        actual_shape = [next_point, cdpl[0][0].position]  # Adding the right point
-                        next_point = cdpl[0][1].position
-                    else:  # left is further than right
-                        actual_shape = [next_point, cdpl[0][1].position]  # Adding the right point
-                        next_point = cdpl[0][0].position
-                    cut_shapes.append(actual_shape)
-
-                if cnt_crossing == len(collinear_distance_pairs_sorted_on_left) - 1:
-
-                    if cdpr[1] > cdpl[1]:  # right is further than left
-                        actual_shape = [next_point, pnext]  # Adding the right point
-                    else:  # left is further than right
-                        actual_shape = [next_point, pnext]  # Adding the right point
+                    actual_shape = [next_point, near_port.position]
+                cut_shapes.append(actual_shape)
+                next_point = far_port.position
 
+            actual_shape = [next_point, pnext]
         else:
             actual_shape.append(phere)
             if cnt_points == len(points) - 2:
@@ -112,24 +195,28 @@ def cut_shape_on_portpairs(shape, port_list_pairs):
     return cut_shapes, err_points
 
 
-def get_crossing_points(shapes):
+def get_crossing_points(shapes, cell_size=None):
     """Detects all the crossing points between shapes.
 
+    The segments of all shapes are put in a uniform grid, so that only segments that are close to each other are
+    tested. Use find_crossings to also get the crossing segments and the crossing angles.
+
     Parameters
     ----------
-    shapes :
+    shapes : list of shapes
+    cell_size : float, optional
+        Size of the grid cells of the segment index
 
     Return
     ------
     crossings : list of crossings points
     """
-    crossings = []
-    for s1, s2 in itertools.combinations(shapes, 2):
-        crossings += s1.intersections(s2)
-    return crossings
+    return [i3.Coord2(c.point) for c in find_crossings(shapes, cell_size=cell_size)]
 
 
-def get_new_segments(crossing_instances, original_segment):
+def get_new_segments(crossing_instances, original_segment, tolerance=COLLINEAR_TOLERANCE, name=None):
+    if name is None:
+        name = original_segment.name
     port_list_pairs = []
     new_segments = {}
 
@@ -138,10 +225,10 @@ def get_new_segments(crossing_instances, original_segment):
         port_list_pairs.append((c.ports["in2"], c.ports["out2"]))
     center_line_shape = original_segment.center_line_shape
 
-    new_shapes, err_points = cut_shape_on_portpairs(center_line_shape, port_list_pairs)
+    new_shapes, err_points = cut_shape_on_portpairs(center_line_shape, port_list_pairs, tolerance=tolerance)
 
     for cnt, ns in enumerate(new_shapes):
-        total_name = "{}_SEG_{}".format(original_segment.name, cnt)
+        total_name = "{}_SEG_{}".format(name, cnt)
         new_segment_cell = i3.Waveguide(trace_template=original_segment.cell.trace_template, name=total_name)
         new_segment_cell.Layout(shape=ns)
         new_segments[total_name] = new_segment_cell
@@ -151,6 +238,99 @@ def get_new_segments(crossing_instances, original_segment):
     return new_segments, err_points
 
 
+def _port_axis(layout, port1, port2):
+    p1, p2 = layout.ports[port1].position, layout.ports[port2].position
+    center = np.array([(p1[0] + p2[0]) / 2.0, (p1[1] + p2[1]) / 2.0])
+    return center, np.rad2deg(np.arctan2(p2[1] - p1[1], p2[0] - p1[0]))
+
+
+def insert_crossings(connector_instances, crossing_cell, name, angle_tolerance=1.0, tolerance=COLLINEAR_TOLERANCE,
+                     cell_size=None):
+    """Places a crossing cell on every intersection of the center lines of the connectors and splits the crossed
+    connectors with get_new_segments.
+
+    The intersections are found with the segment grid of find_crossings. The crossing cell needs the ports in1, out1,
+    in2 and out2. It is placed with its center (between in1 and out1) on the intersection and its in1-out1 axis along
+    the first connector. Intersections that are not perpendicular within angle_tolerance (degrees) are not
+    replaced by a crossing and give a warning.
+
+    Parameters
+    ----------
+    connector_instances : i3.InstanceDict
+        Connector instances, placed without transformation
+    crossing_cell : PCell
+        Cell of the crossing
+    name : str
+        Name of the parent cell - all the crossings will be prepended with that name
+    angle_tolerance : float, optional
+    tolerance : float, optional
+        Tolerance of the collinearity test of the crossing ports with the connectors
+    cell_size : float, optional
+        Size of the grid cells of the segment index
+
+    Returns
+    -------
+    instances : i3.InstanceDict
+        Connector instances with the crossed connectors replaced by their segments, and the crossing instances
+    crossing_points : list of points
+    err_points : list of points where crossings could not be connected
+    """
+    names = []
+    layouts = []
+    shapes = []
+    for inst_name, inst in connector_instances.items():
+        layout = inst.reference.get_default_view(i3.LayoutView)
+        if not hasattr(layout, "center_line_shape"):
+            continue
+        names.append(inst_name)
+        layouts.append(layout)
+        shapes.append(np.array([[p[0], p[1]] for p in layout.center_line_shape], dtype=float).reshape(-1, 2))
+
+    crossings = find_crossings(shapes, cell_size=cell_size)
+    crossing_layout = crossing_cell.get_default_view(i3.LayoutView)
+    center, axis_angle = _port_axis(crossing_layout, "in1", "out1")
+
+    instances = i3.InstanceDict()
+    crossings_on_shape = dict()
+    crossing_points = []
+    for cnt, c in enumerate(crossings):
+        if np.abs(c.angle - 90.0) > angle_tolerance:
+            warnings.warn("The connectors {} and {} cross at {} under an angle of {} degrees - "
+                          "no crossing is placed".format(names[c.shapes[0]], names[c.shapes[1]], c.point, c.angle))
+            continue
+        shape_index, segment_index = c.segments[0]
+        p1, p2 = shapes[shape_index][segment_index:segment_index + 2]
+        rotation = np.rad2deg(np.arctan2(p2[1] - p1[1], p2[0] - p1[0])) - axis_angle
+        rot = np.deg2rad(rotation)
+        rotated_center = np.array([center[0] * np.cos(rot) - center[1] * np.sin(rot),
+                                   center[0] * np.sin(rot) + center[1] * np.cos(rot)])
+        translation = (c.point[0] - rotated_center[0], c.point[1] - rotated_center[1])
+        crossing = i3.SRef(reference=crossing_cell,
+                           name="{}_crossing{}".format(name, cnt),
+                           transformation=i3.Rotation(rotation=rotation) + i3.Translation(translation=translation))
+        instances += crossing
+        crossing_points.append(c.point)
+        for k in c.shapes:
+            crossings_on_shape.setdefault(k, []).append(crossing)
+
+    err_points = []
+    replaced = set()
+    for k, crossing_instances in sorted(crossings_on_shape.items()):
+        new_segments, errs = get_new_segments(crossing_instances=crossing_instances,
+                                              original_segment=layouts[k],
+                                              tolerance=tolerance,
+                                              name=names[k])
+        err_points.extend(errs)
+        for segment_name in sorted(new_segments):
+            instances += i3.SRef(reference=new_segments[segment_name], name=segment_name)
+        replaced.add(names[k])
+
+    for inst_name, inst in connector_instances.items():
+        if inst_name not in replaced:
+            instances += inst
+    return instances, crossing_points, err_points
+
+
 class TraceChainWithCenterLine(TraceChain):
     """Class that only accepts traces that have a method for the center line.
     """
@@ -0,0 +1,235 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Uniform-grid spatial index of line segments, used to detect crossings between routes.
+
+Every segment is registered in the grid cells it passes through, so a long diagonal segment occupies a number of
+cells proportional to its length and not to the area of its bounding box. Only segments that share a grid cell
+are tested for an intersection, so for routes that are spread over the layout the detection scales with the
+number of segments and crossings instead of with the square of the number of routes.
+"""
+
+from collections import namedtuple
+import numpy as np
+
+Crossing = namedtuple("Crossing", ["point", "shapes", "segments", "angle"])
+# Margin on the grid cell borders, in units of the cell size. A segment that passes within this margin of a border is
+# also registered in the cell on the other side, so that segments meeting on a border always share a cell.
+_BORDER_MARGIN = 1e-9
+
+Crossing.__doc__ = """Crossing between two shapes.
+
+point : (x, y) position of the crossing
+shapes : (i, j) indices of the two shapes, i < j
+segments : ((i, segment_i), (j, segment_j)) indices of the crossing segments in their shape
+angle : angle between the two segments in degrees, between 0 and 90
+"""
+
+
+def shape_segments(shapes):
+    """Returns the segments of a list of shapes.
+
+    Returns
+    -------
+    segments : np.ndarray
+        Array of shape (N, 2, 2) with the start and end point of each segment
+    owners : np.ndarray
+        Array of shape (N, 2) with the index of the shape and the index of the segment in the shape
+    """
+    segments = []
+    owners = []
+    for shape_index, shape in enumerate(shapes):
+        points = np.array([[p[0], p[1]] for p in shape], dtype=float).reshape(-1, 2)
+        for segment_index in range(len(points) - 1):
+            segments.append(points[segment_index:segment_index + 2])
+            owners.append((shape_index, segment_index))
+    return np.array(segments, dtype=float).reshape(-1, 2, 2), np.array(owners, dtype=int).reshape(-1, 2)
+
+
+class SegmentGrid(object):
+    """Uniform grid of line segments.
+
+    Parameters
+    ----------
+    segments : np.ndarray
+        Array of shape (N, 2, 2) with the start and end point of each segment
+    cell_size : float, optional
+        Size of the grid cells. By default the median segment length, bounded so that the grid has at most
+        max_cells cells along each axis.
+    max_cells : int, optional
+        Maximum number of grid cells along each axis when the cell size is chosen automatically
+    """
+
+    def __init__(self, segments, cell_size=None, max_cells=1024):
+        self.segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+        self.bboxes = np.hstack([self.segments.min(axis=1), self.segments.max(axis=1)]) if len(self.segments) \
+            else np.zeros((0, 4))
+        if len(self.segments):
+            self.origin = self.bboxes[:, 0:2].min(axis=0)
+            extent = float((self.bboxes[:, 2:4].max(axis=0) - self.origin).max())
+        else:
+            self.origin = np.zeros(2)
+            extent = 0.0
+        if cell_size is None:
+            lengths = np.hypot(*(self.segments[:, 1] - self.segments[:, 0]).T) if len(self.segments) else [1.0]
+            cell_size = max(float(np.median(lengths)), extent / max_cells, 1e-6)
+        self.cell_size = cell_size
+        self.cells = dict()
+        grid_segments = ((self.segments - self.origin) / self.cell_size).reshape(-1, 4).tolist()
+        for index, (x0, y0, x1, y1) in enumerate(grid_segments):
+            for cell in self._traversed_cells(x0, y0, x1, y1):
+                self.cells.setdefault(cell, []).append(index)
+
+    @staticmethod
+    def _traversed_cells(x0, y0, x1, y1):
+        """Returns the grid cells a segment passes through. The coordinates are in units of the cell size, relative
+        to the origin of the grid. The segment is walked one column of cells at a time: in every column, it covers
+        the rows between the y-coordinates where it enters and leaves the column.
+        """
+        m = _BORDER_MARGIN
+        if x1 < x0:
+            x0, y0, x1, y1 = x1, y1, x0, y0
+        dx = x1 - x0
+        slope = (y1 - y0) / dx if dx > 0.0 else 0.0
+        cells = []
+        for i in range(int(np.floor(x0 - m)), int(np.floor(x1 + m)) + 1):
+            if dx > 0.0:
+                ya = y0 + slope * (min(max(x0, i - m), x1) - x0)
+                yb = y0 + slope * (min(max(x0, i + 1 + m), x1) - x0)
+            else:
+                ya, yb = y0, y1
+            for j in range(int(np.floor(min(ya, yb) - m)), int(np.floor(max(ya, yb) + m)) + 1):
+                cells.append((i, j))
+        return cells
+
+    def _covered_cells(self, bbox):
+        i0, j0 = np.floor((bbox[0:2] - self.origin) / self.cell_size - _BORDER_MARGIN).astype(int)
+        i1, j1 = np.floor((bbox[2:4] - self.origin) / self.cell_size + _BORDER_MARGIN).astype(int)
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            # Large box: test the occupied cells instead of all the cells of the box.
+            return [(i, j) for i, j in self.cells if i0 <= i <= i1 and j0 <= j <= j1]
+        return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+    def query(self, bbox):
+        """Returns the sorted indices of the segments that pass through a grid cell that overlaps with bbox
+        (xmin, ymin, xmax, ymax).
+        """
+        found = set()
+        for cell in self._covered_cells(np.asarray(bbox, dtype=float)):
+            found.update(self.cells.get(cell, []))
+        return sorted(found)
+
+    def candidate_pairs(self):
+        """Returns an array of shape (M, 2) with the pairs (i, j), i < j, of segments that share a grid cell and
+        whose bounding boxes overlap."""
+        pairs = set()
+        for members in self.cells.values():
+            n = len(members)
+            for a in range(n):
+                for b in range(a + 1, n):
+                    i, j = members[a], members[b]
+                    pairs.add((i, j) if i < j else (j, i))
+        if not pairs:
+            return np.zeros((0, 2), dtype=int)
+        pairs = np.array(sorted(pairs), dtype=int)
+        bi = self.bboxes[pairs[:, 0]]
+        bj = self.bboxes[pairs[:, 1]]
+        overlap = ((bi[:, 0] <= bj[:, 2]) & (bj[:, 0] <= bi[:, 2]) &
+                   (bi[:, 1] <= bj[:, 3]) & (bj[:, 1] <= bi[:, 3]))
+        return pairs[overlap]
+
+
+def intersect_segment_pairs(segments, pairs, tolerance=1e-9):
+    """Calculates the intersections of pairs of segments.
+
+    Parallel segments are never reported as intersecting.
+
+    Returns
+    -------
+    hit : np.ndarray of bool
+        True for the pairs that intersect
+    points : np.ndarray
+        Array of shape (M, 2) with the intersection points (only valid where hit is True)
+    angles : np.ndarray
+        Angle between the segments in degrees, between 0 and 90
+    """
+    p = segments[pairs[:, 0], 0]
+    r = segments[pairs[:, 0], 1] - p
+    q = segments[pairs[:, 1], 0]
+    s = segments[pairs[:, 1], 1] - q
+    qp = q - p
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+    norm = np.hypot(r[:, 0], r[:, 1]) * np.hypot(s[:, 0], s[:, 1])
+    parallel = np.abs(denom) <= tolerance * np.maximum(norm, tolerance)
+    safe_denom = np.where(parallel, 1.0, denom)
+    t = (qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]) / safe_denom
+    u = (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / safe_denom
+    hit = ~parallel & (t >= -tolerance) & (t <= 1 + tolerance) & (u >= -tolerance) & (u <= 1 + tolerance)
+    points = p + t[:, np.newaxis] * r
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cos_angle = np.abs(r[:, 0] * s[:, 0] + r[:, 1] * s[:, 1]) / norm
+    angles = np.rad2deg(np.arccos(np.clip(np.nan_to_num(cos_angle), 0.0, 1.0)))
+    return hit, points, angles
+
+
+def find_crossings(shapes, cell_size=None, tolerance=1e-9):
+    """Detects the crossings between shapes with a uniform-grid index of their segments.
+
+    Segments of the same shape are not tested against each other. A crossing that falls on a corner of a shape
+    is reported once.
+
+    Parameters
+    ----------
+    shapes : list of shapes
+    cell_size : float, optional
+        Size of the grid cells, see SegmentGrid
+    tolerance : float, optional
+        Tolerance on the intersection test and on merging duplicate crossing points
+
+    Returns
+    -------
+    crossings : list of Crossing
+        Crossings sorted on the shape indices and the segment indices
+    """
+    segments, owners = shape_segments(shapes)
+    if len(segments) == 0:
+        return []
+    grid = SegmentGrid(segments, cell_size=cell_size)
+    pairs = grid.candidate_pairs()
+    pairs = pairs[owners[pairs[:, 0], 0] != owners[pairs[:, 1], 0]]
+    if len(pairs) == 0:
+        return []
+    # Order every pair on shape index, so that the first segment belongs to the first shape.
+    swap = owners[pairs[:, 0], 0] > owners[pairs[:, 1], 0]
+    pairs[swap] = pairs[swap][:, ::-1]
+    hit, points, angles = intersect_segment_pairs(segments, pairs, tolerance=tolerance)
+
+    crossings = []
+    seen = set()
+    quantum = max(tolerance, 1e-12) * 1e3
+    for index in np.nonzero(hit)[0]:
+        i, j = pairs[index]
+        shape_pair = (int(owners[i, 0]), int(owners[j, 0]))
+        point = (float(points[index, 0]), float(points[index, 1]))
+        key = shape_pair + (int(round(point[0] / quantum)), int(round(point[1] / quantum)))
+        if key in seen:
+            continue
+        seen.add(key)
+        crossings.append(Crossing(point=point,
+                                  shapes=shape_pair,
+                                  segments=((shape_pair[0], int(owners[i, 1])), (shape_pair[1], int(owners[j, 1]))),
+                                  angle=float(angles[index])))
+    crossings.sort(key=lambda c: (c.shapes, c.segments[0][1], c.segments[1][1], c.point))
+    return crossings
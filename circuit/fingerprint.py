@@ -0,0 +1,112 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Deterministic fingerprints of connector arguments, ports and functions.
+
+The fingerprints only depend on values, never on object identities, so they are stable between runs and can be
+used as keys of persistent caches.
+"""
+
+from functools import partial
+import hashlib
+import numbers
+import numpy as np
+
+
+class FingerprintError(Exception):
+    """Raised when a value has no deterministic fingerprint."""
+    pass
+
+
+def function_fingerprint(function):
+    """Returns a fingerprint of a function, including the arguments of a functools.partial."""
+    if isinstance(function, partial):
+        return ("partial",
+                function_fingerprint(function.func),
+                fingerprint(function.args),
+                fingerprint(function.keywords or {}))
+    module = getattr(function, "__module__", None)
+    name = getattr(function, "__name__", None)
+    if module is None or name is None or name == "<lambda>":
+        raise FingerprintError("Function {} has no deterministic fingerprint".format(function))
+    return "{}.{}".format(module, name)
+
+
+def port_fingerprint(port):
+    """Returns a fingerprint of the geometry of a port: position, angle and trace template."""
+    trace_template = getattr(port, "trace_template", None)
+    return ("port",
+            fingerprint(port.position),
+            repr(float(port.angle)),
+            template_fingerprint(trace_template))
+
+
+def template_fingerprint(trace_template):
+    """Returns a fingerprint of a trace template, based on its class and core width. This is enough to identify the
+    center line of a connector shape, but not the connector cell itself: see template_identity."""
+    if trace_template is None:
+        return None
+    cls = type(trace_template)
+    core_width = getattr(trace_template, "core_width", None)
+    if core_width is not None:
+        core_width = repr(float(core_width))
+    return "{}.{}".format(cls.__module__, cls.__name__), core_width
+
+
+def template_identity(trace_template):
+    """Returns a key that identifies a trace template object, including all its layout properties (cladding, layers,
+    windows). The key is only valid within the process and while the template is alive, so it may only be used in
+    in-memory tables whose entries keep the template alive."""
+    if trace_template is None:
+        return None
+    return template_fingerprint(trace_template), id(trace_template)
+
+
+def fingerprint(value):
+    """Returns a hashable, deterministic fingerprint of a value.
+
+    Supported values are None, booleans, numbers, strings, coordinates, ports, numpy arrays, sequences,
+    dictionaries and (partial) functions. A FingerprintError is raised for all other values.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    if isinstance(value, np.ndarray):
+        return ("array",) + tuple(fingerprint(v) for v in value.tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(fingerprint(v) for v in value)
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((str(k), fingerprint(v)) for k, v in value.items()))
+    if hasattr(value, "position") and hasattr(value, "angle"):
+        return port_fingerprint(value)
+    if hasattr(value, "x") and hasattr(value, "y"):
+        return "coord", repr(float(value.x)), repr(float(value.y))
+    if callable(value):
+        return function_fingerprint(value)
+    try:
+        # unicode strings on Python 2
+        if isinstance(value, basestring):
+            return value
+    except NameError:
+        pass
+    raise FingerprintError("Value {} of type {} has no deterministic fingerprint".format(value, type(value)))
+
+
+def fingerprint_digest(value):
+    """Returns the hexadecimal SHA-1 digest of the fingerprint of a value."""
+    return hashlib.sha1(repr(fingerprint(value)).encode("utf-8")).hexdigest()
@@ -0,0 +1,386 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Streaming GDSII writer for cell hierarchies.
+
+The hierarchy is walked depth-first from the top cell and each unique cell is written after the cells it references.
+The writer keeps no element lists of its own: it only holds the names of the cells that were visited and the path
+from the top cell to the cell that is being written. Unlike `write_gdsii`, it never builds the complete GDSII library
+in memory.
+
+The layouts themselves are cached by IPKISS. After the records of a cell other than the top cell are written, the
+`release` function is called with it to drop its layout. `CircuitCell.Layout.write_gdsii_stream` releases the layout
+of every CircuitCell by default (circuit.circuitcell.release_layout), together with the connector waveguides it owns.
+As the cells are written children first, the element lists of a subtree are freed as soon as the subtree is written
+instead of when the whole file is written. benchmarks/bench_gdsii_memory.py compares the peak memory with
+`write_gdsii`.
+
+Polygons and paths with more points than a GDSII XY record can hold are split into several elements.
+
+Example::
+
+    layout = ocdc.Layout()
+    layout.write_gdsii_stream("ocdc.gds")
+"""
+
+import datetime
+import math
+import struct
+import warnings
+from ipkiss3 import all as i3
+from .bbox import get_instance_transformation
+
+# Record types, with their data type in the low byte
+HEADER = 0x0002
+BGNLIB = 0x0102
+LIBNAME = 0x0206
+UNITS = 0x0305
+ENDLIB = 0x0400
+BGNSTR = 0x0502
+STRNAME = 0x0606
+ENDSTR = 0x0700
+BOUNDARY = 0x0800
+PATH = 0x0900
+SREF = 0x0A00
+AREF = 0x0B00
+TEXT = 0x0C00
+LAYER = 0x0D02
+DATATYPE = 0x0E02
+WIDTH = 0x0F03
+XY = 0x1003
+ENDEL = 0x1100
+SNAME = 0x1206
+COLROW = 0x1302
+TEXTTYPE = 0x1602
+STRING = 0x1906
+STRANS = 0x1A01
+MAG = 0x1B05
+ANGLE = 0x1C05
+PATHTYPE = 0x2102
+
+GDSII_VERSION = 600
+# A record holds at most 65535 bytes: 4 header bytes and 8 bytes per point
+MAX_XY_POINTS = 8191
+
+
+def _real8(value):
+    """Encodes a float as a GDSII 8-byte real (excess-64, base 16)."""
+    if value == 0:
+        return b"\x00" * 8
+    sign = 0x80 if value < 0 else 0x00
+    value = abs(value)
+    exponent = 64
+    while value >= 1.0:
+        value /= 16.0
+        exponent += 1
+    while value < 1.0 / 16.0:
+        value *= 16.0
+        exponent -= 1
+    mantissa = int(round(value * 2 ** 56))
+    if mantissa >= 2 ** 56:
+        mantissa //= 16
+        exponent += 1
+    return struct.pack(">B", sign | exponent) + struct.pack(">Q", mantissa)[1:]
+
+
+class GdsiiStreamWriter(object):
+    """Writes GDSII records to a binary file object.
+
+    Parameters
+    ----------
+    stream : file
+        File opened in binary mode
+    unit : float
+        User unit in meter
+    grid : float
+        Database unit in meter
+    """
+
+    def __init__(self, stream, unit, grid):
+        self.stream = stream
+        self.unit = unit
+        self.grid = grid
+        self.scale = unit / grid
+        self.n_records = 0
+
+    def record(self, record_type, data=b""):
+        if len(data) % 2:
+            data += b"\x00"
+        self.stream.write(struct.pack(">HH", len(data) + 4, record_type) + data)
+        self.n_records += 1
+
+    def int2(self, record_type, *values):
+        self.record(record_type, struct.pack(">{}h".format(len(values)), *values))
+
+    def int4(self, record_type, *values):
+        self.record(record_type, struct.pack(">{}i".format(len(values)), *values))
+
+    def real8(self, record_type, *values):
+        self.record(record_type, b"".join(_real8(v) for v in values))
+
+    def ascii(self, record_type, text):
+        self.record(record_type, text.encode("ascii"))
+
+    def xy(self, points):
+        coords = []
+        for p in points:
+            coords.append(int(round(p[0] * self.scale)))
+            coords.append(int(round(p[1] * self.scale)))
+        self.int4(XY, *coords)
+
+    @staticmethod
+    def _timestamp():
+        now = datetime.datetime.now()
+        return (now.year, now.month, now.day, now.hour, now.minute, now.second)
+
+    def begin_library(self, name):
+        self.int2(HEADER, GDSII_VERSION)
+        self.int2(BGNLIB, *(self._timestamp() * 2))
+        self.ascii(LIBNAME, name)
+        self.real8(UNITS, self.grid / self.unit, self.grid)
+
+    def end_library(self):
+        self.record(ENDLIB)
+
+    def begin_structure(self, name):
+        self.int2(BGNSTR, *(self._timestamp() * 2))
+        self.ascii(STRNAME, name)
+
+    def end_structure(self):
+        self.record(ENDSTR)
+
+    def boundary(self, layer, datatype, points):
+        points = [(p[0], p[1]) for p in points]
+        if len(points) > 1 and points[0] == points[-1]:
+            points = points[:-1]
+        if len(points) < 3:
+            return
+        for piece in _fracture_polygon(points, MAX_XY_POINTS - 1):
+            self.record(BOUNDARY)
+            self.int2(LAYER, layer)
+            self.int2(DATATYPE, datatype)
+            self.xy(piece + [piece[0]])
+            self.record(ENDEL)
+
+    def path(self, layer, datatype, points, width, path_type=0):
+        points = [(p[0], p[1]) for p in points]
+        for piece in _split_path(points, MAX_XY_POINTS):
+            self.record(PATH)
+            self.int2(LAYER, layer)
+            self.int2(DATATYPE, datatype)
+            self.int2(PATHTYPE, path_type)
+            self.int4(WIDTH, int(round(width * self.scale)))
+            self.xy(piece)
+            self.record(ENDEL)
+
+    def text(self, layer, texttype, position, text):
+        self.record(TEXT)
+        self.int2(LAYER, layer)
+        self.int2(TEXTTYPE, texttype)
+        self.xy([position])
+        self.ascii(STRING, text)
+        self.record(ENDEL)
+
+    def _strans(self, rotation, magnification, v_flip):
+        if rotation or magnification != 1.0 or v_flip:
+            self.record(STRANS, struct.pack(">H", 0x8000 if v_flip else 0x0000))
+            if magnification != 1.0:
+                self.real8(MAG, magnification)
+            if rotation:
+                self.real8(ANGLE, rotation)
+
+    def sref(self, name, translation, rotation=0.0, magnification=1.0, v_flip=False):
+        self.record(SREF)
+        self.ascii(SNAME, name)
+        self._strans(rotation, magnification, v_flip)
+        self.xy([translation])
+        self.record(ENDEL)
+
+    def aref(self, name, translation, period, n_o_periods, rotation=0.0, magnification=1.0, v_flip=False):
+        columns, rows = n_o_periods
+        self.record(AREF)
+        self.ascii(SNAME, name)
+        self._strans(rotation, magnification, v_flip)
+        self.int2(COLROW, columns, rows)
+        # The lattice vectors are given in the parent cell, so they carry the transformation of the reference
+        col_vector = _transform_vector((columns * period[0], 0.0), rotation, magnification, v_flip)
+        row_vector = _transform_vector((0.0, rows * period[1]), rotation, magnification, v_flip)
+        self.xy([translation,
+                 (translation[0] + col_vector[0], translation[1] + col_vector[1]),
+                 (translation[0] + row_vector[0], translation[1] + row_vector[1])])
+        self.record(ENDEL)
+
+
+def _transform_vector(vector, rotation, magnification, v_flip):
+    """Mirrors (around the x-axis), magnifies and rotates a vector, in the order of a GDSII STRANS."""
+    x, y = vector[0], -vector[1] if v_flip else vector[1]
+    angle = math.radians(rotation)
+    c, s = math.cos(angle) * magnification, math.sin(angle) * magnification
+    return x * c - y * s, x * s + y * c
+
+
+def _clip_polygon(points, axis, value, keep_below):
+    """Clips a polygon to the half plane coordinate[axis] <= value (or >= value), Sutherland-Hodgman style."""
+    def inside(p):
+        return p[axis] <= value if keep_below else p[axis] >= value
+
+    clipped = []
+    for cnt, current in enumerate(points):
+        previous = points[cnt - 1]
+        if inside(current):
+            if not inside(previous):
+                clipped.append(_axis_intersection(previous, current, axis, value))
+            clipped.append(current)
+        elif inside(previous):
+            clipped.append(_axis_intersection(previous, current, axis, value))
+    return clipped
+
+
+def _axis_intersection(p1, p2, axis, value):
+    t = (value - p1[axis]) / float(p2[axis] - p1[axis])
+    point = [p1[0] + t * (p2[0] - p1[0]), p1[1] + t * (p2[1] - p1[1])]
+    point[axis] = value
+    return tuple(point)
+
+
+def _fracture_polygon(points, max_points):
+    """Splits a polygon into pieces of at most max_points points by cutting it at the median vertex coordinate along
+    its widest axis, recursively. The pieces cover the same area as the polygon."""
+    if len(points) <= max_points:
+        return [points]
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    axis = 0 if max(xs) - min(xs) >= max(ys) - min(ys) else 1
+    coords = sorted(xs if axis == 0 else ys)
+    value = coords[len(coords) // 2]
+    if value == coords[0] or value == coords[-1]:
+        # Most vertices share the cut coordinate; cut halfway the extent instead.
+        value = 0.5 * (coords[0] + coords[-1])
+    pieces = []
+    for keep_below in (True, False):
+        piece = _clip_polygon(points, axis, value, keep_below)
+        if len(piece) >= 3:
+            if len(piece) >= len(points):
+                raise ValueError("Polygon with {} points can not be fractured".format(len(points)))
+            pieces += _fracture_polygon(piece, max_points)
+    return pieces
+
+
+def _split_path(points, max_points):
+    """Splits a path into consecutive paths of at most max_points points. The paths are split halfway a segment, so
+    the pieces join without a gap or notch for every path type."""
+    pieces = []
+    while len(points) > max_points:
+        head = points[:max_points - 1]
+        p1, p2 = points[max_points - 2], points[max_points - 1]
+        middle = (0.5 * (p1[0] + p2[0]), 0.5 * (p1[1] + p2[1]))
+        pieces.append(head + [middle])
+        points = [middle] + points[max_points - 1:]
+    pieces.append(points)
+    return pieces
+
+
+def _gdsii_layer(layer, layer_map):
+    if hasattr(layer, "number") and hasattr(layer, "datatype"):
+        return layer.number, layer.datatype
+    gdsii_layer = layer_map[layer]
+    return gdsii_layer.number, gdsii_layer.datatype
+
+
+def _referenced_cells(layout):
+    for el in layout.layout:
+        if isinstance(el, (i3.SRef, i3.ARef)):
+            yield el.reference
+
+
+def _write_cell(writer, name, layout, layer_map):
+    writer.begin_structure(name)
+    for el in layout.layout:
+        if isinstance(el, (i3.SRef, i3.ARef)):
+            reference = el.reference
+            translation, rotation, magnification, v_flip = get_instance_transformation(el)
+            if isinstance(el, i3.ARef):
+                writer.aref(reference.name, translation, el.period, el.n_o_periods, rotation, magnification, v_flip)
+            else:
+                writer.sref(reference.name, translation, rotation, magnification, v_flip)
+        elif isinstance(el, i3.Label):
+            layer, datatype = _gdsii_layer(el.layer, layer_map)
+            writer.text(layer, datatype, el.coordinate, el.text)
+        elif isinstance(el, i3.Path):
+            layer, datatype = _gdsii_layer(el.layer, layer_map)
+            writer.path(layer, datatype, el.shape, el.line_width, getattr(el, "path_type", 0))
+        elif hasattr(el, "shape") and hasattr(el, "layer"):
+            layer, datatype = _gdsii_layer(el.layer, layer_map)
+            writer.boundary(layer, datatype, el.shape)
+        else:
+            warnings.warn("Element {} of cell {} can not be streamed to GDSII and is skipped".format(el, name))
+    writer.end_structure()
+
+
+def write_gdsii_stream(cell, filename, library_name=None, unit=None, grid=None, layer_map=None, release=None):
+    """Writes the layout hierarchy of a cell to a GDSII file, one cell at a time.
+
+    Parameters
+    ----------
+    cell : PCell or LayoutView
+        Top cell
+    filename : str
+        Name of the GDSII file
+    library_name : str, optional
+        Name of the GDSII library, the name of the top cell by default
+    unit : float, optional
+        User unit in meter, i3.TECH.METRICS.UNIT by default
+    grid : float, optional
+        Database unit in meter, i3.TECH.METRICS.GRID by default
+    layer_map : mapping, optional
+        Map from process-purpose layers to GDSII layers, i3.TECH.GDSII.EXPORT_LAYER_MAP by default
+    release : function, optional
+        Called with each cell except the top cell after its records are written, to drop its cached layout. The
+        cells it references are written before it, so its layout is not used by the writer anymore.
+
+    Returns
+    -------
+    info : dict
+        Number of cells and records that were written
+    """
+    if isinstance(cell, i3.LayoutView):
+        cell = cell.cell
+    unit = i3.TECH.METRICS.UNIT if unit is None else unit
+    grid = i3.TECH.METRICS.GRID if grid is None else grid
+    layer_map = i3.TECH.GDSII.EXPORT_LAYER_MAP if layer_map is None else layer_map
+
+    visited = set([cell.name])
+    # Path from the top cell to the current cell, with an iterator over the cells each of them references
+    path = [(cell, _referenced_cells(cell.get_default_view(i3.LayoutView)))]
+    n_cells = 0
+    with open(filename, "wb") as stream:
+        writer = GdsiiStreamWriter(stream, unit=unit, grid=grid)
+        writer.begin_library(library_name or cell.name)
+        while path:
+            current, references = path[-1]
+            for reference in references:
+                if reference.name not in visited:
+                    visited.add(reference.name)
+                    path.append((reference, _referenced_cells(reference.get_default_view(i3.LayoutView))))
+                    break
+            else:
+                # All the cells referenced by current are written
+                path.pop()
+                _write_cell(writer, current.name, current.get_default_view(i3.LayoutView), layer_map)
+                n_cells += 1
+                if path and release is not None:
+                    release(current)
+        writer.end_library()
+    return {"cells": n_cells, "records": writer.n_records}
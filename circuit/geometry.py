@@ -0,0 +1,104 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Cached geometry of layouts, used by placement code.
+
+`size_info()` walks the full hierarchy to calculate the bounding box every time it is called. The LayoutGeometry
+facade calculates the bounding box (with the hierarchical engine of circuit.bbox) and the port table of a layout
+once. For a CircuitCell it is cached with
+`i3.cache`, so it is invalidated when a property of the cell changes. For other cells it is kept in a bounded table
+together with the layout view it was calculated from, so it is invalidated when the cell gets a new layout view, e.g.
+with `cell.Layout(shape=...)`.
+
+Example::
+
+    geometry = get_layout_geometry(self.heated_wg)
+    ht_len = geometry.east
+"""
+
+from ipkiss3 import all as i3
+from .lru_cache import LRUCache
+from .bbox import calculate_bounding_box, get_bounding_box
+
+
+class LayoutGeometry(object):
+    """Bounding box and port table of a layout view.
+
+    Parameters
+    ----------
+    layout : i3.LayoutView
+    box : tuple, optional
+        Bounding box (west, south, east, north) of the layout, calculated from the layout if not given
+    """
+
+    def __init__(self, layout, box=None):
+        if box is None:
+            box = calculate_bounding_box(layout)
+        if box is None:
+            box = (0.0, 0.0, 0.0, 0.0)
+        self.west, self.south, self.east, self.north = box
+        self.ports = dict((port.name, port) for port in layout.ports)
+
+    @property
+    def width(self):
+        return self.east - self.west
+
+    @property
+    def height(self):
+        return self.north - self.south
+
+    @property
+    def center(self):
+        return 0.5 * (self.west + self.east), 0.5 * (self.south + self.north)
+
+    def port_position(self, port_name):
+        """Returns the position of the port with name port_name."""
+        return self.ports[port_name].position
+
+    def find_ports(self, pattern):
+        """Returns the ports whose name contains the regular expression pattern, sorted on name."""
+        import re
+        return [self.ports[name] for name in sorted(self.ports) if re.search(pattern, name)]
+
+
+_geometry_cache = LRUCache(maxsize=1024)
+
+
+def get_layout_geometry(cell):
+    """Returns the cached LayoutGeometry of the default layout view of a cell.
+
+    Parameters
+    ----------
+    cell : PCell
+
+    Returns
+    -------
+    geometry : LayoutGeometry
+    """
+    if hasattr(cell, "get_geometry"):
+        return cell.get_geometry()
+    layout = cell.get_default_view(i3.LayoutView)
+    entry = _geometry_cache.get(id(cell))
+    if entry is None or entry[0] is not cell or entry[1] is not layout:
+        # The cell is stored with its geometry, so that its id can't be reused by another cell, and the layout view
+        # so that a new layout of the cell is detected.
+        entry = (cell, layout, LayoutGeometry(layout, box=get_bounding_box(cell)))
+        _geometry_cache[id(cell)] = entry
+    return entry[2]
+
+
+def clear_layout_geometry_cache():
+    """Empties the table with the geometry of cells that are not CircuitCells."""
+    _geometry_cache.clear()
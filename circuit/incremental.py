@@ -0,0 +1,108 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Incremental builds of CircuitCells.
+
+When incremental builds are enabled, every CircuitCell records its connector cells in a process-wide store, keyed
+on a dependency fingerprint of the connector: the connector function, its arguments and the fingerprints of the
+two instances it connects. The fingerprint of an instance contains the class of its cell and the names and
+placed geometry of all its ports, so it changes when the instance is moved or when its interface changes.
+
+A cell that is built again after a parameter change (for instance an OCDC with another heater) only regenerates
+the connectors whose endpoint instances moved or changed. All other connector cells, including those of
+unchanged sub-circuits such as splitter trees, are taken from the store.
+
+Example::
+
+    from circuit.incremental import enable_incremental_builds
+    enable_incremental_builds()
+    ocdc = OCDC(levels=4)
+    ocdc.Layout()
+    ocdc2 = OCDC(levels=4, heated_wg=HeatedWaveguide(heater_width=6.0))
+    ocdc2.Layout()
+    print(ocdc2.get_rebuild_report())
+"""
+
+from .fingerprint import (fingerprint_digest, function_fingerprint, fingerprint, port_fingerprint, template_identity,
+                          FingerprintError)
+from .lru_cache import LRUCache
+
+
+def instance_fingerprint(instance):
+    """Returns the fingerprint of a placed instance: the class of its cell and the geometry of its ports.
+
+    The trace templates of the ports are identified by object, not only by class and core width, because a stored
+    connector cell carries the complete template (cladding, layers and windows). The stored cells keep their
+    templates alive, so a template identity in a key can not be reused by another template.
+    """
+    cell = instance.reference
+    cls = type(cell)
+    ports = sorted((p.name, port_fingerprint(p), template_identity(getattr(p, "trace_template", None)))
+                   for p in instance.ports)
+    return "{}.{}".format(cls.__module__, cls.__name__), tuple(ports)
+
+
+class ConnectorBuildStore(LRUCache):
+    """Bounded store of connector cells keyed on their dependency fingerprint."""
+
+    def get_cell(self, key):
+        """Returns the connector cell stored under key, or None."""
+        entry = self.get(key)
+        return None if entry is None else entry[0]
+
+    def store_cell(self, key, cell, instances):
+        """Stores a connector cell. The cells of the endpoint instances are kept with it, so that the templates
+        identified in the key stay alive as long as the entry."""
+        self[key] = (cell, tuple(inst.reference for inst in instances))
+
+    def connector_key(self, connector_function, kwargs, start_port_id, end_port_id, start_instance_fingerprint,
+                      end_instance_fingerprint):
+        """Returns the key of a connector, or None if its arguments have no deterministic fingerprint."""
+        try:
+            return fingerprint_digest((function_fingerprint(connector_function),
+                                       fingerprint(kwargs),
+                                       start_port_id.split(":")[1],
+                                       end_port_id.split(":")[1],
+                                       start_instance_fingerprint,
+                                       end_instance_fingerprint))
+        except FingerprintError:
+            return None
+
+
+_connector_build_store = ConnectorBuildStore(maxsize=10000)
+_incremental_builds = [False]
+
+
+def enable_incremental_builds(maxsize=None):
+    """Makes CircuitCells reuse unchanged connectors of previous builds by default."""
+    if maxsize is not None:
+        _connector_build_store.maxsize = maxsize
+    _incremental_builds[0] = True
+
+
+def disable_incremental_builds():
+    """Stops reusing connectors of previous builds by default and empties the build store."""
+    _incremental_builds[0] = False
+    _connector_build_store.clear()
+
+
+def incremental_builds_enabled():
+    """Returns True if incremental builds are enabled."""
+    return _incremental_builds[0]
+
+
+def get_connector_build_store():
+    """Returns the process-wide store of connector cells."""
+    return _connector_build_store
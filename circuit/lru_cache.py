@@ -0,0 +1,97 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Bounded mapping that evicts the least recently used entry when it is full.
+
+    Hits and misses of `get` are counted, so the effectiveness of a cache can be inspected with `info`.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries that are kept.
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize of an LRUCache should be at least 1, got {}".format(maxsize))
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(list(self._data.keys()))
+
+    def __getitem__(self, key):
+        value = self._data.pop(key)
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._data:
+            del self._data[key]
+        elif len(self._data) >= self.maxsize:
+            self._data.popitem(last=False)
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def get(self, key, default=None):
+        """Returns the value stored for key and marks it as most recently used, or default if it is not stored.
+        """
+        if key in self._data:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return default
+
+    def get_or_compute(self, key, compute):
+        """Returns the value stored for key. If it is not stored, compute() is called and its result is stored.
+        """
+        if key in self._data:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        value = compute()
+        self[key] = value
+        return value
+
+    def items(self):
+        """Returns the (key, value) pairs from least to most recently used."""
+        return list(self._data.items())
+
+    def clear(self):
+        """Removes all entries and resets the hit and miss counters."""
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Returns a dictionary with the size, maximal size, hits and misses of the cache."""
+        return {"size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses}
@@ -0,0 +1,237 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Reduction of series chains of waveguides in a circuit netlist.
+
+Generic waveguides (circuit.waveguides.generic) that are linked in series without branching, and whose templates have
+the same n_eff data, wavelengths and core width, can be replaced by a single equivalent waveguide model. The
+transmission of a waveguide is exp(1j * (beta * L + pe * sqrt(L))), so a chain of lengths L_i and phase errors pe_i
+is equivalent to one waveguide of length sum(L_i) with the phase error
+
+    pe = sum(pe_i * sqrt(L_i)) / sqrt(sum(L_i))
+
+This lowers the number of nodes the circuit solver handles for every wavelength point. Enable it on a CircuitCell
+with reduce_waveguide_chains=True.
+"""
+
+from ipkiss3 import all as i3
+from ipkiss3.pcell.netlist.instance import InstanceTerm
+import numpy as np
+from .waveguides.generic.trace import GenericWaveguide, generate_wg_model
+
+
+class ReducedWaveguide(i3.PCell):
+    """Equivalent two-port waveguide of a series chain of waveguides, used by reduce_waveguide_netlist."""
+    _name_prefix = "REDUCED_WG"
+    n_effs = i3.NumpyArrayProperty(doc="Complex effective indices, one row per wavelength and one column per mode")
+    wavelengths = i3.NumpyArrayProperty(doc="Wavelengths at which n_effs is defined [um]")
+    length = i3.NonNegativeNumberProperty(doc="Total length of the chain [um]")
+    phase_error = i3.NumpyArrayProperty(doc="Equivalent phase error per mode [1/sqrt(um)]")
+    chain = i3.ListProperty(doc="Names of the reduced instances, in chain order")
+
+    def _default_chain(self):
+        return []
+
+    class Netlist(i3.NetlistView):
+        def _generate_terms(self, terms):
+            n_modes = self.n_effs.shape[1]
+            terms += i3.OpticalTerm(name="in", n_modes=n_modes)
+            terms += i3.OpticalTerm(name="out", n_modes=n_modes)
+            return terms
+
+    class CircuitModel(i3.CircuitModelView):
+        def _generate_model(self):
+            model_class = generate_wg_model(n_modes=self.n_effs.shape[1])
+            return model_class(length=self.length,
+                               n_effs=self.n_effs,
+                               wavelengths=self.wavelengths,
+                               phase_error=self.phase_error)
+
+
+def _function(method):
+    return getattr(method, "__func__", method)
+
+
+def _template_model(cell):
+    """Returns the template circuit model view of a waveguide whose model is the interpolated broadband model of
+    GenericWaveguide, or None. Subclasses with their own model, such as tapers between two templates, return None."""
+    if not isinstance(cell, GenericWaveguide):
+        return None
+    cell_model = getattr(type(cell), "CircuitModel", None)
+    if cell_model is None or (_function(cell_model._generate_model) is not
+                              _function(GenericWaveguide.CircuitModel._generate_model)):
+        return None
+    return cell.template.get_default_view(i3.CircuitModelView)
+
+
+def _compatibility_key(template_model):
+    """Two waveguides can be merged when their templates have the same n_eff data, wavelengths and core width."""
+    return (template_model._n_eff_data_key(),
+            float(template_model.cell.get_default_view(i3.LayoutView).core_width))
+
+
+def _is_reducible(instance):
+    """A netlist instance can be reduced when it is a generic waveguide with only the terms in/out."""
+    if set(instance.terms.keys()) != {"in", "out"}:
+        return False
+    return _template_model(instance.reference) is not None
+
+
+def _phase_errors(template_model, n_modes):
+    return np.array([template_model.get_phase_error(mode=mode) for mode in range(n_modes)], dtype=float)
+
+
+def combine_phase_errors(lengths, phase_errors):
+    """Returns the phase error of one waveguide equivalent to waveguides in series.
+
+    Parameters
+    ----------
+    lengths : array
+        Lengths of the waveguides [um]
+    phase_errors : array
+        Phase errors of the waveguides, one row per waveguide and one column per mode [1/sqrt(um)]
+
+    Returns
+    -------
+    phase_error : array
+        Equivalent phase error per mode, sum(pe_i * sqrt(L_i)) / sqrt(sum(L_i))
+    """
+    lengths = np.asarray(lengths, dtype=float)
+    total = np.sum(lengths)
+    if total <= 0.0:
+        return np.zeros(np.shape(phase_errors)[1:])
+    return np.dot(np.sqrt(lengths), np.asarray(phase_errors, dtype=float)) / np.sqrt(total)
+
+
+def find_waveguide_chains(netlist):
+    """Returns the series chains of compatible waveguides in a netlist.
+
+    Returns
+    -------
+    chains : list of (list of str, tuple)
+        Instance names of every chain of at least two waveguides in chain order, with the terms the ends of the
+        chain are linked to ("inst:term" or the name of an external term, None when unconnected)
+    """
+    # Map every instance term to the term it is linked to
+    links = dict()
+    for net in netlist.get_nets_to_terms():
+        if net.domain != i3.OpticalDomain or len(net.terms) != 2:
+            continue
+        names = []
+        for term in net.terms:
+            if isinstance(term, InstanceTerm):
+                names.append((term.instance.name, term.term.name))
+            else:
+                names.append((None, term.name))
+        links[names[0]] = names[1]
+        links[names[1]] = names[0]
+
+    reducible = dict()
+    for name, instance in netlist.instances.items():
+        if _is_reducible(instance):
+            reducible[name] = _compatibility_key(_template_model(instance.reference))
+
+    def _next(name, term):
+        """Returns the compatible waveguide linked to term of name, with the term it is entered through."""
+        other = links.get((name, term))
+        if other is None or other[0] not in reducible or other[0] == name:
+            return None
+        if reducible[other[0]] != reducible[name]:
+            return None
+        return other
+
+    def _other_term(term):
+        return "out" if term == "in" else "in"
+
+    def _label(link):
+        if link is None:
+            return None
+        return link[1] if link[0] is None else "{}:{}".format(*link)
+
+    chains = []
+    visited = set()
+    for name in sorted(reducible):
+        if name in visited:
+            continue
+        # Walk back to the start of the chain, then collect it forwards
+        start, start_term = name, "in"
+        seen = {name}
+        while True:
+            previous = _next(start, start_term)
+            if previous is None or previous[0] in seen:
+                break
+            start, start_term = previous[0], _other_term(previous[1])
+            seen.add(start)
+        chain = [start]
+        visited.add(start)
+        end, end_term = start, _other_term(start_term)
+        while True:
+            following = _next(end, end_term)
+            if following is None or following[0] in visited:
+                break
+            end, end_term = following[0], _other_term(following[1])
+            chain.append(end)
+            visited.add(end)
+        end_links = (links.get((start, start_term)), links.get((end, end_term)))
+        if len(chain) > 1 and not any(link is not None and link[0] in seen.union(chain) for link in end_links):
+            chains.append((chain, (_label(end_links[0]), _label(end_links[1]))))
+    return chains
+
+
+def reduce_waveguide_netlist(netlist, name_prefix="reduced_wg"):
+    """Replaces the series chains of compatible waveguides in a netlist by a single ReducedWaveguide each.
+
+    Parameters
+    ----------
+    netlist : netlist
+        Netlist that is reduced in place
+    name_prefix : str
+        Prefix of the names of the new instances
+
+    Returns
+    -------
+    chains : list of list of str
+        Instance names of the reduced chains
+    """
+    chains = find_waveguide_chains(netlist)
+    for cnt, (chain, (start_link, end_link)) in enumerate(chains):
+        cells = [netlist.instances[name].reference for name in chain]
+        template_models = [_template_model(cell) for cell in cells]
+        wavelengths = np.asarray(template_models[0].wavelengths, dtype=float)
+        n_effs = np.asarray(template_models[0].get_n_eff_table(wavelengths=wavelengths))
+        n_modes = n_effs.shape[1]
+        # The same lengths and phase errors as the models of the waveguides themselves
+        lengths = [cell.get_default_view(i3.CircuitModelView).length for cell in cells]
+        phase_errors = [_phase_errors(template_model, n_modes) for template_model in template_models]
+        reduced = ReducedWaveguide(n_effs=n_effs,
+                                   wavelengths=wavelengths,
+                                   length=float(np.sum(lengths)),
+                                   phase_error=combine_phase_errors(lengths, phase_errors),
+                                   chain=list(chain))
+
+        removed = set(chain)
+        for net_name, net in list(netlist.nets.items()):
+            if any(isinstance(t, InstanceTerm) and t.instance.name in removed for t in net.terms):
+                del netlist.nets[net_name]
+        for name in chain:
+            del netlist.instances[name]
+
+        inst_name = "{}_{}".format(name_prefix, cnt)
+        netlist += i3.Instance(reference=reduced, name=inst_name)
+        if start_link is not None:
+            netlist.link("{}:in".format(inst_name), start_link)
+        if end_link is not None:
+            netlist.link("{}:out".format(inst_name), end_link)
+    return [chain for chain, _ in chains]
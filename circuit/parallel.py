@@ -0,0 +1,287 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Computation of connector shapes in a pool of worker processes, optionally backed by a persistent cache.
+
+Connector cells can not be sent between processes, so the workers only receive plain port data
+(position, angle and trace template key) together with the connector arguments, and return the points of the
+connector shape. The parent process then builds the connector cells from these shapes with the regular
+connector functions, so the cells are identical to the ones built serially. Warnings raised while a shape is
+calculated, in a worker or earlier for a cached shape, are returned with it and raised again in the parent.
+
+On platforms that spawn new processes (Windows), the script that builds the layout needs to be protected
+with `if __name__ == "__main__":`.
+"""
+
+from ipkiss3 import all as i3
+from collections import namedtuple, OrderedDict
+from functools import partial
+import multiprocessing
+import pickle
+import warnings
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+from .connector_functions import (manhattan, bezier_sbend, bezier_bend, route_manhattan,
+                                  get_manhattan_routing_properties, shape_bezier_sbend_max_radius,
+                                  shape_bezier_bend_max_radius, shape_bezier_sbend_max_radius_batch,
+                                  tech_bend_radius)
+from .fingerprint import template_fingerprint
+
+PortData = namedtuple("PortData", ["x", "y", "angle", "template_key"])
+
+
+def get_port_data(port):
+    """Returns the plain data of an optical port: position, angle and trace template key."""
+    return PortData(x=float(port.position[0]),
+                    y=float(port.position[1]),
+                    angle=float(port.angle),
+                    template_key=template_fingerprint(getattr(port, "trace_template", None)))
+
+
+def _port_from_data(port_data):
+    return i3.OpticalPort(position=(port_data.x, port_data.y), angle=port_data.angle)
+
+
+# Shape functions: they calculate the shape of a connector from the ports and the connector arguments.
+def _manhattan_shape(start_port, end_port, bend_radius=tech_bend_radius, control_points=[],
+                     adiabatic_angle=0.0, start_straight=None, end_straight=None, min_straight=None, **kwargs):
+    return route_manhattan(start_port=start_port, end_port=end_port,
+                           bend_radius=bend_radius, control_points=control_points,
+                           start_straight=start_straight, end_straight=end_straight,
+                           min_straight=min_straight, adiabatic_angle=adiabatic_angle)
+
+
+def _bezier_sbend_shape(start_port, end_port, adiabatic_angle=15.0, min_bend_radius=None, **kwargs):
+    return shape_bezier_sbend_max_radius(start_port=start_port, end_port=end_port,
+                                         adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+
+
+def _bezier_bend_shape(start_port, end_port, adiabatic_angle=15.0, min_bend_radius=None, **kwargs):
+    return shape_bezier_bend_max_radius(start_port=start_port, end_port=end_port,
+                                        adiabatic_angle=adiabatic_angle, min_bend_radius=min_bend_radius)
+
+
+# Shape wrappers: they rebuild, in the parent process, the shape object expected by the connector function.
+def _manhattan_route_from_points(points, bend_radius=tech_bend_radius, adiabatic_angle=0.0, start_straight=None,
+                                 end_straight=None, min_straight=None, **kwargs):
+    rt_dict = get_manhattan_routing_properties(bend_radius=bend_radius,
+                                               start_straight=start_straight,
+                                               end_straight=end_straight,
+                                               min_straight=min_straight,
+                                               adiabatic_angle=adiabatic_angle)
+    return i3.Route(points, rounding_algorithm=rt_dict.get("rounding_algorithm", i3.ShapeRound))
+
+
+def _shape_from_points(points, **kwargs):
+    return i3.Shape(points)
+
+
+_shape_functions = {
+    manhattan: (_manhattan_shape, _manhattan_route_from_points),
+    bezier_sbend: (_bezier_sbend_shape, _shape_from_points),
+    bezier_bend: (_bezier_bend_shape, _shape_from_points),
+}
+
+
+def register_shape_function(connector_function, shape_function, shape_wrapper=_shape_from_points):
+    """Registers how the shape of a connector can be calculated in a worker process.
+
+    Parameters
+    ----------
+    connector_function : connector function
+        Connector function that accepts a `shape` argument
+    shape_function : function
+        Module-level function with signature shape_function(start_port, end_port, **kwargs) that returns a shape
+    shape_wrapper : function, optional
+        Function with signature shape_wrapper(points, **kwargs) that turns the points back into the shape
+        expected by the connector function
+    """
+    _shape_functions[connector_function] = (shape_function, shape_wrapper)
+
+
+def unwrap_connector_function(connector_function):
+    """Returns the underlying function and the keyword arguments of a (possibly nested) functools.partial.
+
+    Returns (None, None) when the partial has positional arguments.
+    """
+    kwargs = dict()
+    while isinstance(connector_function, partial):
+        if connector_function.args:
+            return None, None
+        partial_kwargs = dict(connector_function.keywords or {})
+        partial_kwargs.update(kwargs)
+        kwargs = partial_kwargs
+        connector_function = connector_function.func
+    return connector_function, kwargs
+
+
+def get_shape_functions(connector_function, kwargs):
+    """Returns (shape_function, shape_wrapper, all_kwargs) for a connector, or None if its shape can not be
+    calculated in a worker process.
+    """
+    func, all_kwargs = unwrap_connector_function(connector_function)
+    if func is None or func not in _shape_functions:
+        return None
+    all_kwargs.update(kwargs)
+    if "shape" in all_kwargs and all_kwargs["shape"] is not None:
+        return None
+    all_kwargs.pop("shape", None)
+    shape_function, shape_wrapper = _shape_functions[func]
+    return shape_function, shape_wrapper, all_kwargs
+
+
+def _compute_shape_points(job):
+    """Returns (points, warnings) of the shape of a job, with warnings a list of (category name, message), or None
+    if the shape can not be calculated."""
+    shape_function, start_data, end_data, kwargs = job
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        try:
+            shape = shape_function(start_port=_port_from_data(start_data),
+                                   end_port=_port_from_data(end_data),
+                                   **kwargs)
+            points = [(float(p[0]), float(p[1])) for p in shape.points]
+        except Exception:
+            # The connector is built again in the parent process, which reports the error.
+            return None
+    return points, [(w.category.__name__, str(w.message)) for w in caught]
+
+
+def _warning_category(name):
+    category = getattr(builtins, name, None)
+    if isinstance(category, type) and issubclass(category, Warning):
+        return category
+    return UserWarning
+
+
+def _emit_warnings(shape_warnings):
+    """Raises the warnings of a shape calculated in a worker process or taken from the cache."""
+    for category_name, message in shape_warnings:
+        warnings.warn(message, _warning_category(category_name), stacklevel=3)
+
+
+def _is_picklable(obj):
+    try:
+        pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        return True
+    except Exception:
+        return False
+
+
+def compute_connector_shapes(connectors, n_workers=1, cache=None):
+    """Calculates the shapes of connectors, in a pool of worker processes if n_workers > 1.
+
+    Parameters
+    ----------
+    connectors : list of tuples
+        List of (key, connector_function, kwargs, start_port, end_port)
+    n_workers : int, optional
+        Number of worker processes
+    cache : ConnectorCache, optional
+        Persistent cache: shapes found in it are not calculated, calculated shapes are stored in it
+
+    Returns
+    -------
+    shapes : dict
+        Dictionary {key: shape} for the connectors whose shape could be calculated. Connectors that are missing
+        need to be built the regular way.
+    """
+    shapes = dict()
+    to_calculate = []
+    for key, connector_function, kwargs, start_port, end_port in connectors:
+        shape_functions = get_shape_functions(connector_function, kwargs)
+        if shape_functions is None:
+            continue
+        shape_function, shape_wrapper, all_kwargs = shape_functions
+        cache_key = None
+        if cache is not None:
+            func, _ = unwrap_connector_function(connector_function)
+            cache_key = cache.key(func, all_kwargs, start_port, end_port)
+            if cache_key is not None:
+                entry = cache.load_entry(cache_key)
+                if entry is not None:
+                    points, shape_warnings = entry
+                    _emit_warnings(shape_warnings)
+                    shapes[key] = shape_wrapper(points, **all_kwargs)
+                    continue
+        job = (shape_function, get_port_data(start_port), get_port_data(end_port), all_kwargs)
+        to_calculate.append((key, shape_wrapper, all_kwargs, cache_key, job))
+
+    if n_workers > 1:
+        to_calculate = [tc for tc in to_calculate if _is_picklable(tc[4])]
+        jobs = [tc[4] for tc in to_calculate]
+        if jobs:
+            pool = multiprocessing.Pool(processes=n_workers)
+            try:
+                chunksize = max(1, len(jobs) // (4 * n_workers))
+                results = pool.map(_compute_shape_points, jobs, chunksize=chunksize)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = []
+    else:
+        results = [_compute_shape_points(tc[4]) for tc in to_calculate]
+
+    for (key, shape_wrapper, all_kwargs, cache_key, job), result in zip(to_calculate, results):
+        if result is None:
+            continue
+        points, shape_warnings = result
+        _emit_warnings(shape_warnings)
+        if cache_key is not None:
+            cache.store(cache_key, points, shape_warnings)
+        shapes[key] = shape_wrapper(points, **all_kwargs)
+    return shapes
+
+
+def compute_bezier_sbend_shapes(connectors):
+    """Calculates the shapes of the bezier S-bend connectors in batches of connectors with the same arguments.
+
+    Parameters
+    ----------
+    connectors : list of tuples
+        List of (key, connector_function, kwargs, start_port, end_port). Connectors that are not bezier S-bends
+        are ignored.
+
+    Returns
+    -------
+    shapes : dict
+        Dictionary {key: shape} for the S-bends whose shape could be calculated.
+    """
+    batches = OrderedDict()
+    for key, connector_function, kwargs, start_port, end_port in connectors:
+        func, all_kwargs = unwrap_connector_function(connector_function)
+        if func is not bezier_sbend:
+            continue
+        all_kwargs.update(kwargs)
+        if all_kwargs.get("shape", None) is not None:
+            continue
+        batch_key = (all_kwargs.get("adiabatic_angle", 15.0), all_kwargs.get("min_bend_radius", None))
+        batches.setdefault(batch_key, []).append((key, start_port, end_port))
+
+    shapes = dict()
+    for (adiabatic_angle, min_bend_radius), batch in batches.items():
+        try:
+            rounded_shapes = shape_bezier_sbend_max_radius_batch(start_ports=[b[1] for b in batch],
+                                                                 end_ports=[b[2] for b in batch],
+                                                                 adiabatic_angle=adiabatic_angle,
+                                                                 min_bend_radius=min_bend_radius)
+        except Exception:
+            # The connectors are built one by one, which reports the error.
+            continue
+        shapes.update(zip([b[0] for b in batch], rounded_shapes))
+    return shapes
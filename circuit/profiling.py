@@ -0,0 +1,158 @@
+# Copyright (C) 2020 Luceda Photonics
+# This version of Luceda Academy and related packages
+# (hereafter referred to as Luceda Academy) is distributed under a proprietary License by Luceda
+# It does allow you to develop and distribute add-ons or plug-ins, but does
+# not allow redistribution of Luceda Academy  itself (in original or modified form).
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+# For the details of the licensing contract and the conditions under which
+# you may use this software, we refer to the
+# EULA which was distributed along with this program.
+# It is located in the root of the distribution folder.
+
+"""Build-phase profiler for CircuitCells.
+
+When profiling is enabled, CircuitCell times the calculation of its child cells, the placement of its instances
+(place specs and joins), every connector function call, the generation of its ports and the extraction of its
+netlist. The timings are aggregated per phase and per cell class or connector function, and can be reported as JSON
+or as a text table sorted on self time.
+
+Phases nest: the placement of a cell includes the builds of its child cells, which are timed as phases of their own.
+"total" is the inclusive time of a phase and counts the nested phases again, so the totals of different rows can not
+be added up. "self" is the time spent in the phase outside its nested phases; the self times add up to the profiled
+time. A phase that is entered again for the same key while it is running is timed only once, by the outer call.
+
+Example::
+
+    from circuit.profiling import enable_profiling, get_build_profiler
+    enable_profiling()
+    CelOCDCCel().Layout()
+    print(get_build_profiler().format_table())
+    get_build_profiler().write_json("build_profile.json")
+"""
+
+from contextlib import contextmanager
+from functools import wraps, partial
+import json
+import time
+
+
+def _function_name(function):
+    while isinstance(function, partial):
+        function = function.func
+    return getattr(function, "__name__", str(function))
+
+
+class BuildProfiler(object):
+    """Aggregates the time spent in build phases per phase and key (cell class or connector function)."""
+
+    def __init__(self):
+        self.enabled = False
+        self._stats = dict()
+        # Running phases, as [phase, key, time spent in nested phases]
+        self._running = []
+
+    def add(self, phase, key, elapsed, self_elapsed=None):
+        """Adds a timing of elapsed seconds for the phase and key, of which self_elapsed (by default all) was spent
+        outside nested phases."""
+        stats = self._stats.get((phase, key))
+        if stats is None:
+            stats = self._stats[(phase, key)] = {"count": 0, "total": 0.0, "self": 0.0, "max": 0.0}
+        stats["count"] += 1
+        stats["total"] += elapsed
+        stats["self"] += elapsed if self_elapsed is None else self_elapsed
+        stats["max"] = max(stats["max"], elapsed)
+
+    @contextmanager
+    def phase(self, phase, key):
+        """Context manager that times its body as the phase for key. It does nothing when profiling is disabled or
+        when the same phase and key is already running."""
+        if not self.enabled or any(r[0] == phase and r[1] == key for r in self._running):
+            yield
+            return
+        frame = [phase, key, 0.0]
+        self._running.append(frame)
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            self._running.pop()
+            if self._running:
+                self._running[-1][2] += elapsed
+            self.add(phase, key, elapsed, elapsed - frame[2])
+
+    def reset(self):
+        self._stats.clear()
+
+    def report(self):
+        """Returns the timings as a list of dictionaries, sorted on self time. "total" is inclusive of nested
+        phases, "self" is not."""
+        rows = [{"phase": phase, "key": key, "count": stats["count"], "total": stats["total"], "self": stats["self"],
+                 "max": stats["max"], "mean": stats["total"] / stats["count"]}
+                for (phase, key), stats in self._stats.items()]
+        return sorted(rows, key=lambda r: (-r["self"], r["phase"], r["key"]))
+
+    def to_json(self, **kwargs):
+        """Returns the report as a JSON string."""
+        return json.dumps({"phases": self.report()}, **kwargs)
+
+    def write_json(self, filename):
+        """Writes the report to a JSON file."""
+        with open(filename, "w") as f:
+            f.write(self.to_json(indent=2))
+
+    def format_table(self):
+        """Returns the report as a text table, sorted on self time."""
+        rows = self.report()
+        header = ("phase", "key", "count", "self [s]", "total [s]", "mean [s]", "max [s]")
+        lines = [(r["phase"], r["key"], str(r["count"]), "{:.4f}".format(r["self"]), "{:.4f}".format(r["total"]),
+                  "{:.4f}".format(r["mean"]), "{:.4f}".format(r["max"])) for r in rows]
+        widths = [max([len(header[i])] + [len(l[i]) for l in lines]) for i in range(len(header))]
+        fmt = "  ".join(["{:<%d}" % w for w in widths[:2]] + ["{:>%d}" % w for w in widths[2:]])
+        table = [fmt.format(*header), "  ".join("-" * w for w in widths)]
+        table += [fmt.format(*l) for l in lines]
+        return "\n".join(table)
+
+
+_build_profiler = BuildProfiler()
+
+
+def get_build_profiler():
+    """Returns the process-wide build profiler."""
+    return _build_profiler
+
+
+def enable_profiling(reset=True):
+    """Starts collecting build timings, by default after clearing the previous ones."""
+    if reset:
+        _build_profiler.reset()
+    _build_profiler.enabled = True
+
+
+def disable_profiling():
+    """Stops collecting build timings. The collected timings are kept."""
+    _build_profiler.enabled = False
+
+
+def profile_phase(phase, key):
+    """Context manager that times its body as phase for key (a cell class, a function or a string)."""
+    if isinstance(key, type):
+        key = key.__name__
+    elif not isinstance(key, str):
+        key = _function_name(key)
+    return _build_profiler.phase(phase, key)
+
+
+def profiled(phase):
+    """Decorator for methods of cells that times each call as phase for the class of the cell."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with profile_phase(phase, type(self)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
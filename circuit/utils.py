@@ -15,6 +15,7 @@
 
 from __future__ import division
 from route_through_control_points import RouteManhattanControlPoints
+from lru_cache import LRUCache
 import warnings
 from ipkiss3 import all as i3
 from ipkiss3.constants import DEG2RAD
@@ -37,9 +38,29 @@ def multiple_entries(input):
     return multiples
 
 
-def get_port_from_interface(port_id, inst_dict):
-    instance_name = port_id.split(":")[0]
-    port_name = port_id.split(":")[1]
+def build_port_index(inst_dict):
+    """Returns a dictionary {(instance_name, port_name): port} with the ports of all the instances.
+    """
+    port_index = dict()
+    for instance_name, inst in inst_dict.items():
+        for p in inst.ports:
+            port_index[(instance_name, p.name)] = p
+    return port_index
+
+
+def get_port_from_interface(port_id, inst_dict, port_index=None):
+    """Returns the port of an instance from an "inst:port" string.
+
+    If a port index (see build_port_index) is given, the port is looked up in it. Unknown instances or ports raise
+    the same errors in both cases.
+    """
+    id_parts = port_id.split(":")
+    instance_name = id_parts[0]
+    port_name = id_parts[1]
+    if port_index is not None:
+        port = port_index.get((instance_name, port_name))
+        if port is not None:
+            return port
     if instance_name not in inst_dict.keys():
         raise Exception("Instance {} does not exist - please check your childcells".format(instance_name))
     pnames = [p.name for p in inst_dict[instance_name].ports]
@@ -72,37 +93,150 @@ def get_template(start_port, end_port):
     return trace_template
 
 
+# Angles are quantized before they are used as a key in the bend tables, so that numerical noise on an
+# angle does not create a new entry.
+BEND_ANGLE_QUANTUM = 1e-9
+# Radius used to calculate the scale-invariant bend size coefficient.
+_COEF_TEST_RADIUS = 100.0
+
+_bend_size_cache = LRUCache(maxsize=4096)
+_bend_coef_cache = LRUCache(maxsize=1024)
+_bend_deficit_cache = LRUCache(maxsize=4096)
+
+
+def _quantize_angle(angle):
+    return int(round(angle / BEND_ANGLE_QUANTUM))
+
+
+def _bend_key(rounding_algorithm, angle):
+    return (rounding_algorithm,
+            getattr(rounding_algorithm, "_adiabatic_angle", None),
+            _quantize_angle(angle))
+
+
+def _bend_test_shape(bend_radius, angle):
+    return i3.Shape([(-100 * bend_radius, 0),
+                     (0, 0),
+                     (100 * bend_radius * math.cos(angle * DEG2RAD), 100 * bend_radius * math.sin(angle * DEG2RAD))])
+
+
+def _calculate_bend_size(rounding_algorithm, bend_radius, angle):
+    s = _bend_test_shape(bend_radius=bend_radius, angle=angle)
+
+    s = rounding_algorithm(original_shape=s,
+                           radius=bend_radius)
+    if len(s) > 1:
+        return distance(s[-2]), distance(s[1])  # L2,L1
+    else:
+        return 0, 0
+
+
 def get_bend_size(rounding_algorithm, bend_radius, angle):
     """Returns the size of a bend with an arbitrary angle. The size is expressed as a tuple of two lengths:
     The length from the bend control point to the interface with the previous and next straight segment.
     If the bend is asymmetric, the reverse bend will switch the values.
+
+    Bend sizes are memoized per rounding algorithm, adiabatic angle, bend radius and (quantized) angle.
     """
     if angle == 0.0:
         return 0, 0
-    s = i3.Shape([(-100 * bend_radius, 0),
-                  (0, 0),
-                  (100 * bend_radius * math.cos(angle * DEG2RAD), 100 * bend_radius * math.sin(angle * DEG2RAD))])
+    key = _bend_key(rounding_algorithm, angle) + (bend_radius,)
+    return _bend_size_cache.get_or_compute(
+        key, lambda: _calculate_bend_size(rounding_algorithm=rounding_algorithm, bend_radius=bend_radius, angle=angle))
 
-    s = rounding_algorithm(original_shape=s,
-                           radius=bend_radius)
-    if len(s) > 1:
-        return distance(s[-2]), distance(s[1])  # L2,L1
-    else:
-        return 0, 0
 
+def get_bend_coef(rounding_algorithm, angle):
+    """Returns the ratio between the smallest bend size and the bend radius. The bend size scales linearly with the
+    bend radius, so this coefficient is calculated only once per rounding algorithm, adiabatic angle and angle.
+    """
+    key = _bend_key(rounding_algorithm, angle)
+    return _bend_coef_cache.get_or_compute(key, lambda: calculate_bend_coef(rounding_algorithm, angle))
+
+
+def calculate_bend_coef(rounding_algorithm, angle):
+    """Calculates the coefficient of get_bend_coef without storing it in the bend tables, for rounding algorithms
+    that should not be used as a key (see get_bezier_ra with registered=False).
+    """
+    if angle == 0.0:
+        return 0.0
+    bs = min(_calculate_bend_size(rounding_algorithm=rounding_algorithm, bend_radius=_COEF_TEST_RADIUS, angle=angle))
+    return bs / _COEF_TEST_RADIUS
+
+
+def get_bend_length_deficit(rounding_algorithm, bend_radius, angle):
+    """Returns how much shorter a rounded bend is than the two straight segments meeting in its control point.
+    The deficit does not depend on the length of the segments, as long as they are longer than the bend size.
+    """
+    if angle == 0.0:
+        return 0.0
+    key = _bend_key(rounding_algorithm, angle) + (bend_radius,)
+
+    def calculate_deficit():
+        s = _bend_test_shape(bend_radius=bend_radius, angle=angle)
+        return s.length() - rounding_algorithm(original_shape=s, radius=bend_radius).length()
+
+    return _bend_deficit_cache.get_or_compute(key, calculate_deficit)
+
+
+def bend_size_cache_info():
+    """Returns the statistics of the bend size, bend coefficient and bend length deficit tables."""
+    return {"bend_size": _bend_size_cache.info(),
+            "bend_coef": _bend_coef_cache.info(),
+            "bend_deficit": _bend_deficit_cache.info()}
+
+
+def clear_bend_size_cache():
+    """Empties the bend size, bend coefficient and bend length deficit tables."""
+    _bend_size_cache.clear()
+    _bend_coef_cache.clear()
+    _bend_deficit_cache.clear()
 
-def get_bezier_ra(adiabatic_angle=10.0):
+
+# Registry with one rounding algorithm class per adiabatic angle.
+_bezier_ra_registry = LRUCache(maxsize=256)
+
+
+def _create_bezier_ra(adiabatic_angle):
     class RA(i3.ShapeRoundAdiabaticSpline):
         def _default_adiabatic_angles(self):
             return adiabatic_angle, adiabatic_angle
 
+    RA._adiabatic_angle = adiabatic_angle
     return RA
 
 
+def get_bezier_ra(adiabatic_angle=10.0, registered=True):
+    """Returns the bezier rounding algorithm class for the adiabatic angle.
+
+    The classes are kept in a bounded registry: equal adiabatic angles return the identical class object,
+    which can therefore be used as a key in other caches. With registered=False a new class is returned that is not
+    added to the registry, for one-off angles such as the ones tried by a root finder.
+    """
+    adiabatic_angle = float(adiabatic_angle)
+    if not registered:
+        return _create_bezier_ra(adiabatic_angle)
+    return _bezier_ra_registry.get_or_compute(adiabatic_angle, lambda: _create_bezier_ra(adiabatic_angle))
+
+
+def get_registered_bezier_ras():
+    """Returns a dictionary {adiabatic_angle: rounding algorithm class} of the registered bezier rounding algorithms.
+    """
+    return dict(_bezier_ra_registry.items())
+
+
+def bezier_ra_registry_info():
+    """Returns the statistics of the bezier rounding algorithm registry."""
+    return _bezier_ra_registry.info()
+
+
+def clear_bezier_ra_registry():
+    """Empties the registry. Rounding algorithms created afterwards are new classes, so the bend tables keyed on
+    the old classes should be cleared as well (clear_bend_size_cache)."""
+    _bezier_ra_registry.clear()
+
+
 def get_max_bend_radius(rounding_algorithm, dist, angle=90.0):
-    Rtest = 100.0
-    bs = min(get_bend_size(rounding_algorithm=rounding_algorithm, bend_radius=Rtest, angle=angle))
-    coef = bs / Rtest
+    coef = get_bend_coef(rounding_algorithm=rounding_algorithm, angle=angle)
     return dist / coef * 0.99
 
 
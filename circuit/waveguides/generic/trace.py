@@ -25,22 +25,78 @@ from ipkiss3.pcell.cell.view import ViewInSameCellProperty
 from ipkiss3.pcell.model import CompactModel
 from ipkiss3.pcell.photonics.term import OpticalTerm
 from ipkiss.technology import get_technology
-from pysics.optics.environment import Environment
 import numpy as np
 from scipy.interpolate import RectBivariateSpline
 from ipcore.properties.descriptor import LockedProperty
+from ...lru_cache import LRUCache
 
 TECH = get_technology()
 
+# Spline fits per n_eff table and sampled n_eff arrays per (table, width, wavelengths). The sampled arrays are
+# read-only, so the models of all waveguides with the same template and width share one buffer.
+_n_eff_fits = LRUCache(maxsize=64)
+_n_eff_tables = LRUCache(maxsize=1024)
+
+
+def n_eff_cache_info():
+    """Returns the statistics of the spline fit and sampled n_eff caches."""
+    return {"fits": _n_eff_fits.info(), "tables": _n_eff_tables.info()}
+
+
+def clear_n_eff_cache():
+    _n_eff_fits.clear()
+    _n_eff_tables.clear()
+
+
+def interpolate_modes(wavelength, wavelengths, n_effs):
+    """Linearly interpolates the effective indices of all modes at once.
+
+    Parameters
+    ----------
+    wavelength : float
+        Wavelength at which the effective indices are evaluated [um]
+    wavelengths : array
+        Increasing wavelengths at which the effective indices are defined [um]
+    n_effs : array
+        Complex effective indices, one row per wavelength and one column per mode
+
+    Returns
+    -------
+    n_effs : complex array
+        Effective index of every mode. Outside the wavelength range the values at the edges are used, like np.interp.
+    """
+    idx = np.searchsorted(wavelengths, wavelength)
+    if idx <= 0:
+        return n_effs[0]
+    if idx >= len(wavelengths):
+        return n_effs[-1]
+    w0, w1 = wavelengths[idx - 1], wavelengths[idx]
+    t = (wavelength - w0) / (w1 - w0)
+    return (1.0 - t) * n_effs[idx - 1] + t * n_effs[idx]
+
+
+_wg_model_classes = dict()
+
 
 def generate_wg_model(n_modes=1):
+    """Returns the compact model class of a waveguide with n_modes modes. The class is created once per n_modes."""
+    if n_modes not in _wg_model_classes:
+        _wg_model_classes[n_modes] = _create_wg_model(n_modes)
+    return _wg_model_classes[n_modes]
+
+
+def _create_wg_model(n_modes):
+    in_terms = ["in:" + str(cnt) for cnt in range(n_modes)]
+    out_terms = ["out:" + str(cnt) for cnt in range(n_modes)]
 
     class WGBroadBandPhaseErrorCompactModel(CompactModel):
         """Broadband higher order waveguide model that interpolates the effective index across wavelengths.
 
+        All modes are interpolated at once from the complex n_eff table.
+
         Parameters
         ----------
-        n_effs : array of effective indeces
+        n_effs : array of effective indeces, one row per wavelength and one column per mode
         wavelengths : array of wavelengths at which n_eff is defined [um]
         length : optical length of the waveguide [um]
         phase_error : phase error accumulated per unit of optical length 1/sqrt [um]
@@ -55,16 +111,13 @@ def generate_wg_model(n_modes=1):
         terms = [OpticalTerm(name='in', n_modes=n_modes), OpticalTerm(name='out', n_modes=n_modes)]
 
         def calculate_smatrix(parameters, env, S):
-            for cnt in range(n_modes):
-                n_effs = parameters.n_effs[:, cnt]
-                phase_error = parameters.phase_error[cnt]
-                neff_total = (np.interp(env.wavelength, parameters.wavelengths, np.real(n_effs)) +
-                              1j * np.interp(env.wavelength, parameters.wavelengths, np.imag(n_effs)))
-                beta = 2 * np.pi / env.wavelength * neff_total
-                in_p = "in:" + str(cnt)
-                out_p = "out:" + str(cnt)
-                S[in_p, out_p] = S[out_p, in_p] = np.exp(1j * (beta * parameters.length +
-                                                               phase_error * np.sqrt(parameters.length)))
+            neff_total = interpolate_modes(env.wavelength, parameters.wavelengths,
+                                           np.asarray(parameters.n_effs, dtype=complex).reshape(-1, n_modes))
+            beta = 2 * np.pi / env.wavelength * neff_total
+            transmission = np.exp(1j * (beta * parameters.length +
+                                        np.asarray(parameters.phase_error) * np.sqrt(parameters.length)))
+            for in_p, out_p, t in zip(in_terms, out_terms, transmission):
+                S[in_p, out_p] = S[out_p, in_p] = t
 
     return WGBroadBandPhaseErrorCompactModel
 
@@ -84,10 +137,7 @@ class GenericWaveguide(TemplatedWindowWaveguide):
             template = self.template
             wavelengths = self.template.wavelengths
             n_modes = len(template.n_eff_values)
-            neffs = np.array([
-                [template.get_complex_n_eff(Environment(wavelength=wl), mode=mode) for mode in range(n_modes)]
-                for wl in wavelengths
-            ])
+            neffs = template.get_n_eff_table(wavelengths=wavelengths)
             phase_error = np.array([template.get_phase_error(mode=mode) for mode in range(n_modes)])
             model_class = generate_wg_model(n_modes=n_modes)
             return model_class(length=self.length,  # calculated from the layout automatically
@@ -200,25 +250,68 @@ class GenericWaveguideTemplate(WindowWaveguideTemplate):
             """
             raise NotImplementedError("Please define parameter widths for your waveguide template.")
 
-        def _get_n_eff_interps(self):
+        def _n_eff_data_key(self):
+            return (np.asarray(self.wavelengths, dtype=float).tobytes(),
+                    np.asarray(self.widths, dtype=float).tobytes(),
+                    tuple(np.asarray(n_eff, dtype=complex).tobytes() for n_eff in self.n_eff_values))
+
+        def _fit_n_eff_interps(self):
+            bbox = [self.wavelengths[0] * 0.9, self.wavelengths[-1] * 1.1, self.widths[0] * 0.9, self.widths[-1] * 1.1]
             r = [RectBivariateSpline(self.wavelengths,
                                      self.widths,
                                      np.real(n_eff),
-                                     bbox=[self.wavelengths[0] * 0.9, self.wavelengths[-1] * 1.1, self.widths[0] * 0.9,
-                                           self.widths[-1] * 1.1]) for n_eff in self.n_eff_values]
+                                     bbox=bbox) for n_eff in self.n_eff_values]
 
             c = [RectBivariateSpline(self.wavelengths,
                                      self.widths,
                                      np.imag(n_eff),
-                                     bbox=[self.wavelengths[0] * 0.9, self.wavelengths[-1] * 1.1, self.widths[0] * 0.9,
-                                           self.widths[-1] * 1.1]) for n_eff in self.n_eff_values]
+                                     bbox=bbox) for n_eff in self.n_eff_values]
 
             return r, c
 
+        def _get_n_eff_interps(self):
+            """Spline fits of the real and imaginary n_eff of every mode, fitted once per n_eff table."""
+            return _n_eff_fits.get_or_compute(self._n_eff_data_key(), self._fit_n_eff_interps)
+
+        def get_n_eff_table(self, width=None, wavelengths=None):
+            """Complex effective indices sampled at a width, one row per wavelength and one column per mode.
+
+            The table is cached per template, width and wavelengths, and returned as a read-only array that is shared
+            by all callers.
+
+            Parameters
+            ----------
+            width : float, optional
+                Core width [um], the core width of the layout by default
+            wavelengths : array, optional
+                Wavelengths [um], the wavelengths of the template by default
+
+            Returns
+            -------
+            n_effs : complex array of shape (len(wavelengths), number of modes)
+            """
+            if width is None:
+                width = self.cell.get_default_view(LayoutView).core_width
+            wavelengths = np.asarray(self.wavelengths if wavelengths is None else wavelengths, dtype=float)
+            key = (self._n_eff_data_key(), float(width), wavelengths.tobytes())
+
+            def _sample():
+                rs, cs = self._get_n_eff_interps()
+                # Evaluating the splines on the (wavelengths x [width]) grid samples all wavelengths in one call.
+                order = np.argsort(wavelengths)
+                table = np.empty((len(wavelengths), len(rs)), dtype=complex)
+                sorted_wavelengths = wavelengths[order]
+                for mode, (r, c) in enumerate(zip(rs, cs)):
+                    table[order, mode] = (r(sorted_wavelengths, [width])[:, 0] +
+                                          1j * c(sorted_wavelengths, [width])[:, 0])
+                table.setflags(write=False)
+                return table
+
+            return _n_eff_tables.get_or_compute(key, _sample)
+
         def _get_n_eff_for_wavelength_and_width(self, wavelength, width, mode=0):
             rs, cs = self._get_n_eff_interps()
-            n_effs = [float(r(wavelength, width)) + 1j * float(c(wavelength, width)) for r, c in zip(rs, cs)]
-            return n_effs[mode]
+            return float(rs[mode](wavelength, width)[0, 0]) + 1j * float(cs[mode](wavelength, width)[0, 0])
 
         def _get_dndw(self, eps=1e-6, mode=0):
             """The change in index as function of width for the center wavelength."""
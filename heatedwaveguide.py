@@ -14,7 +14,7 @@
 # It is located in the root of the distribution folder.
 import CSiP180Al.all as pdk
 import ipkiss3.all as i3
-from phaseshifter import HeaterBroadBandPhaseErrorCompactModel
+from phaseshifter import HeaterBroadBandPhaseErrorCompactModel, heater_smatrix_sweep, heater_signal_kernel
 import numpy as np
 
 r_sheet = 500e-3  # OhmSq
@@ -98,12 +98,14 @@ class HeatedWaveguide(i3.Waveguide):
     class CircuitModel(i3.CircuitModelView):
         p_pi_sq = i3.PositiveNumberProperty(default=100e-3, doc="Power needed for a pi phase shift on a square [W]")
 
-        def _generate_model(self):
+        @i3.cache()
+        def get_model_parameters(self):
+            """Returns the parameters of the compact model as a dictionary."""
             template = self.trace_template
             wavelengths = template.wavelengths
             neffs = np.array([template.get_n_eff(i3.Environment(wavelength=wl)) for wl in wavelengths])
             length = self.cell.get_default_view(i3.LayoutView).trace_length()
-            return HeaterBroadBandPhaseErrorCompactModel(
+            return dict(
                 length=length,
                 width=2 * self.heater_width,  # parallel -> half resistance
                 n_effs=neffs,
@@ -112,6 +114,44 @@ class HeatedWaveguide(i3.Waveguide):
                 p_pi_sq=self.p_pi_sq,
             )
 
+        def _generate_model(self):
+            return HeaterBroadBandPhaseErrorCompactModel(**self.get_model_parameters())
+
+        def get_smatrix_sweep(self, wavelengths, v_diff=0.0):
+            """S-matrix of the heater for an array of wavelengths, with the optical terms in the order ('in', 'out').
+
+            With v_diff=0 this evaluates the same S-matrix as calculate_smatrix of the compact model, in one
+            vectorized call instead of one call per wavelength. calculate_smatrix has no voltage term: a nonzero
+            v_diff adds the heater phase of calculate_signals for a constant drive.
+
+            Parameters
+            ----------
+            wavelengths :
+                Wavelengths [um].
+            v_diff : float
+                Voltage difference between elec2 and elec1 [V].
+
+            Returns
+            -------
+            S : complex array of shape (len(wavelengths), 2, 2)
+            """
+            return heater_smatrix_sweep(wavelengths, v_diff=v_diff, **self.get_model_parameters())
+
+        def get_signal_kernel(self, wavelength):
+            """Time-domain kernel of the heater at one wavelength, for evaluating long drive waveforms.
+
+            Parameters
+            ----------
+            wavelength : float
+                Wavelength [um].
+
+            Returns
+            -------
+            kernel : PhaseModulationKernel
+                kernel.transmission(v_diff) gives the transmission for a voltage difference or a waveform of them.
+            """
+            return heater_signal_kernel(wavelength, **self.get_model_parameters())
+
     class Netlist(i3.NetlistFromLayout):
         pass
 
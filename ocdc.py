@@ -1,6 +1,6 @@
 from CSiP180Al import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan, bezier_sbend
+from circuit.all import CircuitCell, manhattan, bezier_sbend, shared_cell, get_layout_geometry
 from splittertree import SplitterTree
 from mzi_string import MZIString
 from heatedwaveguide import HeatedWaveguide
@@ -35,33 +35,36 @@ class OCDC(CircuitCell):
         return self.mzi_nums
 
     def _default_splitter(self):
-        splitter = pdk.M1X2_TE_1550()
-        return SplitterTree(splitter=splitter,
-                            levels=self.levels,
-                            spacing_x=self.spacing_x,
-                            spacing_y=self.spacing_y,
-                            bend_radius=self.bend_radius)
+        splitter = shared_cell(pdk.M1X2_TE_1550)
+        return shared_cell(SplitterTree,
+                           splitter=splitter,
+                           levels=self.levels,
+                           spacing_x=self.spacing_x,
+                           spacing_y=self.spacing_y,
+                           bend_radius=self.bend_radius)
     def _default_combiner(self):
         if self.plus_in:
-            splitter = pdk.M1X2_TE_1550()
-            return SplitterTree(splitter=splitter,
-                                levels=self.levels,
-                                spacing_x=self.spacing_x,
-                                spacing_y=self.spacing_y,
-                                bend_radius=self.bend_radius,
-                                plus_in=self.plus_in)
+            splitter = shared_cell(pdk.M1X2_TE_1550)
+            return shared_cell(SplitterTree,
+                               splitter=splitter,
+                               levels=self.levels,
+                               spacing_x=self.spacing_x,
+                               spacing_y=self.spacing_y,
+                               bend_radius=self.bend_radius,
+                               plus_in=self.plus_in)
         else:
             return self.splitter
 
     def _default_mzi_string(self):
-        return MZIString(mzi_nums=self.mzi_nums, spacing=self.mzi_spacing)
+        return shared_cell(MZIString, mzi_nums=self.mzi_nums, spacing=self.mzi_spacing)
 
     def _default_heated_wg(self):
-        return HeatedWaveguide(heater_width=5,
-                             heater_offset=3.0,
-                             heater_length=200,
-                             m1_width=10.0,
-                             m1_length=50.0)
+        return shared_cell(HeatedWaveguide,
+                           heater_width=5,
+                           heater_offset=3.0,
+                           heater_length=200,
+                           m1_width=10.0,
+                           m1_length=50.0)
 
     def _default_child_cells(self):
         child_cells = dict()
@@ -78,7 +81,7 @@ class OCDC(CircuitCell):
 
     def _default_connectors(self):
         conn = []
-        ht_len = self.heated_wg.get_default_view(i3.LayoutView).size_info().east
+        ht_len = get_layout_geometry(self.heated_wg).east
         mzi_string_nums = 2 ** self.levels - 1
         max_port_idx = 2 ** self.levels
         mzi_string_len = self.mzi_nums * self.mzi_spacing
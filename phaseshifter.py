@@ -17,6 +17,195 @@ from ipkiss3.pcell.model import CompactModel
 from ipkiss3.pcell.photonics.term import OpticalTerm
 from ipkiss3.pcell.wiring import ElectricalTerm
 from numpy import pi, exp, interp, real, imag, sqrt, abs
+import numpy as np
+from scipy.signal import lfilter
+from circuit.lru_cache import LRUCache
+
+
+class ComplexNeffInterpolant(object):
+    """Linear interpolant of a complex effective index, evaluated on arrays of wavelengths.
+
+    Parameters
+    ----------
+    wavelengths :
+        Array of wavelengths at which n_eff is defined [um].
+    n_effs :
+        Array of effective indices.
+    """
+
+    def __init__(self, wavelengths, n_effs):
+        wavelengths = np.asarray(wavelengths, dtype=float).ravel()
+        n_effs = np.asarray(n_effs, dtype=complex).ravel()
+        order = np.argsort(wavelengths)
+        self.wavelengths = wavelengths[order]
+        self.n_effs_real = np.ascontiguousarray(n_effs.real[order])
+        self.n_effs_imag = np.ascontiguousarray(n_effs.imag[order])
+
+    def __call__(self, wavelength):
+        wavelength = np.asarray(wavelength, dtype=float)
+        return (np.interp(wavelength, self.wavelengths, self.n_effs_real) +
+                1j * np.interp(wavelength, self.wavelengths, self.n_effs_imag))
+
+    def beta(self, wavelength):
+        """Complex propagation constant at the given wavelengths [1/um]."""
+        wavelength = np.asarray(wavelength, dtype=float)
+        return 2 * pi / wavelength * self(wavelength)
+
+
+_neff_interpolants = LRUCache(maxsize=256)
+
+
+def get_neff_interpolant(wavelengths, n_effs):
+    """Returns the complex n_eff interpolant of a parameter set, shared between the models with the same tables."""
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    n_effs = np.asarray(n_effs, dtype=complex)
+    key = (wavelengths.tobytes(), n_effs.tobytes())
+    return _neff_interpolants.get_or_compute(key, lambda: ComplexNeffInterpolant(wavelengths, n_effs))
+
+
+def neff_interpolant_info():
+    """Returns the statistics of the n_eff interpolant cache."""
+    return _neff_interpolants.info()
+
+
+def heater_transmission(wavelength, n_effs, wavelengths, length, width, phase_error, p_pi_sq, v_diff=0.0):
+    """Transmission of HeaterBroadBandPhaseErrorCompactModel for an array of wavelengths in one vectorized call.
+
+    Parameters
+    ----------
+    wavelength :
+        Wavelengths at which the transmission is evaluated [um].
+    n_effs, wavelengths, length, width, phase_error, p_pi_sq :
+        Parameters of HeaterBroadBandPhaseErrorCompactModel.
+    v_diff : float or array
+        Voltage difference between the electrical terms [V], broadcast against wavelength.
+
+    Returns
+    -------
+    transmission : complex array
+        Transmission from in to out, which equals the transmission from out to in.
+    """
+    beta = get_neff_interpolant(wavelengths, n_effs).beta(wavelength)
+    phase_mod = pi * (np.asarray(v_diff) ** 2) / (p_pi_sq * length / width)
+    return exp(1j * (beta * length + phase_error * sqrt(length) + phase_mod))
+
+
+def heater_smatrix_sweep(wavelength, n_effs, wavelengths, length, width, phase_error, p_pi_sq, v_diff=0.0):
+    """S-matrix of HeaterBroadBandPhaseErrorCompactModel for an array of wavelengths.
+
+    Takes the same parameters as heater_transmission and returns a complex array of shape (len(wavelength), 2, 2)
+    with the optical terms in the order ('in', 'out'). With v_diff=0 it equals calculate_smatrix of the model, which
+    has no voltage term; a nonzero v_diff adds the heater phase of calculate_signals for a constant drive.
+    """
+    transmission = np.atleast_1d(heater_transmission(wavelength, n_effs, wavelengths, length, width, phase_error,
+                                                     p_pi_sq, v_diff=v_diff))
+    S = np.zeros(transmission.shape + (2, 2), dtype=complex)
+    S[..., 0, 1] = S[..., 1, 0] = transmission
+    return S
+
+
+class PhaseModulationKernel(object):
+    """Time-domain transmission of a phase shifter at one wavelength, with the static phase precomputed.
+
+    The transmission is exp(1j * (static_phase + coefficient * vd ** power)), with vd the state of the model. The
+    static phasor is calculated once, so only the voltage-dependent modulation is evaluated per time step, vectorized
+    over a whole waveform. Without tau the state follows the drive voltage instantaneously, with tau it follows the
+    drive with a first-order lag.
+
+    Parameters
+    ----------
+    static_phase : complex
+        Phase without drive, beta * length + phase_error * sqrt(length).
+    coefficient : float
+        Phase per unit of vd ** power.
+    power : int
+        2 for heaters (phase ~ v ** 2), 1 for the linear phase shifter.
+    tau : float, optional
+        Time constant of the first-order lag of the state on the drive voltage [s].
+    """
+
+    def __init__(self, static_phase, coefficient, power=2, tau=None):
+        self.static_phase = static_phase
+        self.static_transmission = exp(1j * static_phase)
+        self.coefficient = coefficient
+        self.power = power
+        self.tau = tau
+
+    def state(self, v, dt, initial_state=0.0):
+        """State for a drive waveform v sampled every dt [s], starting from initial_state at the first sample.
+
+        With tau, vd[n] = vd[n - 1] + (v[n] - vd[n - 1]) * (1 - exp(-dt / tau)), which is the exact solution of the
+        model's dVd/dt = (v - Vd) / tau when v is held at v[n] between two samples.
+        """
+        v = np.asarray(v, dtype=float)
+        if self.tau is None:
+            return v
+        a = 1.0 - exp(-dt / max(self.tau, 1e-15))
+        vd = np.empty_like(v)
+        if len(v):
+            vd[0] = initial_state
+            vd[1:] = lfilter([a], [1.0, a - 1.0], v[1:], zi=[(1.0 - a) * initial_state])[0]
+        return vd
+
+    def modulation(self, v):
+        """Modulation phasor exp(1j * coefficient * v ** power) for a voltage or an array of voltages."""
+        return exp(1j * self.coefficient * np.asarray(v, dtype=float) ** self.power)
+
+    def transmission(self, v):
+        """Transmission for a state or a waveform of states."""
+        return self.static_transmission * self.modulation(v)
+
+    def drive_transmission(self, v, dt, initial_state=0.0):
+        """Transmission for a drive waveform v sampled every dt [s], see state."""
+        return self.transmission(self.state(v, dt, initial_state=initial_state))
+
+
+_static_phases = LRUCache(maxsize=4096)
+
+
+def get_static_phase(wavelength, n_effs, wavelengths, length, phase_error):
+    """Returns the phase without drive, beta * length + phase_error * sqrt(length), cached per wavelength."""
+    key = (float(wavelength), np.asarray(wavelengths, dtype=float).tobytes(),
+           np.asarray(n_effs, dtype=complex).tobytes(), float(length), float(phase_error))
+
+    def _compute():
+        beta = get_neff_interpolant(wavelengths, n_effs).beta(wavelength)
+        return complex(beta * length + phase_error * sqrt(length))
+
+    return _static_phases.get_or_compute(key, _compute)
+
+
+def static_phase_info():
+    """Returns the statistics of the static phase cache."""
+    return _static_phases.info()
+
+
+def clear_phase_caches():
+    """Empties the n_eff interpolant and static phase caches."""
+    _neff_interpolants.clear()
+    _static_phases.clear()
+
+
+def heater_signal_kernel(wavelength, n_effs, wavelengths, length, width, phase_error, p_pi_sq):
+    """Time-domain kernel of HeaterBroadBandPhaseErrorCompactModel at one wavelength. Takes the parameters of the
+    model."""
+    ratio = length / width
+    return PhaseModulationKernel(static_phase=get_static_phase(wavelength, n_effs, wavelengths, length, phase_error),
+                                 coefficient=pi / (p_pi_sq * ratio),
+                                 power=2)
+
+
+def phase_shifter_signal_kernel(wavelength, n_effs, wavelengths, length, phase_error, vpi_lpi, tau):
+    """Time-domain kernel of PhaseShifterBroadBandPhaseErrorTauCompactModel at one wavelength.
+
+    kernel.drive_transmission(v, dt) integrates the lag of the state Vd on the drive voltage cathode - anode, and
+    kernel.transmission(vd) maps the state Vd to the transmission.
+    """
+    length_cm = length * 1e-4
+    return PhaseModulationKernel(static_phase=get_static_phase(wavelength, n_effs, wavelengths, length, phase_error),
+                                 coefficient=pi * length_cm / vpi_lpi,
+                                 power=1,
+                                 tau=tau)
 
 
 class HeaterBroadBandPhaseErrorCompactModel(CompactModel):
@@ -39,6 +228,10 @@ class HeaterBroadBandPhaseErrorCompactModel(CompactModel):
         Phase error accumulated per unit of optical length 1/sqrt [um].
     p_pi_sq : float
         Power required to obtain a pi phaseshift on a square with unit sheet resistance (1 Ohm/sq) [W.Ohm].
+
+    The model is evaluated one wavelength at a time by the circuit simulator. Use heater_smatrix_sweep to
+    evaluate it for a whole wavelength array at once, and heater_signal_kernel to evaluate it for a whole drive
+    waveform.
     """
 
     parameters = [
@@ -109,6 +302,8 @@ class PhaseShifterBroadBandPhaseErrorTauCompactModel(HeaterBroadBandPhaseErrorCo
         VpiLpi of the phase modulation in [V.cm].
     tau: float
         Time constant of the exponential response of the modulator effect [s].
+
+    Use phase_shifter_signal_kernel to evaluate the transmission for a whole drive waveform.
     """
 
     parameters = [
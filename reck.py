@@ -1,6 +1,6 @@
 from CSiP180Al import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, bezier_sbend
+from circuit.all import CircuitCell, bezier_sbend, shared_cell, get_layout_geometry
 from PhMZI import PhMZI
 
 
@@ -21,8 +21,8 @@ class Reck(CircuitCell):
                 child_cells["block_{}_{}".format(i, j)] = self.block
 
         for i in range(levels + 1):
-            child_cells["gr_in_{}".format(i)] = pdk.GC_TE_1550()
-            child_cells["gr_out_{}".format(i)] = pdk.GC_TE_1550()
+            child_cells["gr_in_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
+            child_cells["gr_out_{}".format(i)] = shared_cell(pdk.GC_TE_1550)
 
         return child_cells
 
@@ -54,7 +54,7 @@ class Reck(CircuitCell):
     def _default_place_specs(self):
         place_specs = []
         levels = self.levels
-        offset = - self.block.get_default_view(i3.LayoutView).size_info().east / 2
+        offset = - get_layout_geometry(self.block).east / 2
         spacing = 20 * self.spacing
         spacing_y = 127
 
@@ -1,6 +1,6 @@
 from CSiP180Al import all as pdk
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan
+from circuit.all import CircuitCell, manhattan, shared_cell, get_layout_geometry
 from circuit.utils import get_port_from_interface
 import re
 from cel_ocdc_cel import CelOCDCCel
@@ -29,22 +29,22 @@ class RoutedCelOCDCCel(CircuitCell):
         child_cells["dut"] = self.dut
         npads = 96
         for i in range(npads):
-            child_cells["bp_ht{}_elec1".format(i)] = BondPad()
-            child_cells["bp_ht{}_elec2".format(i)] = BondPad()
+            child_cells["bp_ht{}_elec1".format(i)] = shared_cell(BondPad)
+            child_cells["bp_ht{}_elec2".format(i)] = shared_cell(BondPad)
 
         return child_cells
 
     def _default_place_specs(self):
-        west = self.dut.get_default_view(i3.LayoutView).size_info().west
-        dut_length = self.dut.get_default_view(i3.LayoutView).size_info().east - west
+        west = get_layout_geometry(self.dut).west
+        dut_length = get_layout_geometry(self.dut).east - west
         print("length: ", dut_length)
-        south = self.dut.get_default_view(i3.LayoutView).size_info().south
-        dut_height = (self.dut.get_default_view(i3.LayoutView).size_info().north - south)
+        south = get_layout_geometry(self.dut).south
+        dut_height = (get_layout_geometry(self.dut).north - south)
         print("height: ", dut_height)
         place_specs = [i3.Place("dut", (-west, -dut_height / 2 - south))]
         bp_xlen = 60
         bp_ylen = 80
-        displacement = self.dut.get_default_view(i3.LayoutView).size_info().west + 300
+        displacement = get_layout_geometry(self.dut).west + 300
         cnt = 0
         # up pads
         while cnt < 36:
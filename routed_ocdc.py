@@ -1,5 +1,5 @@
 from ipkiss3 import all as i3
-from circuit.all import CircuitCell, manhattan
+from circuit.all import CircuitCell, manhattan, shared_cell, get_layout_geometry
 from circuit.utils import get_port_from_interface
 from CSiP180Al import all as pdk
 from ocdc import OCDC
@@ -101,11 +101,11 @@ class RoutedOCDC(CircuitCell):
         # The child cells are the DUT, the grating couplers and the contact pads
         child_cells = dict()
         child_cells["dut"] = self.dut
-        child_cells["gr_in"] = pdk.GC_TE_1550()
-        child_cells["gr_out"] = pdk.GC_TE_1550()
+        child_cells["gr_in"] = shared_cell(pdk.GC_TE_1550)
+        child_cells["gr_out"] = shared_cell(pdk.GC_TE_1550)
         for el_link in self.electrical_links:
             out_cell = el_link[1].split(":")[0]
-            child_cells[out_cell] = BondPad()
+            child_cells[out_cell] = shared_cell(BondPad)
         return child_cells
 
     def _default_place_specs(self):
@@ -115,15 +115,15 @@ class RoutedOCDC(CircuitCell):
         bp_cnt_u = 0
         bp_cnt_d = 0
         bp_spacing = self.bond_pads_spacing
-        height = - self.dut.get_default_view(i3.LayoutView).size_info().north / 2
-        width = self.dut.get_default_view(i3.LayoutView).size_info().east
+        height = - get_layout_geometry(self.dut).north / 2
+        width = get_layout_geometry(self.dut).east
 
         # Place the dut (splitter tree) at the origin
         specs.append(i3.Place("dut", (0, 0)))
 
         # Place the optical connectors
         specs.append(i3.Place("gr_in", (-100, 0)))
-        specs.append(i3.Place("gr_out", (self.dut.get_default_view(i3.LayoutView).size_info().east + 100, 0)))
+        specs.append(i3.Place("gr_out", (get_layout_geometry(self.dut).east + 100, 0)))
         specs.append(i3.FlipH("gr_out"))
 
         # Place the Bondpads
@@ -221,10 +221,11 @@ class RoutedOCDC(CircuitCell):
     class Layout(CircuitCell.Layout):
         def _generate_elements(self, elems):
             insts = self.instances
+            port_index = self.cell.get_port_index()
             up_link = [el for el in self.electrical_links if
-                       get_port_from_interface(port_id=el[1], inst_dict=insts).y > 0]
+                       get_port_from_interface(port_id=el[1], inst_dict=insts, port_index=port_index).y > 0]
             down_link = [el for el in self.electrical_links if
-                         get_port_from_interface(port_id=el[1], inst_dict=insts).y < 0]
+                         get_port_from_interface(port_id=el[1], inst_dict=insts, port_index=port_index).y < 0]
             cnt = 0
             cnt_x = 0
             n_links = len(up_link)
@@ -236,8 +237,8 @@ class RoutedOCDC(CircuitCell):
             ht_num = 0
             dy = -500
             for el_link in up_link:
-                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts)  # Start port
-                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts)  # End port
+                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts, port_index=port_index)  # Start port
+                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts, port_index=port_index)  # End port
                 bp_name = el_link[1].split(":")[0]
                 if re.search("ht", bp_name):
                     mzi_num = -1
@@ -296,8 +297,8 @@ class RoutedOCDC(CircuitCell):
             dy = -dy
             # Loop over each electrical link to provide the route for them
             for el_link in down_link:
-                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts)  # Start port
-                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts)  # End port
+                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts, port_index=port_index)  # Start port
+                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts, port_index=port_index)  # End port
                 bp_name = el_link[1].split(":")[0]
                 if re.search("ht", bp_name):
                     mzi_num = -1
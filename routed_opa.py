@@ -2,6 +2,8 @@ from si_fab import all as pdk
 from pteam_library_si_fab import all as pt_lib
 from circuit.circuitcell import CircuitCell, get_port_from_interface
 from circuit.connector_functions import manhattan
+from circuit.cell_registry import shared_cell
+from circuit.geometry import get_layout_geometry
 from ipkiss3 import all as i3
 import re
 from OPA import OPA
@@ -56,10 +58,10 @@ class RoutedOPA(CircuitCell):
         child_cells = {"dut": self.dut}
         for connector in self.connectors:
             out_cell = connector[1].split(":")[0]
-            child_cells[out_cell] = pdk.FC_TE_1550()
+            child_cells[out_cell] = shared_cell(pdk.FC_TE_1550)
         for el_link in self.electrical_links:
             out_cell = el_link[1].split(":")[0]
-            child_cells[out_cell] = pdk.BONDPAD_5050()
+            child_cells[out_cell] = shared_cell(pdk.BONDPAD_5050)
 
         return child_cells
 
@@ -69,7 +71,7 @@ class RoutedOPA(CircuitCell):
         # Define the positions of the ports.
         bp_cnt = 0
         bp_spacing = self.bond_pads_spacing
-        height = self.dut.get_default_view(i3.LayoutView).size_info().north
+        height = get_layout_geometry(self.dut).north
 
         # Place the dut (splitter tree) at the origin
         specs.append(i3.Place("dut", (0, 0)))
@@ -105,11 +107,12 @@ class RoutedOPA(CircuitCell):
             cnt = 0
             cnt_x = 0
             insts = self.instances
+            port_index = self.cell.get_port_index()
 
             # Loop over each electrical link to provide the route for them
             for el_link in self.electrical_links:
-                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts)  # Start port
-                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts)  # End port
+                sp = get_port_from_interface(port_id=el_link[0], inst_dict=insts, port_index=port_index)  # Start port
+                ep = get_port_from_interface(port_id=el_link[1], inst_dict=insts, port_index=port_index)  # End port
                 d = self.wire_spacing
                 cnt_x = cnt_x + 1
                 if sp.x > ep.x:
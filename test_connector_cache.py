@@ -0,0 +1,68 @@
+import os
+import struct
+import tempfile
+from circuit.connector_cache import ConnectorCache, _HEADER, _MAGIC
+
+points = [(0.0, 0.0), (10.0, 0.5), (20.0, -3.25)]
+shape_warnings = [("UserWarning", "The Bend between (0, 0) and (20, -3.25) has a curvature 4.0")]
+
+
+def test_round_trip():
+    cache = ConnectorCache(tempfile.mkdtemp())
+    cache.store("ab" * 20, points, shape_warnings)
+    cache.store("cd" * 20, points)
+    assert cache.load_entry("ab" * 20) == (points, shape_warnings)
+    assert cache.load_entry("cd" * 20) == (points, [])
+    assert cache.load("ab" * 20) == points
+    assert cache.load("ef" * 20) is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_invalid_header():
+    cache = ConnectorCache(tempfile.mkdtemp())
+    key = "ab" * 20
+    cache.store(key, points, shape_warnings)
+    path = cache._path(key)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    # An entry written by an older version of the cache has a different header.
+    old_header = struct.Struct("<4sI").pack(b"OCC1", len(points))
+    invalid = [old_header + data[_HEADER.size:_HEADER.size + 16 * len(points)],
+               b"XXXX" + data[4:],
+               data[:-1],
+               data[:_HEADER.size - 1],
+               _HEADER.pack(_MAGIC, len(points), 3) + data[_HEADER.size:_HEADER.size + 16 * len(points)] + b"{[("]
+    for d in invalid:
+        with open(path, "wb") as f:
+            f.write(d)
+        assert cache.load_entry(key) is None
+        # Invalid entries are removed
+        assert not os.path.exists(path)
+
+
+def test_eviction_to_low_water():
+    cache = ConnectorCache(tempfile.mkdtemp(), max_bytes=1000, low_water=0.5)
+    entry_size = _HEADER.size + 16 * len(points)
+    n_entries = 1000 // entry_size
+    keys = ["{:040x}".format(i) for i in range(n_entries + 1)]
+    for i, key in enumerate(keys[:-1]):
+        cache.store(key, points)
+        # Make the order of use explicit, the resolution of the modification time can be coarse.
+        os.utime(cache._path(key), (i, i))
+    assert cache.total_bytes() == n_entries * entry_size
+
+    cache.store(keys[-1], points)
+    assert cache.total_bytes() <= 500
+    assert cache.total_bytes() > 500 - entry_size
+    remaining = [e[0] for e in cache.entries()]
+    n_remaining = len(remaining)
+    # The least recently used entries are removed first.
+    assert sorted(remaining) == sorted(cache._path(k) for k in keys[-n_remaining:])
+    assert cache.total_bytes() == sum(e[1] for e in cache.entries())
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_invalid_header()
+    test_eviction_to_low_water()
@@ -0,0 +1,104 @@
+from si_fab import technology
+from ipkiss3 import all as i3
+from circuit.crossing.crossing_utils import get_crossing_points, cut_shape_on_portpairs, collinear, collinearity, collinearity_pairwise, \
+    COLLINEAR_TOLERANCE
+import numpy as np
+
+
+def reference_collinear(p0, p1, p2, tolerance=COLLINEAR_TOLERANCE):
+    """Scalar collinearity test, where a zero-length segment only contains its own point."""
+    x1, y1 = p1[0] - p0[0], p1[1] - p0[1]
+    x2, y2 = p2[0] - p0[0], p2[1] - p0[1]
+    if x1 == 0 and y1 == 0:
+        return np.hypot(x2, y2) < tolerance
+    if abs(x1) >= abs(y1):
+        t = x2 / x1
+    else:
+        t = y2 / y1
+    return abs(x1 * y2 - x2 * y1) < tolerance and 0 <= t <= 1
+
+
+def collinearity_cases():
+    rng = np.random.RandomState(0)
+    starts = rng.randint(-3, 4, size=(40, 2)).astype(float)
+    ends = starts + rng.randint(-2, 3, size=(40, 2))
+    # Axis-aligned and zero-length segments
+    starts = np.vstack([starts, [[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [2.0, 2.0]]])
+    ends = np.vstack([ends, [[4.0, 0.0], [0.0, 4.0], [0.0, 0.0], [2.0, 2.0]]])
+    tol = COLLINEAR_TOLERANCE
+    points = np.vstack([rng.randint(-4, 5, size=(40, 2)).astype(float),
+                        rng.uniform(-4.0, 4.0, size=(10, 2)),
+                        # On the axis-aligned segments, on and next to the ends and at the tolerance
+                        [[0.0, 0.0], [4.0, 0.0], [2.0, 0.0], [4.0 + tol, 0.0], [-tol, 0.0], [2.0, tol / 4.0],
+                         [2.0, tol / 2.0], [tol / 4.0, 2.0], [tol / 2.0, 2.0], [2.0, 2.0], [2.0 + tol, 2.0],
+                         [2.0 + tol / 2.0, 2.0]]])
+    return starts, ends, points
+
+
+def test_collinearity_matches_collinear():
+    starts, ends, points = collinearity_cases()
+    flags, t = collinearity(starts, ends, points)
+    assert flags.shape == t.shape == (len(starts), len(points))
+    assert np.all(np.isfinite(t))
+    n_collinear = 0
+    for i in range(len(starts)):
+        for j in range(len(points)):
+            expected = reference_collinear(starts[i], ends[i], points[j])
+            assert bool(flags[i, j]) == collinear(starts[i], ends[i], points[j]) == expected
+            n_collinear += expected
+    assert 0 < n_collinear < flags.size
+
+    pairwise_flags, pairwise_t = collinearity_pairwise(np.repeat(starts, len(points), axis=0),
+                                                       np.repeat(ends, len(points), axis=0),
+                                                       np.tile(points, (len(starts), 1)))
+    assert np.array_equal(pairwise_flags, flags.ravel())
+    assert np.array_equal(pairwise_t, t.ravel())
+
+
+def test_collinearity_tolerance():
+    segment = [(0.0, 0.0), (1.0, 0.0)]
+    point = [(0.5, 1e-5)]
+    assert not collinearity_pairwise(segment[0], segment[1], point)[0][0]
+    assert collinearity_pairwise(segment[0], segment[1], point, tolerance=1e-4)[0][0]
+    assert not collinear(segment[0], segment[1], point[0])
+    assert collinear(segment[0], segment[1], point[0], tolerance=1e-4)
+    assert collinearity([(1.0, 1.0)], [(1.0, 1.0)], [(1.0, 1.0 + 1e-5)], tolerance=1e-4)[0][0, 0]
+
+
+def test_get_crossing_points():
+    shapes = [i3.Shape([(0.0, 0.0), (10.0, 10.0)]),
+              i3.Shape([(0.0, 10.0), (10.0, 0.0)]),
+              i3.Shape([(5.0, -5.0), (5.0, 5.0), (8.0, 20.0)]),
+              i3.Shape([(0.0, 20.0), (10.0, 20.0)]),
+              i3.Shape([(0.0, 21.0), (10.0, 21.0)])]
+    points = get_crossing_points(shapes)
+    assert all(isinstance(p, i3.Coord2) for p in points)
+    # The crossing of the diagonals lies on the corner of the third shape: it is reported once per pair of shapes.
+    assert sorted((round(p.x, 9), round(p.y, 9)) for p in points) == [(5.0, 5.0), (5.0, 5.0), (5.0, 5.0),
+                                                                        (8.0, 20.0)]
+    assert get_crossing_points([shapes[3], shapes[4]]) == []
+
+
+
+def test_cut_shape_on_portpairs_tolerance():
+    shape = i3.Shape([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0)])
+    # Crossing ports that are 1e-5 off the first segment
+    pairs = [(i3.OpticalPort(name="in", position=(6.0, 1e-5), angle=0.0),
+              i3.OpticalPort(name="out", position=(4.0, 1e-5), angle=180.0))]
+
+    cut_shapes, err_points = cut_shape_on_portpairs(shape, pairs)
+    assert len(cut_shapes) == 1 and err_points == []
+
+    cut_shapes, err_points = cut_shape_on_portpairs(shape, pairs, tolerance=1e-3)
+    assert err_points == []
+    assert len(cut_shapes) == 2
+    assert [(p[0], p[1]) for p in cut_shapes[0]] == [(0.0, 0.0), (4.0, 1e-5)]
+    assert (cut_shapes[1][0][0], cut_shapes[1][0][1]) == (6.0, 1e-5)
+    assert (cut_shapes[1][-1][0], cut_shapes[1][-1][1]) == (10.0, 10.0)
+
+
+if __name__ == "__main__":
+    test_get_crossing_points()
+    test_collinearity_matches_collinear()
+    test_collinearity_tolerance()
+    test_cut_shape_on_portpairs_tolerance()
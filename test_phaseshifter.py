@@ -0,0 +1,53 @@
+from phaseshifter import PhaseShifterBroadBandPhaseErrorTauCompactModel, phase_shifter_signal_kernel
+from scipy.integrate import solve_ivp
+import numpy as np
+
+
+class Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+parameters = {"n_effs": np.array([2.40 + 1e-5j, 2.35 + 1e-5j, 2.30 + 1e-5j]),
+              "wavelengths": np.array([1.50, 1.55, 1.60]),
+              "length": 500.0,
+              "phase_error": 0.01,
+              "vpi_lpi": 2.0,
+              "tau": 1e-9}
+
+
+def model_step_response(v_step, times):
+    """Transmission of the compact model for a step of the drive from 0 to v_step at t = 0, with the state Vd
+    integrated from calculate_dydt."""
+    model = PhaseShifterBroadBandPhaseErrorTauCompactModel
+    params = Namespace(**parameters)
+    env = Namespace(wavelength=1.55)
+    input_signals = {"anode": 0.0, "cathode": v_step, "in": 1.0, "out": 0.0}
+
+    def dydt(t, y):
+        derivative = {}
+        model.calculate_dydt(params, env, derivative, {"Vd": y[0]}, t, input_signals)
+        return [derivative["Vd"]]
+
+    vd = solve_ivp(dydt, (times[0], times[-1]), [0.0], t_eval=times, rtol=1e-10, atol=1e-12).y[0]
+    transmission = []
+    for t, state in zip(times, vd):
+        output_signals = {}
+        model.calculate_signals(params, env, output_signals, {"Vd": state}, t, input_signals)
+        transmission.append(output_signals["out"])
+    return np.array(transmission)
+
+
+def test_phase_shifter_kernel_step_drive():
+    dt = 1e-10
+    times = np.arange(60) * dt
+    v = np.full(len(times), 1.5)
+    kernel = phase_shifter_signal_kernel(1.55, **parameters)
+    expected = model_step_response(1.5, times)
+    assert np.allclose(kernel.drive_transmission(v, dt), expected, atol=1e-7)
+    # Without the lag, the state would jump to the drive at once
+    assert not np.allclose(kernel.transmission(v), expected, atol=1e-3)
+
+
+if __name__ == "__main__":
+    test_phase_shifter_kernel_step_drive()
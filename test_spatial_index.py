@@ -0,0 +1,80 @@
+import numpy as np
+from circuit.crossing.spatial_index import find_crossings, shape_segments, intersect_segment_pairs, SegmentGrid
+
+
+def brute_force_crossing_points(shapes):
+    segments, owners = shape_segments(shapes)
+    i, j = np.triu_indices(len(segments), k=1)
+    pairs = np.column_stack([i, j])
+    pairs = pairs[owners[pairs[:, 0], 0] != owners[pairs[:, 1], 0]]
+    hit, points, angles = intersect_segment_pairs(segments, pairs)
+    return sorted(set((round(x, 6), round(y, 6)) for x, y in points[hit]))
+
+
+def test_x_crossing():
+    crossings = find_crossings([[(0.0, 0.0), (10.0, 10.0)], [(0.0, 10.0), (10.0, 0.0)]])
+    assert len(crossings) == 1
+    c = crossings[0]
+    assert np.allclose(c.point, (5.0, 5.0))
+    assert c.shapes == (0, 1)
+    assert c.segments == ((0, 0), (1, 0))
+    assert abs(c.angle - 90.0) < 1e-9
+
+
+def test_crossing_on_corner():
+    # The horizontal shape passes through the corner between the two segments of the second shape.
+    shapes = [[(0.0, 5.0), (10.0, 5.0)], [(5.0, 0.0), (5.0, 5.0), (8.0, 10.0)]]
+    crossings = find_crossings(shapes)
+    assert len(crossings) == 1
+    assert np.allclose(crossings[0].point, (5.0, 5.0))
+    assert find_crossings(shapes, cell_size=5.0) == crossings
+
+
+def test_parallel_and_overlapping_segments():
+    shapes = [[(0.0, 0.0), (10.0, 0.0)],
+              [(0.0, 1.0), (10.0, 1.0)],
+              [(5.0, 0.0), (15.0, 0.0)]]
+    assert find_crossings(shapes) == []
+
+
+def test_segments_of_the_same_shape():
+    assert find_crossings([[(0.0, 0.0), (10.0, 10.0), (10.0, 0.0), (0.0, 10.0)]]) == []
+
+
+def test_long_diagonal_among_short_segments():
+    rng = np.random.RandomState(0)
+    shapes = []
+    for _ in range(1000):
+        x, y = rng.uniform(0.0, 1000.0, 2)
+        a = rng.uniform(0.0, 2 * np.pi)
+        shapes.append([(x, y), (x + np.cos(a), y + np.sin(a)), (x + np.cos(a) + np.cos(a + 0.3),
+                                                                 y + np.sin(a) + np.sin(a + 0.3))])
+    shapes.append([(0.0, 0.0), (1000.0, 1000.0)])
+
+    crossings = find_crossings(shapes)
+    points = sorted(set((round(c.point[0], 6), round(c.point[1], 6)) for c in crossings))
+    assert points == brute_force_crossing_points(shapes)
+    assert any(c.shapes[1] == len(shapes) - 1 for c in crossings)
+
+    # The diagonal is only registered in the cells it passes through, not in all the cells of its bounding box.
+    segments, owners = shape_segments(shapes)
+    grid = SegmentGrid(segments)
+    n_diagonal_cells = sum(len(segments) - 1 in members for members in grid.cells.values())
+    assert n_diagonal_cells <= 4 * (1000.0 / grid.cell_size + 1)
+
+
+def test_query():
+    grid = SegmentGrid([[(0.0, 0.0), (10.0, 10.0)], [(0.0, 10.0), (1.0, 9.0)]], cell_size=1.0)
+    assert grid.query((4.9, 4.9, 5.1, 5.1)) == [0]
+    assert grid.query((0.5, 9.0, 0.6, 9.9)) == [1]
+    assert grid.query((8.5, 0.5, 9.5, 1.5)) == []
+    assert grid.query((-100.0, -100.0, 100.0, 100.0)) == [0, 1]
+
+
+if __name__ == "__main__":
+    test_x_crossing()
+    test_crossing_on_corner()
+    test_parallel_and_overlapping_segments()
+    test_segments_of_the_same_shape()
+    test_long_diagonal_among_short_segments()
+    test_query()
@@ -0,0 +1,34 @@
+from si_fab import technology
+from ipkiss3 import all as i3
+from circuit.waveguides.generic.trace import GenericWaveguideTemplate
+from scipy.interpolate import RectBivariateSpline
+import numpy as np
+
+wavelengths = np.linspace(1.5, 1.6, 5)
+widths = np.linspace(0.4, 1.2, 6)
+n_eff = np.array([[2.24378704, 2.53735656, 2.66001948, 2.71562179, 2.75466422, 2.77430224],
+                  [2.2091054, 2.51351447, 2.64091618, 2.69873319, 2.7392829, 2.7597774],
+                  [2.17442376, 2.48967238, 2.62181287, 2.68184458, 2.72390157, 2.74525256],
+                  [2.13974212, 2.46583029, 2.60270956, 2.66495597, 2.70852025, 2.73072772],
+                  [2.10506048, 2.44198821, 2.58360625, 2.64806737, 2.69313892, 2.71620288]]) + 0.001j
+
+
+def test_template_n_eff_and_n_g():
+    tt = GenericWaveguideTemplate()
+    tt.Layout(core_width=0.5)
+    cm = tt.CircuitModel(wavelengths=wavelengths, widths=widths, n_eff_values=[n_eff])
+
+    real = RectBivariateSpline(wavelengths, widths, np.real(n_eff),
+                               bbox=[wavelengths[0] * 0.9, wavelengths[-1] * 1.1, widths[0] * 0.9, widths[-1] * 1.1])
+    env = i3.Environment(wavelength=1.55)
+    assert abs(cm.get_n_eff(env) - real(1.55, 0.5)[0, 0]) < 1e-12
+    assert abs(cm.get_n_eff_table(wavelengths=[1.55])[0, 0].real - cm.get_n_eff(env)) < 1e-12
+
+    n1 = real(1.5505, 0.5)[0, 0]
+    n2 = real(1.5495, 0.5)[0, 0]
+    assert abs(cm.get_n_g(env) - (1.5495 * n1 - 1.5505 * n2) / (1.5495 - 1.5505)) < 1e-9
+    assert cm.get_loss_dB_m(env) < 0.0
+
+
+if __name__ == "__main__":
+    test_template_n_eff_and_n_g()